@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import VideoRoom, CallSession, RoomMessage
+import json
+
+from .models import VideoRoom, CallSession, CallTelemetry, RoomMessage
 
 @admin.register(VideoRoom)
 class VideoRoomAdmin(admin.ModelAdmin):
@@ -8,12 +10,29 @@ class VideoRoomAdmin(admin.ModelAdmin):
     readonly_fields = ['room_id', 'created_at']
     search_fields = ['match__user1__username', 'match__user2__username']
 
+class CallTelemetryInline(admin.TabularInline):
+    model = CallTelemetry
+    extra = 0
+    can_delete = False
+    fields = ['user', 'created_at', 'bucket_seconds', 'sample_count', 'series_preview']
+    readonly_fields = fields
+    
+    def series_preview(self, obj):
+        buckets = [
+            {key: ({stat: round(v, 1) for stat, v in value.items()} if isinstance(value, dict) else value)
+             for key, value in bucket.items()}
+            for bucket in obj.series()[:3]
+        ]
+        return json.dumps(buckets)
+    series_preview.short_description = 'First buckets'
+
 @admin.register(CallSession)
 class CallSessionAdmin(admin.ModelAdmin):
     list_display = ['room', 'status', 'started_at', 'duration', 'video_enabled', 'audio_enabled']
     list_filter = ['status', 'video_enabled', 'audio_enabled', 'started_at']
     readonly_fields = ['started_at', 'duration']
     filter_horizontal = ['participants']
+    inlines = [CallTelemetryInline]
 
 @admin.register(RoomMessage)
 class RoomMessageAdmin(admin.ModelAdmin):
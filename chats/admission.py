@@ -0,0 +1,83 @@
+"""
+Websocket admission control for reconnect storms.
+
+A per-node token bucket limits how fast new websocket connections are
+admitted. Rejected connections are accepted and immediately closed with
+close code 4429 and a ``retry_after=<seconds>`` reason, so clients can back
+off instead of hammering the node. Retry hints are spread over future slots
+at the admission rate, so a storm drains evenly instead of coming back at
+once.
+"""
+import time
+
+from django.conf import settings
+
+ADMISSION_REJECTED_CLOSE_CODE = 4429
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated_at = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return now
+
+    def take(self, count=1):
+        """Take ``count`` tokens if available."""
+        self.refill()
+        if self.tokens >= count:
+            self.tokens -= count
+            return True
+        return False
+
+    def wait_time(self, count=1):
+        """Seconds until ``count`` tokens are available (as of the last refill)."""
+        return max(0.0, (count - self.tokens) / self.rate)
+
+
+class ConnectionAdmission:
+    """Admission decisions and counters for websocket connects on this node."""
+
+    def __init__(self, rate=None, burst=None, max_retry=None, clock=time.monotonic):
+        self.bucket = TokenBucket(
+            rate or getattr(settings, 'WEBSOCKET_ADMISSION_RATE', 50),
+            burst or getattr(settings, 'WEBSOCKET_ADMISSION_BURST', 200),
+            clock=clock,
+        )
+        self.max_retry = max_retry or getattr(settings, 'WEBSOCKET_ADMISSION_MAX_RETRY', 30)
+        self.next_slot = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self):
+        """Return ``(admitted, retry_after_seconds)``."""
+        if self.bucket.take():
+            self.admitted += 1
+            return True, 0.0
+
+        self.rejected += 1
+        now = self.bucket.updated_at
+        self.next_slot = min(max(self.next_slot, now) + 1.0 / self.bucket.rate, now + self.max_retry)
+        return False, round(self.next_slot - now, 2)
+
+    def metrics(self):
+        self.bucket.refill()
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'available_tokens': round(self.bucket.tokens, 2),
+            'rate': self.bucket.rate,
+            'burst': self.bucket.burst,
+        }
+
+
+connection_admission = ConnectionAdmission()
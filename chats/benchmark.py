@@ -0,0 +1,538 @@
+"""
+Throughput benchmark for the websocket consumers.
+
+Clients are ``channels.testing.WebsocketCommunicator`` instances driving the
+production websocket stack (signed-token auth and the URL router) in-process,
+so every frame goes through the consumers, the outbound queues and the
+channel layer exactly as in a server. Scenarios:
+
+- ``text_chat``: two clients per chat room send messages, each preceded by a
+  burst of ``typing_start`` frames
+- ``ice_storm``: two clients per video room fire ICE candidates at each other
+- ``notifications``: notification events are fanned out to every user's
+  ``UserNotificationConsumer``
+
+Each tracked frame is timed from the sender until the peer's socket receives
+it. A scenario reports delivered frames per second, end-to-end latency
+percentiles, database queries per sent message (counted on every thread's
+connection) and event-loop lag, sampled by a task that sleeps
+``LAG_INTERVAL`` seconds and records how late it wakes up.
+
+Scenarios run against the layers in ``LAYERS``: Django's
+``InMemoryChannelLayer`` and ``LocalChannelLayer``, an in-process stand-in
+for a networked layer that msgpack-encodes every message and waits one
+simulated network hop per layer call. ``redis`` uses ``channels_redis`` when
+a server is available.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from matches.benchmark import percentile
+
+from .middleware import TokenAuthMiddleware
+from .models import ChatRoom, VideoRoom
+from .ratelimit import message_rate_limits
+from .routing import websocket_urlpatterns
+from .tokens import mint_websocket_token
+
+User = get_user_model()
+
+SCENARIOS = ('text_chat', 'ice_storm', 'notifications')
+LAG_INTERVAL = 0.01  # Seconds
+DRAIN_TIMEOUT = 30.0  # Seconds to wait for the last tracked frames
+DEFAULT_LAYER_LATENCY = 0.0005  # Seconds per simulated network hop
+DEFAULT_THRESHOLD = 20.0  # Percent
+
+# Scenario metric -> (statistic, whether larger is worse, whether any change for the worse counts
+# or only one above the threshold); query counts follow the same rule as matches.benchmark
+COMPARED_METRICS = {
+    'messages_per_second': (None, False, False),
+    'latency_ms': ('p95', True, False),
+    'loop_lag_ms': ('p99', True, False),
+    'queries_per_message': (None, True, True),
+}
+
+
+class LocalChannelLayer(InMemoryChannelLayer):
+    """In-memory layer with the costs of a networked one.
+
+    Messages are msgpack-encoded once per ``send``/``group_send`` and decoded
+    per recipient, as ``channels_redis`` does, and every layer call first waits
+    ``latency`` seconds for the round trip.
+    """
+
+    def __init__(self, latency=DEFAULT_LAYER_LATENCY, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    async def round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send(self, channel, message):
+        await self.round_trip()
+        await super().send(channel, msgpack.unpackb(msgpack.packb(message), raw=False))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Invalid group name'
+        await self.round_trip()
+        payload = msgpack.packb(message)
+        self._clean_expired()
+        for channel in list(self.groups.get(group, ())):
+            try:
+                await super().send(channel, msgpack.unpackb(payload, raw=False))
+            except ChannelFull:
+                pass
+
+    async def group_add(self, group, channel):
+        await self.round_trip()
+        await super().group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        await self.round_trip()
+        await super().group_discard(group, channel)
+
+
+def layer_settings(name, latency=DEFAULT_LAYER_LATENCY, redis_url='redis://127.0.0.1:6379'):
+    """``CHANNEL_LAYERS`` for one of the benchmarked layers."""
+    layers = {
+        'memory': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+        'local': {'BACKEND': 'chats.benchmark.LocalChannelLayer', 'CONFIG': {'latency': latency}},
+        'redis': {'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [redis_url]}},
+    }
+    return {'default': layers[name]}
+
+
+LAYERS = ('memory', 'local', 'redis')
+
+
+class QueryCounter:
+    """Counts queries on the connections of all threads while ``active``.
+
+    ``install`` adds the counter as an execute wrapper to the calling
+    thread's connection, which runs the consumers' thread-sensitive ORM calls,
+    and to every connection opened until ``uninstall``. That covers the
+    websocket pool threads, which close their connection after each call.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.active = False
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active:
+            with self._lock:
+                self.count += 1
+        return execute(sql, params, many, context)
+
+    def watch(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        connection_created.connect(self.watch)
+        self.watch(connection)
+
+    def uninstall(self):
+        connection_created.disconnect(self.watch)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+    def start(self):
+        self.count = 0
+        self.active = True
+
+    def stop(self):
+        self.active = False
+        return self.count
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a task sleeping ``interval`` seconds."""
+
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(time.perf_counter() - started - self.interval)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return self.samples
+
+
+class Tracker:
+    """Send times of tracked frames and their delivery latencies."""
+
+    def __init__(self, message_type):
+        self.message_type = message_type
+        self.sent_at = {}
+        self.expected = 0
+        self.latencies = []
+        self.rate_limited = 0
+        self.sending_done = False
+        self.complete = asyncio.Event()
+
+    def sent(self, key, receivers=1):
+        self.sent_at[key] = time.perf_counter()
+        self.expected += receivers
+
+    def delivered(self, key, at):
+        started = self.sent_at.get(key)
+        if started is not None:
+            self.latencies.append(at - started)
+            self.check_complete()
+
+    def limited(self, message_type):
+        self.rate_limited += 1
+        if message_type == self.message_type:
+            self.expected -= 1
+            self.check_complete()
+
+    def finish_sending(self):
+        self.sending_done = True
+        self.check_complete()
+
+    def check_complete(self):
+        if self.sending_done and len(self.latencies) >= self.expected:
+            self.complete.set()
+
+
+class BenchmarkClient:
+    """One websocket connection; a reader task timestamps the frames it receives."""
+
+    def __init__(self, application, path, user, tracker, key_for, ready_type):
+        self.communicator = WebsocketCommunicator(application, path)
+        self.user = user
+        self.tracker = tracker
+        self.key_for = key_for
+        self.ready_type = ready_type
+        self.ready = asyncio.Event()
+        self.reader = None
+
+    async def connect(self, timeout):
+        connected, code = await self.communicator.connect(timeout)
+        if not connected:
+            raise RuntimeError(f'Connection for {self.user.username} was closed with code {code}')
+        self.reader = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        while True:
+            output = await self.communicator.receive_output(timeout=3600)
+            if output['type'] != 'websocket.send':
+                return
+            received_at = time.perf_counter()
+            data = json.loads(output['text'])
+            if data.get('type') == 'heartbeat':
+                await self.send({'type': 'heartbeat_ack', 'seq': data.get('seq')})
+            elif data.get('type') == self.ready_type and data.get('user_id', self.user.pk) == self.user.pk:
+                self.ready.set()
+            elif data.get('code') == 'rate_limited':
+                self.tracker.limited(data.get('message_type'))
+            else:
+                key = self.key_for(data, self.user.pk)
+                if key is not None:
+                    self.tracker.delivered(key, received_at)
+
+    async def send(self, data):
+        await self.communicator.send_json_to(data)
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+        try:
+            await self.communicator.disconnect(timeout=10)
+        except asyncio.TimeoutError:
+            pass
+
+
+def create_fixtures(prefix, rooms):
+    """``rooms`` matched user pairs, each with a chat room and a video room."""
+    from matches.models import Match
+    from users.models import Language
+
+    english, _ = Language.objects.get_or_create(code='en', defaults={'name': 'English'})
+    korean, _ = Language.objects.get_or_create(code='ko', defaults={'name': 'Korean'})
+    password = make_password(None)
+    users = User.objects.bulk_create([
+        User(username=f'{prefix}_{i}_{side}', password=password) for i in range(rooms) for side in 'ab'
+    ])
+    matches = Match.objects.bulk_create([
+        Match(user1=users[2 * i], user2=users[2 * i + 1], user1_teaches=english, user1_learns=korean, status='active')
+        for i in range(rooms)
+    ])
+    chat_rooms = ChatRoom.objects.bulk_create([ChatRoom(match=match) for match in matches])
+    video_rooms = VideoRoom.objects.bulk_create([VideoRoom(match=match) for match in matches])
+    return [
+        (users[2 * i], users[2 * i + 1], str(chat_rooms[i].room_id), str(video_rooms[i].room_id))
+        for i in range(rooms)
+    ]
+
+
+def delete_fixtures(prefix):
+    User.objects.filter(username__startswith=f'{prefix}_').delete()
+
+
+async def pace(rate):
+    await asyncio.sleep(1 / rate if rate else 0)
+
+
+def _text_key(data, user_id):
+    if data.get('type') == 'new_message' and data.get('sender_id') != user_id:
+        return data['content'].removeprefix('bench ')
+
+
+def _ice_key(data, user_id):
+    if data.get('type') == 'ice_candidate':
+        return data['candidate']['candidate'].removeprefix('bench ')
+
+
+def _notification_key(data, user_id):
+    if data.get('type') == 'call_invitation_received':
+        return data['invitation_id']
+
+
+async def text_chat_sender(client, options):
+    for seq in range(options['messages']):
+        for _ in range(options['typing_burst']):
+            await client.send({'type': 'typing_start'})
+        key = f'{client.user.pk}:{seq}'
+        client.tracker.sent(key)
+        await client.send({'type': 'send_message', 'message': f'bench {key}'})
+        await pace(options['rate'])
+    return options['messages'] * (options['typing_burst'] + 1), options['messages']
+
+
+async def ice_storm_sender(client, options):
+    for seq in range(options['candidates']):
+        key = f'{client.user.pk}:{seq}'
+        client.tracker.sent(key)
+        await client.send({
+            'type': 'ice_candidate',
+            'candidate': {'candidate': f'bench {key}', 'sdpMid': '0', 'sdpMLineIndex': 0},
+        })
+        await pace(options['rate'])
+    return options['candidates'], options['candidates']
+
+
+async def notification_sender(client, options):
+    channel_layer = get_channel_layer()
+    for seq in range(options['notifications']):
+        key = f'{client.user.pk}:{seq}'
+        client.tracker.sent(key)
+        await channel_layer.group_send(f'user_notifications_{client.user.pk}', {
+            'type': 'call_invitation_received',
+            'invitation_id': key,
+            'caller_username': 'bench',
+            'caller_id': 0,
+            'message': '',
+            'match_id': 0,
+            'expires_at': '',
+        })
+        await pace(options['rate'])
+    return options['notifications'], options['notifications']
+
+
+def scenario_clients(name, application, pairs, tracker):
+    """The clients of a scenario and the coroutine function that drives each one."""
+    clients = []
+    for user1, user2, chat_room, video_room in pairs:
+        for user in (user1, user2):
+            if name == 'text_chat':
+                token = mint_websocket_token(user, text_rooms=[chat_room])
+                path, key_for, ready = f'/ws/text-chat/{chat_room}/?token={token}', _text_key, 'user_joined'
+            elif name == 'ice_storm':
+                token = mint_websocket_token(user, video_rooms=[video_room])
+                path, key_for, ready = f'/ws/video/{video_room}/?token={token}', _ice_key, 'user_joined'
+            else:
+                token = mint_websocket_token(user)
+                path, key_for, ready = f'/ws/notifications/?token={token}', _notification_key, 'notification_connected'
+            clients.append(BenchmarkClient(application, path, user, tracker, key_for, ready))
+    sender = {'text_chat': text_chat_sender, 'ice_storm': ice_storm_sender, 'notifications': notification_sender}[name]
+    return clients, sender
+
+
+def summarize(values, scale=1000):
+    if not values:
+        return None
+    return {
+        'p50': round(percentile(values, 50) * scale, 3),
+        'p95': round(percentile(values, 95) * scale, 3),
+        'p99': round(percentile(values, 99) * scale, 3),
+        'max': round(max(values) * scale, 3),
+    }
+
+
+async def run_scenario(name, pairs, options, counter):
+    """Connect the scenario's clients, drive them and return its measurements."""
+    tracker = Tracker({'text_chat': 'send_message', 'ice_storm': 'ice_candidate'}.get(name))
+    application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+    clients, sender = scenario_clients(name, application, pairs, tracker)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client.connect(options['timeout']) for client in clients))
+    await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in clients)), options['timeout'])
+    connect_seconds = time.perf_counter() - started
+
+    monitor = LoopLagMonitor()
+    counter.start()
+    monitor.start()
+    started = time.perf_counter()
+    try:
+        sent = await asyncio.gather(*(sender(client, options) for client in clients))
+        tracker.finish_sending()
+        try:
+            await asyncio.wait_for(tracker.complete.wait(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+    finally:
+        queries = counter.stop()
+        lag = await monitor.stop()
+        await asyncio.gather(*(client.close() for client in clients))
+
+    frames = sum(frame_count for frame_count, _ in sent)
+    messages = sum(message_count for _, message_count in sent)
+    delivered = len(tracker.latencies)
+    return {
+        'connections': len(clients),
+        'connect_seconds': round(connect_seconds, 3),
+        'frames_sent': frames,
+        'messages_sent': messages,
+        'delivered': delivered,
+        'lost': max(tracker.expected - delivered, 0),
+        'rate_limited': tracker.rate_limited,
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(delivered / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': summarize(tracker.latencies),
+        'queries': queries,
+        'queries_per_message': round(queries / messages, 2) if messages else 0.0,
+        'loop_lag_ms': summarize(lag),
+    }
+
+
+@contextmanager
+def throwaway_database():
+    """Run a benchmark against a test database created for it and dropped afterwards.
+
+    On SQLite the test database is a temporary file rather than the
+    shared-cache in-memory one, where writers on different ``websocket`` pool
+    threads fail on table locks instead of waiting for them.
+    """
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    path = None
+    if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+        handle, path = tempfile.mkstemp(prefix='benchmark-', suffix='.sqlite3')
+        os.close(handle)
+        test_settings['NAME'] = path
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        if path:
+            test_settings['NAME'] = None
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def run_benchmark(layer, scenarios=SCENARIOS, rooms=20, messages=20, typing_burst=3, candidates=50,
+                  notifications=20, rate=0.0, rate_limits=False, latency=DEFAULT_LAYER_LATENCY,
+                  redis_url='redis://127.0.0.1:6379', timeout=30.0, log=None):
+    """Run ``scenarios`` against ``layer`` on fresh fixtures; returns ``{scenario: measurements}``.
+
+    ``rate`` is frames per second per client (0 sends as fast as the loop
+    allows). Message rate limits are lifted unless ``rate_limits`` is set.
+    Fixtures and the frames' side effects are written to the current database,
+    so callers run this against a throwaway one (the command and the tests do).
+    """
+    log = log or (lambda message: None)
+    options = {
+        'messages': messages, 'typing_burst': typing_burst, 'candidates': candidates,
+        'notifications': notifications, 'rate': rate, 'timeout': timeout,
+    }
+    overrides = {'CHANNEL_LAYERS': layer_settings(layer, latency, redis_url)}
+    if not rate_limits:
+        overrides['WEBSOCKET_MESSAGE_RATE_LIMITS'] = {message_type: (1e9, 1e9) for message_type in message_rate_limits()}
+
+    prefix = f'wsbench_{uuid.uuid4().hex[:8]}'
+    pairs = create_fixtures(prefix, rooms)
+    counter = QueryCounter()
+    counter.install()
+    results = {}
+    try:
+        with override_settings(**overrides):
+            for name in scenarios:
+                results[name] = async_to_sync(run_scenario)(name, pairs, options, counter)
+                log(f'{layer} {name}: {results[name]["messages_per_second"]} messages/s')
+    finally:
+        counter.uninstall()
+        delete_fixtures(prefix)
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Regressions of ``current`` against ``baseline`` (both ``benchmark_websockets`` results).
+
+    Any increase in queries per message is flagged, as in ``matches.benchmark``;
+    throughput is flagged when it drops, and latency and loop lag when they
+    grow, by more than ``threshold`` percent.
+    """
+    regressions = []
+    for layer, scenarios in current['layers'].items():
+        for scenario, summary in scenarios.items():
+            reference = baseline.get('layers', {}).get(layer, {}).get(scenario)
+            if reference is None:
+                continue
+            for metric, (statistic, larger_is_worse, any_change) in COMPARED_METRICS.items():
+                before, after = reference.get(metric), summary.get(metric)
+                if statistic is not None:
+                    before = before and before[statistic]
+                    after = after and after[statistic]
+                if before is None or after is None:
+                    continue
+                change = (after - before) / before * 100 if before else (0.0 if after == before else float('inf'))
+                worse = change if larger_is_worse else -change
+                if worse > 0 and (any_change or worse > threshold):
+                    regressions.append({
+                        'layer': layer, 'scenario': scenario,
+                        'metric': metric if statistic is None else f'{metric}.{statistic}',
+                        'baseline': before, 'current': after, 'change': round(change, 1),
+                    })
+    return regressions
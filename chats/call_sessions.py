@@ -0,0 +1,392 @@
+"""
+Set-based call session bookkeeping.
+
+The call lifecycle adds participants with one bulk insert into the through
+table (conflicts ignored), ends sessions with a single UPDATE whose duration
+is computed in SQL, and reads the end-of-call summary in one query. In the same transaction the
+ended sessions are folded into the per-room and per-user rollup rows
+(``RoomCallStats`` / ``UserCallStats``) that the statistics endpoints read.
+
+``VideoCallConsumer`` bumps ``CallSession.last_heartbeat`` while someone is
+connected to the room. Sessions that are still open but have not had a
+heartbeat for ``CALL_SESSION_STALE_AFTER`` seconds (for example because both
+browsers crashed) are ended by ``CallSessionReaper`` in batched UPDATEs with
+``end_reason='timeout'``, using the last heartbeat as the end time. Every
+ended session also gets ``finalized_at``, the time it was actually marked
+ended, which readers that pick up newly ended sessions watermark on.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateTimeField, DurationField, Exists, ExpressionWrapper, F, Max, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .executors import db_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+OPEN_SESSION_STATUSES = ('starting', 'active')
+ROLLUP_FIELDS = ['session_count', 'successful_count', 'total_duration', 'end_reasons', 'last_session_at', 'updated_at']
+REBUILD_BATCH_SIZE = 500
+REPAIR_BATCH_SIZE = 5000
+
+
+def add_participants(session_ids, user_ids):
+    """Add users to sessions in one INSERT; existing memberships are skipped."""
+    from .models import CallSession
+
+    Participant = CallSession.participants.through
+    Participant.objects.bulk_create([
+        Participant(callsession_id=session_id, user_id=user_id)
+        for session_id in session_ids
+        for user_id in user_ids
+    ], ignore_conflicts=True)
+
+
+def missing_participants(side):
+    """(session id, user id) for sessions whose match ``side`` ('user1' or 'user2')
+    is not a participant, as one anti-join against the through table."""
+    from .models import CallSession
+
+    Participant = CallSession.participants.through
+    return (
+        CallSession.objects.order_by('pk')
+        .annotate(match_user_id=F(f'room__match__{side}_id'))
+        .filter(~Exists(Participant.objects.filter(callsession_id=OuterRef('pk'), user_id=OuterRef('match_user_id'))))
+        .values_list('pk', 'match_user_id')
+    )
+
+
+def repair_participants(batch_size=REPAIR_BATCH_SIZE, progress=None):
+    """Add both match users to every session that is missing them.
+
+    Walks each side's anti-join in session-pk order, ``batch_size`` pairs at a
+    time, inserting every page with one ``bulk_create``. ``progress`` is called
+    with the number of pairs inserted so far. Returns that number.
+    """
+    from .models import CallSession
+
+    Participant = CallSession.participants.through
+    inserted = 0
+    for side in ('user1', 'user2'):
+        last_session_id = 0
+        while True:
+            pairs = list(missing_participants(side).filter(pk__gt=last_session_id)[:batch_size])
+            if not pairs:
+                break
+            Participant.objects.bulk_create([
+                Participant(callsession_id=session_id, user_id=user_id) for session_id, user_id in pairs
+            ], ignore_conflicts=True)
+            inserted += len(pairs)
+            last_session_id = pairs[-1][0]
+            if progress:
+                progress(inserted)
+            if len(pairs) < batch_size:
+                break
+    return inserted
+
+
+def end_sessions(session_ids, ended_at=None, **fields):
+    """End open sessions in one UPDATE with the duration computed in SQL."""
+    ended_at = Value(ended_at or timezone.now(), output_field=DateTimeField())
+    return _end_and_roll_up(
+        session_ids,
+        ended_at=ended_at,
+        duration=ExpressionWrapper(ended_at - F('started_at'), output_field=DurationField()),
+        **fields,
+    )
+
+
+def _end_and_roll_up(session_ids, condition=None, **fields):
+    """Lock the still-open sessions, end them and add them to the rollups.
+
+    ``condition`` is a ``Q`` the sessions must still match once locked.
+    """
+    from .models import CallSession
+
+    with transaction.atomic():
+        locked = CallSession.objects.select_for_update().filter(
+            id__in=session_ids, status__in=OPEN_SESSION_STATUSES,
+        )
+        if condition is not None:
+            locked = locked.filter(condition)
+        open_ids = list(locked.order_by().values_list('id', flat=True))
+        if not open_ids:
+            return 0
+        ended = CallSession.objects.filter(id__in=open_ids).update(
+            status='ended', finalized_at=timezone.now(), **fields
+        )
+        roll_up_sessions(open_ids)
+    return ended
+
+
+def _rollup_deltas(rows, key):
+    from .models import CallSession
+
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault(row[key], {
+            'sessions': 0, 'successful': 0, 'duration': timedelta(0),
+            'end_reasons': Counter(), 'last_session_at': None,
+        })
+        delta['sessions'] += 1
+        delta['successful'] += row['end_reason'] in CallSession.SUCCESSFUL_END_REASONS
+        delta['duration'] += row['duration'] or timedelta(0)
+        delta['end_reasons'][row['end_reason'] or 'unknown'] += 1
+        if delta['last_session_at'] is None or row['started_at'] > delta['last_session_at']:
+            delta['last_session_at'] = row['started_at']
+    return deltas
+
+
+def _apply_rollups(model, key_field, deltas):
+    """Add per-key deltas to rollup rows with a fixed number of queries."""
+    if not deltas:
+        return
+    model.objects.bulk_create([model(**{f'{key_field}_id': key}) for key in deltas], ignore_conflicts=True)
+    rows = list(model.objects.select_for_update().filter(**{f'{key_field}_id__in': list(deltas)}))
+    now = timezone.now()
+    for row in rows:
+        delta = deltas[getattr(row, f'{key_field}_id')]
+        row.add(delta['sessions'], delta['successful'], delta['duration'], delta['end_reasons'], delta['last_session_at'])
+        row.updated_at = now
+    model.objects.bulk_update(rows, ROLLUP_FIELDS)
+
+
+def roll_up_sessions(session_ids):
+    """Add newly ended sessions to the per-room and per-user call rollups.
+
+    Must run in the transaction that ended the sessions, so that each session
+    is counted exactly once.
+    """
+    from .models import CallSession, RoomCallStats, UserCallStats
+
+    columns = ('id', 'room_id', 'started_at', 'duration', 'end_reason')
+    sessions = {
+        row['id']: row for row in CallSession.objects.filter(id__in=session_ids).values(*columns)
+    }
+    Participant = CallSession.participants.through
+    participants = [
+        {**sessions[session_id], 'user_id': user_id}
+        for session_id, user_id in Participant.objects.filter(
+            callsession_id__in=session_ids
+        ).values_list('callsession_id', 'user_id')
+    ]
+
+    _apply_rollups(RoomCallStats, 'room', _rollup_deltas(sessions.values(), 'room_id'))
+    _apply_rollups(UserCallStats, 'user', _rollup_deltas(participants, 'user_id'))
+
+
+def rebuild_rollups(force=False, rooms=None, users=None):
+    """Recompute the rollup rows from the ended sessions with one GROUP BY per table.
+
+    ``rooms`` and ``users`` (ids or querysets) limit the rebuild to those rooms'
+    and users' rows; by default every row is rebuilt. Sessions deleted by
+    retention (``main.retention``) survive only in the rollups, so unless
+    ``force`` is set this raises ``ValueError`` instead of lowering any room's
+    or user's session count.
+    """
+    from .models import CallSession, RoomCallStats, UserCallStats
+
+    Participant = CallSession.participants.through
+    sessions = CallSession.objects.filter(status='ended')
+    participants = Participant.objects.filter(callsession__status='ended')
+    room_stats = RoomCallStats.objects.all()
+    user_stats = UserCallStats.objects.all()
+    if rooms is not None:
+        sessions = sessions.filter(room__in=rooms)
+        room_stats = room_stats.filter(room__in=rooms)
+    if users is not None:
+        participants = participants.filter(user__in=users)
+        user_stats = user_stats.filter(user__in=users)
+
+    with transaction.atomic():
+        room_rollups = _build_rollups(RoomCallStats, 'room', sessions, '')
+        user_rollups = _build_rollups(UserCallStats, 'user', participants, 'callsession__')
+        if not force:
+            _check_history_kept(room_stats, 'room', room_rollups)
+            _check_history_kept(user_stats, 'user', user_rollups)
+        room_stats.delete()
+        user_stats.delete()
+        RoomCallStats.objects.bulk_create(room_rollups.values(), batch_size=REBUILD_BATCH_SIZE)
+        UserCallStats.objects.bulk_create(user_rollups.values(), batch_size=REBUILD_BATCH_SIZE)
+
+
+def _check_history_kept(stored, key_field, rollups):
+    lowered = sum(
+        1 for key, session_count in stored.values_list(f'{key_field}_id', 'session_count').iterator()
+        if session_count > (rollups[key].session_count if key in rollups else 0)
+    )
+    if lowered:
+        raise ValueError(
+            f"Rebuilding would lower the session count of {lowered} {key_field}s; "
+            f"their sessions were probably deleted by retention"
+        )
+
+
+def _build_rollups(model, key_field, rows, session_prefix):
+    """Unsaved rollup rows by key, built from (key, end_reason) groups."""
+    from .models import CallSession
+
+    groups = rows.order_by().values_list(f'{key_field}_id', f'{session_prefix}end_reason').annotate(
+        sessions=Count('pk'),
+        duration=Sum(f'{session_prefix}duration'),
+        last_session_at=Max(f'{session_prefix}started_at'),
+    )
+    now = timezone.now()
+    rollups = {}
+    for key, end_reason, sessions, duration, last_session_at in groups.iterator():
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = model(**{f'{key_field}_id': key}, end_reasons={}, updated_at=now)
+        rollup.add(
+            sessions,
+            sessions if end_reason in CallSession.SUCCESSFUL_END_REASONS else 0,
+            duration or timedelta(0),
+            {end_reason or 'unknown': sessions},
+            last_session_at,
+        )
+    return rollups
+
+
+def session_summaries(session_ids):
+    """Sessions with their participant usernames, newest first, in one query."""
+    from .models import CallSession
+
+    Participant = CallSession.participants.through
+    rows = Participant.objects.filter(callsession_id__in=session_ids).order_by(
+        '-callsession__started_at', 'callsession_id', 'user__username'
+    ).values_list(
+        'callsession_id', 'user__username', 'callsession__status', 'callsession__started_at',
+        'callsession__ended_at', 'callsession__duration', 'callsession__end_reason',
+        'callsession__connection_quality',
+    )
+
+    summaries = {}
+    for session_id, username, status, started_at, ended_at, duration, end_reason, quality in rows:
+        if session_id not in summaries:
+            session = CallSession(
+                id=session_id, status=status, started_at=started_at, ended_at=ended_at,
+                duration=duration, end_reason=end_reason, connection_quality=quality,
+            )
+            summaries[session_id] = {
+                'session_id': session_id,
+                'duration': session.get_duration_display(),
+                'connection_quality': quality,
+                'was_successful': session.was_successful(),
+                'started_at': started_at.isoformat(),
+                'ended_at': ended_at.isoformat() if ended_at else None,
+                'participants': [],
+            }
+        summaries[session_id]['participants'].append(username)
+    return list(summaries.values())
+
+
+def _stale(cutoff):
+    return Q(last_heartbeat__lt=cutoff) | Q(last_heartbeat__isnull=True, started_at__lt=cutoff)
+
+
+def stale_sessions(cutoff):
+    """Open sessions with no heartbeat since ``cutoff``."""
+    from .models import CallSession
+
+    return CallSession.objects.filter(status__in=OPEN_SESSION_STATUSES).filter(_stale(cutoff))
+
+
+def end_stale_sessions(cutoff, batch_size):
+    """End one batch of stale sessions; returns ``(sessions_ended, rooms_closed)``."""
+    from .models import VideoRoom
+
+    batch = list(stale_sessions(cutoff).order_by().values_list('id', 'room_id')[:batch_size])
+    if not batch:
+        return 0, 0
+
+    last_alive = Coalesce(F('last_heartbeat'), F('started_at'))
+    # A heartbeat between the batch read and the lock keeps the session open
+    ended = _end_and_roll_up(
+        [session_id for session_id, _ in batch],
+        condition=_stale(cutoff),
+        end_reason='timeout',
+        ended_at=last_alive,
+        duration=ExpressionWrapper(last_alive - F('started_at'), output_field=DurationField()),
+    )
+
+    # Rooms stay active only while some other session in them is still open
+    closed = VideoRoom.objects.filter(
+        id__in={room_id for _, room_id in batch},
+        is_active=True,
+    ).exclude(sessions__status__in=OPEN_SESSION_STATUSES).update(is_active=False)
+    return ended, closed
+
+
+class CallSessionReaper:
+    """Periodically end call sessions that stopped receiving heartbeats."""
+
+    def __init__(self, interval=None, stale_after=None, batch_size=None):
+        self.interval = interval or getattr(settings, 'CALL_SESSION_REAP_INTERVAL', 60.0)
+        self.stale_after = stale_after or getattr(settings, 'CALL_SESSION_STALE_AFTER', 120.0)
+        self.batch_size = batch_size or getattr(settings, 'CALL_SESSION_REAP_BATCH_SIZE', 500)
+        self.sessions_reaped = 0
+        self.rooms_closed = 0
+        self._task = None
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def ensure_started(self):
+        """Start the reaper on the running event loop (idempotent)."""
+        if self.is_running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @db_sync_to_async('batch')
+    def _reap_batch(self, cutoff):
+        return end_stale_sessions(cutoff, self.batch_size)
+
+    async def reap(self):
+        """End every stale session in batches; returns the number ended."""
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after)
+        total = 0
+        while True:
+            ended, closed = await self._reap_batch(cutoff)
+            total += ended
+            self.sessions_reaped += ended
+            self.rooms_closed += closed
+            if ended < self.batch_size:
+                break
+        if total:
+            logger.info("Ended %d stale call sessions", total)
+        return total
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Failed to reap stale call sessions")
+            await asyncio.sleep(self.interval)
+
+    def metrics(self):
+        return {
+            'running': self.is_running,
+            'stale_after': self.stale_after,
+            'sessions_reaped': self.sessions_reaped,
+            'rooms_closed': self.rooms_closed,
+        }
+
+
+call_session_reaper = CallSessionReaper()
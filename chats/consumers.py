@@ -1,52 +1,76 @@
+import asyncio
 import json
 import uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
 from django.db.models import Q
 from django.db import models
+from django.conf import settings
 from django.urls import reverse
+from .call_sessions import OPEN_SESSION_STATUSES, add_participants, end_sessions, session_summaries
+from .executors import db_sync_to_async
+from .log import log_event, message_body
+from .outbound import coalesce_key
+from .protocol import ProtocolMixin, compact, expand, pack
+from .telemetry import TelemetrySeries
+from .tokens import token_grants_room
+
+class VideoCallConsumer(ProtocolMixin, AsyncWebsocketConsumer):
+    message_handlers = {
+        'offer': 'handle_offer',
+        'answer': 'handle_answer',
+        'ice_candidate': 'handle_ice_candidate',
+        'chat_message': 'handle_chat_message',
+        'call_start': 'handle_call_start',
+        'call_end': 'handle_call_end',
+        'peer_ready': 'handle_peer_ready',
+        'video_status': 'handle_video_status',
+        'audio_status': 'handle_audio_status',
+        'test': 'handle_test',
+        'typing_start': 'handle_typing_start',
+        'typing_stop': 'handle_typing_stop',
+        'telemetry': 'handle_telemetry',
+    }
+    
+    # Current call session and this connection's getStats series for it
+    call_session_id = None
+    telemetry = None
 
-class VideoCallConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'video_call_{self.room_id}'
         self.user = self.scope['user']
         
-        print(f"WebSocket connection attempt for room: {self.room_id}")
-        print(f"User: {self.user}")
-        print(f"User authenticated: {self.user.is_authenticated}")
+        log_event('connect', consumer='video', room=self.room_id, user=self.user.pk, authenticated=self.user.is_authenticated)
         
         # Accept connection first
         await self.accept()
-        print(f"WebSocket connection accepted")
         
         # Send connection test message
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'connection_test',
             'message': f'WebSocket connected successfully to room {self.room_id}!',
             'room_id': self.room_id,
             'user_id': self.user.id if self.user.is_authenticated else None
-        }))
+        })
         
         # Check authentication
         if not self.user.is_authenticated:
-            print("User not authenticated")
-            await self.send(text_data=json.dumps({
+            log_event('auth_required', consumer='video', room=self.room_id)
+            await self.send_event({
                 'type': 'error',
                 'message': 'Authentication required'
-            }))
+            })
             await self.close()
             return
         
         # Verify user has access to this room
         has_access = await self.check_room_access()
-        print(f"User has room access: {has_access}")
         if not has_access:
-            print("User doesn't have room access")
-            await self.send(text_data=json.dumps({
+            log_event('access_denied', consumer='video', room=self.room_id, user=self.user.pk)
+            await self.send_event({
                 'type': 'error', 
                 'message': 'Room access denied'
-            }))
+            })
             await self.close()
             return
         
@@ -56,7 +80,8 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        print(f"User {self.user.username} joined room group")
+        log_event('room_joined', consumer='video', room=self.room_id, user=self.user.pk)
+        self.session_heartbeat = asyncio.ensure_future(self.beat_call_session())
         
         # Notify room that user joined
         await self.channel_layer.group_send(
@@ -70,7 +95,12 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
         )
 
     async def disconnect(self, close_code):
-        print(f"WebSocket disconnected with code: {close_code}")
+        log_event('disconnect', consumer='video', room=getattr(self, 'room_id', None), code=close_code)
+        
+        if getattr(self, 'session_heartbeat', None) is not None:
+            self.session_heartbeat.cancel()
+        
+        await self.flush_telemetry()
         
         # Notify room that user left (before leaving group)
         if hasattr(self, 'user') and hasattr(self, 'room_group_name') and self.user.is_authenticated:
@@ -91,72 +121,36 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
-    async def receive(self, text_data):
+    async def receive_message(self, data):
+        log_event('received', type=data.get('type'), room=self.room_id, user=self.user.pk)
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            
-            print(f"Received message type: {message_type} from user: {self.user.username}")
-            
-            if message_type == 'offer':
-                await self.handle_offer(data)
-            elif message_type == 'answer':
-                await self.handle_answer(data)
-            elif message_type == 'ice_candidate':
-                await self.handle_ice_candidate(data)
-            elif message_type == 'chat_message':
-                await self.handle_chat_message(data)
-            elif message_type == 'call_start':
-                await self.handle_call_start(data)
-            elif message_type == 'call_end':
-                await self.handle_call_end(data)
-            elif message_type == 'peer_ready':
-                await self.handle_peer_ready(data)
-            elif message_type == 'video_status':
-                await self.handle_video_status(data)
-            elif message_type == 'audio_status':
-                await self.handle_audio_status(data)
-            elif message_type == 'test':
-                await self.send(text_data=json.dumps({
-                    'type': 'test_response',
-                    'message': 'Test message received successfully!',
-                    'echo': data
-                }))
-            elif message_type == 'typing_start':
-                await self.handle_typing_start(data)
-            elif message_type == 'typing_stop':
-                await self.handle_typing_stop(data)
-            else:
-                print(f"Unknown message type: {message_type}")
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': f'Unknown message type: {message_type}'
-                }))
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Invalid JSON data'
-            }))
+            await super().receive_message(data)
         except Exception as e:
-            print(f"Error in receive: {e}")
-            await self.send(text_data=json.dumps({
+            log_event('error', action='receive', room=self.room_id, user=self.user.pk, exc_info=True)
+            await self.send_event({
                 'type': 'error',
                 'message': f'Server error: {str(e)}'
-            }))
+            })
+
+    async def handle_test(self, data):
+        """Echo a connection test message"""
+        await self.send_event({
+            'type': 'test_response',
+            'message': 'Test message received successfully!',
+            'echo': data
+        })
 
     async def handle_offer(self, data):
         """Handle WebRTC offer"""
         offer = data.get('offer')
         if not offer:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'No offer data provided'
-            }))
+            })
             return
         
-        print(f"Broadcasting offer from {self.user.username}")
+        log_event('offer', room=self.room_id, user=self.user.pk)
         
         # Add this user as a participant to any active session (they're accepting the call)
         await self.add_participant_to_session()
@@ -176,13 +170,13 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
         """Handle WebRTC answer"""
         answer = data.get('answer')
         if not answer:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'No answer data provided'
-            }))
+            })
             return
         
-        print(f"Broadcasting answer from {self.user.username}")
+        log_event('answer', room=self.room_id, user=self.user.pk)
         
         # Add this user as a participant to any active session
         await self.add_participant_to_session()
@@ -202,13 +196,13 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
         """Handle ICE candidate"""
         candidate = data.get('candidate')
         if not candidate:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'No ICE candidate data provided'
-            }))
+            })
             return
             
-        print(f"Broadcasting ICE candidate from {self.user.username}")
+        log_event('ice_candidate', room=self.room_id, user=self.user.pk)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -222,7 +216,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
 
     async def handle_peer_ready(self, data):
         """Handle peer ready notification"""
-        print(f"Peer ready notification from {self.user.username}")
+        log_event('peer_ready', room=self.room_id, user=self.user.pk)
         
         # Add this user as a participant to any active session
         await self.add_participant_to_session()
@@ -240,7 +234,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
     async def handle_video_status(self, data):
         """Handle video status change"""
         video_enabled = data.get('video_enabled', True)
-        print(f"Video status change from {self.user.username}: {video_enabled}")
+        log_event('media_status', room=self.room_id, user=self.user.pk, video=video_enabled)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -255,7 +249,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
     async def handle_audio_status(self, data):
         """Handle audio status change"""
         audio_enabled = data.get('audio_enabled', True)
-        print(f"Audio status change from {self.user.username}: {audio_enabled}")
+        log_event('media_status', room=self.room_id, user=self.user.pk, audio=audio_enabled)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -271,21 +265,21 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
         """Handle text chat message during video call"""
         message_content = data.get('message', '').strip()
         if not message_content:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Empty message content'
-            }))
+            })
             return
             
         # Validate message length (prevent extremely long messages)
         if len(message_content) > 500:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Message too long (max 500 characters)'
-            }))
+            })
             return
             
-        print(f"Chat message from {self.user.username}: {message_content}")
+        log_event('chat_message', room=self.room_id, user=self.user.pk, body=message_body(message_content))
         
         try:
             # Save message to database
@@ -309,19 +303,21 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
                 }
             )
             
-        except Exception as e:
-            print(f"Error handling chat message: {e}")
-            await self.send(text_data=json.dumps({
+        except Exception:
+            log_event('error', action='chat_message', room=self.room_id, user=self.user.pk, exc_info=True)
+            await self.send_event({
                 'type': 'error',
                 'message': 'Failed to send message'
-            }))
+            })
 
     async def handle_call_start(self, data):
         """Handle call session start"""
-        print(f"Call start from {self.user.username}")
+        log_event('call_start', room=self.room_id, user=self.user.pk)
         
         # Create or get existing call session and ensure user is a participant
         session = await self.create_call_session(data)
+        if session is not None:
+            self.call_session_id = session.id
         
         # Also ensure user is added to any existing active sessions
         await self.add_participant_to_session()
@@ -340,7 +336,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
 
     async def handle_call_end(self, data):
         """Handle call session end with enhanced tracking"""
-        print(f"Call end from {self.user.username}")
+        log_event('call_end', room=self.room_id, user=self.user.pk)
         
         # Extract end reason and notes from data
         end_reason = data.get('end_reason', 'user_hangup')
@@ -357,6 +353,10 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             connection_quality=connection_quality,
             network_issues=network_issues
         )
+        if session_summary:
+            self.call_session_id = session_summary['session_id']
+        await self.flush_telemetry()
+        self.call_session_id = None
         
         # Build the redirect URL for call summary page
         redirect_url = None
@@ -381,9 +381,23 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             }
         )
 
+    async def handle_telemetry(self, data):
+        """Fold a getStats sample into this connection's telemetry series"""
+        if self.telemetry is None:
+            self.telemetry = TelemetrySeries()
+        stats = data.get('stats')
+        if isinstance(stats, dict):
+            self.telemetry.add(stats)
+
+    async def flush_telemetry(self):
+        """Persist the telemetry series once, when leaving the call"""
+        series, self.telemetry = self.telemetry, None
+        if series is not None and series.samples:
+            await self.save_telemetry(series)
+
     async def handle_typing_start(self, data):
         """Handle typing start notification"""
-        print(f"Typing start from {self.user.username}")
+        log_event('typing', room=self.room_id, user=self.user.pk, typing=True)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -396,7 +410,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
 
     async def handle_typing_stop(self, data):
         """Handle typing stop notification"""
-        print(f"Typing stop from {self.user.username}")
+        log_event('typing', room=self.room_id, user=self.user.pk, typing=False)
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -410,93 +424,93 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
     # Group message handlers (events sent TO clients)
     async def user_joined(self, event):
         """Send user joined notification to client"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'user_joined',
             'user_id': event['user_id'],
             'username': event['username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def user_left(self, event):
         """Send user left notification to client"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'user_left',
             'user_id': event['user_id'],
             'username': event['username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def webrtc_offer(self, event):
         """Forward WebRTC offer to other users (not sender)"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            print(f"Forwarding offer to {self.user.username}")
-            await self.send(text_data=json.dumps({
+            log_event('forward', type='offer', room=self.room_id, user=self.user.pk)
+            await self.send_event({
                 'type': 'offer',
                 'offer': event['offer'],
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def webrtc_answer(self, event):
         """Forward WebRTC answer to other users (not sender)"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            print(f"Forwarding answer to {self.user.username}")
-            await self.send(text_data=json.dumps({
+            log_event('forward', type='answer', room=self.room_id, user=self.user.pk)
+            await self.send_event({
                 'type': 'answer',
                 'answer': event['answer'],
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def webrtc_ice_candidate(self, event):
         """Forward ICE candidate to other users (not sender)"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            print(f"Forwarding ICE candidate to {self.user.username}")
-            await self.send(text_data=json.dumps({
+            log_event('forward', type='ice_candidate', room=self.room_id, user=self.user.pk)
+            await self.send_event({
                 'type': 'ice_candidate',
                 'candidate': event['candidate'],
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def peer_ready(self, event):
         """Forward peer ready notification"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'peer_ready',
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def video_status_change(self, event):
         """Forward video status change"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'video_status_change',
                 'video_enabled': event['video_enabled'],
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def audio_status_change(self, event):
         """Forward audio status change"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'audio_status_change',
                 'audio_enabled': event['audio_enabled'],
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def chat_message(self, event):
         """Forward chat message to all users"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'chat_message',
             'message': event['message'],
             'sender_id': event['sender_id'],
@@ -504,31 +518,31 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp'],
             'message_id': event.get('message_id'),
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def call_started(self, event):
         """Forward call started notification"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_started',
             'sender_id': event['sender_id'],
             'sender_username': event['sender_username'],
             'video_enabled': event.get('video_enabled', True),
             'audio_enabled': event.get('audio_enabled', True),
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def call_ended(self, event):
         """Send call ended notification to client"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_ended',
             'sender_id': event['sender_id'],
             'sender_username': event['sender_username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def call_ended_enhanced(self, event):
         """Send enhanced call ended notification with session summary to client"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_ended_enhanced',
             'sender_id': event['sender_id'],
             'sender_username': event['sender_username'],
@@ -537,60 +551,61 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             'session_summary': event['session_summary'],
             'redirect_url': event.get('redirect_url'),
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def typing_start(self, event):
         """Forward typing start notification to other users (not sender)"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'typing_start',
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def typing_stop(self, event):
         """Forward typing stop notification to other users (not sender)"""
         if hasattr(self, 'user') and event['sender_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'typing_stop',
                 'sender_id': event['sender_id'],
                 'sender_username': event['sender_username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     # Database operations
-    @database_sync_to_async
-    def check_room_access(self):
+    async def check_room_access(self):
+        """Check if user has access to the video room, trusting a signed handshake token first"""
+        if token_grants_room(self.scope, 'v', self.room_id):
+            return True
+        return await self.check_room_access_db()
+
+    @db_sync_to_async('websocket')
+    def check_room_access_db(self):
         """Check if user has access to the video room"""
         try:
             from .models import VideoRoom
             from matches.models import Match
             
-            # Try to get the room first
-            try:
-                room = VideoRoom.objects.get(room_id=self.room_id)
-                return room.can_user_access(self.user)
-            except VideoRoom.DoesNotExist:
-                # If room doesn't exist, check if user has a match that could create this room
-                # This is a more permissive approach for development
-                print(f"Room {self.room_id} doesn't exist, checking match access")
-                
-                # Get all matches where user is involved
-                user_matches = Match.objects.filter(
-                    Q(user1=self.user) | Q(user2=self.user),
-                    status='active'
-                )
-                
-                # For development, allow access if user has any active matches
-                return user_matches.exists()
+            rooms = VideoRoom.objects.filter(room_id=self.room_id)
+            if rooms.filter(Q(match__user1=self.user) | Q(match__user2=self.user)).exists():
+                return True
+            if rooms.exists():
+                return False
+            
+            # If room doesn't exist, check if user has a match that could create this room
+            # This is a more permissive approach for development
+            return Match.objects.filter(
+                Q(user1=self.user) | Q(user2=self.user),
+                status='active'
+            ).exists()
                 
-        except Exception as e:
-            print(f"Error checking room access: {e}")
+        except Exception:
+            log_event('error', action='check_room_access', room=self.room_id, user=self.user.pk, exc_info=True)
             # For development, be permissive
             return True
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def save_chat_message(self, content):
         """Save chat message to database"""
         try:
@@ -603,7 +618,7 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             )
             
             if created:
-                print(f"Created new room: {self.room_id}")
+                log_event('room_created', room=self.room_id, user=self.user.pk)
             
             # Create message
             message = RoomMessage.objects.create(
@@ -611,17 +626,73 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
                 sender=self.user,
                 content=content
             )
-            print(f"Saved chat message: {message.id}")
             return message
             
-        except Exception as e:
-            print(f"Error saving chat message: {e}")
+        except Exception:
+            log_event('error', action='save_chat_message', room=self.room_id, user=self.user.pk, exc_info=True)
             return None
 
-    @database_sync_to_async
+    async def beat_call_session(self):
+        """Keep this room's open call sessions from being reaped while we're connected."""
+        interval = getattr(settings, 'CALL_SESSION_HEARTBEAT_INTERVAL', 30.0)
+        while True:
+            await self.touch_call_session()
+            await asyncio.sleep(interval)
+
+    @db_sync_to_async('websocket')
+    def save_telemetry(self, series):
+        """Store a downsampled series and fold its summary into the session"""
+        try:
+            from django.db.models import F
+            from django.db.models.functions import Greatest
+            from .models import CallSession, CallTelemetry
+            
+            session_id = self.call_session_id or CallSession.objects.filter(
+                room__room_id=self.room_id,
+                participants=self.user
+            ).order_by('-started_at').values_list('id', flat=True).first()
+            if session_id is None:
+                return
+            
+            CallTelemetry.objects.create(
+                session_id=session_id,
+                user_id=self.user.pk,
+                bucket_seconds=series.bucket_seconds,
+                sample_count=series.samples,
+                data=series.encode()
+            )
+            
+            summary = series.summary()
+            fields = {
+                'network_issues_count': Greatest(F('network_issues_count'), summary['network_issues_count']),
+                'total_data_transferred': F('total_data_transferred') + summary['total_data_transferred'],
+            }
+            if summary['average_video_quality']:
+                fields['average_video_quality'] = summary['average_video_quality']
+            CallSession.objects.filter(id=session_id).update(**fields)
+            
+        except Exception:
+            log_event('error', action='save_telemetry', room=self.room_id, user=self.user.pk, exc_info=True)
+
+    @db_sync_to_async('websocket')
+    def touch_call_session(self):
+        try:
+            from django.utils import timezone
+            from .models import CallSession
+            
+            CallSession.objects.filter(
+                room__room_id=self.room_id,
+                status__in=OPEN_SESSION_STATUSES
+            ).update(last_heartbeat=timezone.now())
+            
+        except Exception:
+            log_event('error', action='touch_call_session', room=self.room_id, user=self.user.pk, exc_info=True)
+
+    @db_sync_to_async('websocket')
     def create_call_session(self, data):
         """Create a new call session"""
         try:
+            from django.utils import timezone
             from .models import VideoRoom, CallSession
             
             # Get or create room
@@ -631,15 +702,13 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
             )
             
             if created:
-                print(f"Created new room: {self.room_id}")
+                log_event('room_created', room=self.room_id, user=self.user.pk)
             
-            # Check if there's already an active session
+            # Join the existing active session if there is one
             existing_session = room.sessions.filter(status='active').first()
             if existing_session:
-                # Add this user as a participant if not already added
-                if not existing_session.participants.filter(id=self.user.id).exists():
-                    existing_session.participants.add(self.user)
-                    print(f"Added {self.user.username} to existing session: {existing_session.id}")
+                add_participants([existing_session.id], [self.user.pk])
+                log_event('session_joined', room=self.room_id, user=self.user.pk, session=existing_session.id)
                 return existing_session
             
             # Create new session
@@ -647,134 +716,118 @@ class VideoCallConsumer(AsyncWebsocketConsumer):
                 room=room,
                 video_enabled=data.get('video_enabled', True),
                 audio_enabled=data.get('audio_enabled', True),
-                status='active'
+                status='active',
+                last_heartbeat=timezone.now()
             )
-            session.participants.add(self.user)
+            add_participants([session.id], [self.user.pk])
             
             # Update room status
-            room.is_active = True
-            room.save()
+            VideoRoom.objects.filter(pk=room.pk).update(is_active=True, last_activity=timezone.now())
             
-            print(f"Created call session: {session.id}")
+            log_event('session_created', room=self.room_id, user=self.user.pk, session=session.id)
             return session
             
-        except Exception as e:
-            print(f"Error creating call session: {e}")
+        except Exception:
+            log_event('error', action='create_call_session', room=self.room_id, user=self.user.pk, exc_info=True)
             return None
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def add_participant_to_session(self):
         """Add current user as participant to any active session in this room"""
         try:
-            from .models import VideoRoom
-            
-            room = VideoRoom.objects.get(room_id=self.room_id)
-            active_sessions = room.sessions.filter(status='active')
+            from .models import CallSession
             
-            for session in active_sessions:
-                if not session.participants.filter(id=self.user.id).exists():
-                    session.participants.add(self.user)
-                    print(f"Added {self.user.username} as participant to session: {session.id}")
-            
-        except Exception as e:
-            print(f"Error adding participant to session: {e}")
+            session_ids = list(CallSession.objects.filter(
+                room__room_id=self.room_id,
+                status='active'
+            ).exclude(participants=self.user).values_list('id', flat=True))
+            if not session_ids:
+                return
+            
+            Participant = CallSession.participants.through
+            Participant.objects.bulk_create([
+                Participant(callsession_id=session_id, user_id=self.user.pk)
+                for session_id in session_ids
+            ], ignore_conflicts=True)
+            for session_id in session_ids:
+                log_event('session_joined', room=self.room_id, user=self.user.pk, session=session_id)
+            
+        except Exception:
+            log_event('error', action='add_participant', room=self.room_id, user=self.user.pk, exc_info=True)
+
+    def end_room_sessions(self, **fields):
+        """End the room's active sessions; returns their ids and the room's match users."""
+        from django.utils import timezone
+        from .models import CallSession, VideoRoom
+        
+        room_pk, user1_id, user2_id = VideoRoom.objects.filter(room_id=self.room_id).values_list(
+            'pk', 'match__user1_id', 'match__user2_id'
+        ).get()
+        session_ids = list(CallSession.objects.filter(
+            room_id=room_pk, status='active'
+        ).values_list('id', flat=True))
+        
+        # Both match users count as participants even if one never sent call_start
+        add_participants(session_ids, [user1_id, user2_id])
+        end_sessions(session_ids, **fields)
+        VideoRoom.objects.filter(pk=room_pk).update(is_active=False, last_activity=timezone.now())
+        
+        for session_id in session_ids:
+            log_event('session_ended', room=self.room_id, session=session_id, reason=fields.get('end_reason'))
+        return session_ids
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def end_call_session(self):
         """End the current call session"""
         try:
-            from django.utils import timezone
-            from .models import VideoRoom
-            
-            room = VideoRoom.objects.get(room_id=self.room_id)
-            
-            # End all active sessions
-            active_sessions = room.sessions.filter(status='active')
-            for session in active_sessions:
-                session.status = 'ended'
-                session.ended_at = timezone.now()
-                session.calculate_duration()
-                session.save()
-                print(f"Ended call session: {session.id}")
-            
-            # Update room status
-            room.is_active = False
-            room.save()
-            
-        except Exception as e:
-            print(f"Error ending call session: {e}")
+            self.end_room_sessions()
+        except Exception:
+            log_event('error', action='end_call_session', room=self.room_id, user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def end_call_session_enhanced(self, ended_by, end_reason, end_notes, connection_quality, network_issues):
         """End the current call session with detailed information"""
         try:
-            from django.utils import timezone
-            from .models import VideoRoom
-            
-            room = VideoRoom.objects.get(room_id=self.room_id)
-            
-            # End all active sessions with enhanced tracking
-            active_sessions = room.sessions.filter(status='active')
-            session_summary = None
-            
-            for session in active_sessions:
-                # Ensure all users with room access are participants (retroactive fix)
-                match = room.match
-                for user in [match.user1, match.user2]:
-                    if not session.participants.filter(id=user.id).exists():
-                        session.participants.add(user)
-                        print(f"Retroactively added {user.username} as participant to session {session.id}")
-                
-                session.status = 'ended'
-                session.ended_at = timezone.now()
-                session.ended_by = ended_by
-                session.end_reason = end_reason
-                session.end_notes = end_notes
-                if connection_quality:
-                    session.connection_quality = connection_quality
-                session.network_issues_count = network_issues
-                session.calculate_duration()
-                session.save()
-                
-                print(f"Ended call session: {session.id} - Reason: {end_reason}")
-                
-                # Get all participants for the summary
-                participants = list(session.participants.values_list('username', flat=True))
-                
-                # Create session summary for the frontend
-                session_summary = {
-                    'session_id': session.id,
-                    'ended_by': ended_by.id,
-                    'ended_by_username': ended_by.username,
-                    'end_reason': end_reason,
-                    'end_notes': end_notes,
-                    'duration': session.get_duration_display(),
-                    'connection_quality': session.connection_quality,
-                    'network_issues': network_issues,
-                    'was_successful': session.was_successful(),
-                    'started_at': session.started_at.isoformat(),
-                    'ended_at': session.ended_at.isoformat(),
-                    'participants': participants
-                }
-            
-            # Update room status
-            room.is_active = False
-            room.save()
-            
-            return session_summary
+            fields = {
+                'ended_by': ended_by,
+                'end_reason': end_reason,
+                'end_notes': end_notes,
+                'network_issues_count': network_issues,
+            }
+            if connection_quality:
+                fields['connection_quality'] = connection_quality
+            session_ids = self.end_room_sessions(**fields)
+            
+            summaries = session_summaries(session_ids)
+            if not summaries:
+                return None
+            
+            # Summary of the most recent session for the frontend
+            return {
+                **summaries[0],
+                'ended_by': ended_by.id,
+                'ended_by_username': ended_by.username,
+                'end_reason': end_reason,
+                'end_notes': end_notes,
+                'network_issues': network_issues,
+            }
             
-        except Exception as e:
-            print(f"Error ending call session: {e}")
+        except Exception:
+            log_event('error', action='end_call_session', room=self.room_id, user=self.user.pk, exc_info=True)
             return None
 
-class UserNotificationConsumer(AsyncWebsocketConsumer):
+class UserNotificationConsumer(ProtocolMixin, AsyncWebsocketConsumer):
     """WebSocket consumer for user-specific notifications like call invitations."""
     
+    message_handlers = {
+        'ping': 'handle_ping',
+    }
+    
     async def connect(self):
         self.user = self.scope['user']
         
         if not self.user.is_authenticated:
-            print("User not authenticated for notification websocket")
+            log_event('auth_required', consumer='notifications')
             await self.close()
             return
         
@@ -783,7 +836,7 @@ class UserNotificationConsumer(AsyncWebsocketConsumer):
         
         # Accept connection
         await self.accept()
-        print(f"User {self.user.username} connected to notification websocket")
+        log_event('connect', consumer='notifications', user=self.user.pk)
         
         # Join user's notification group
         await self.channel_layer.group_add(
@@ -792,10 +845,10 @@ class UserNotificationConsumer(AsyncWebsocketConsumer):
         )
         
         # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'notification_connected',
             'message': f'Notification websocket connected for {self.user.username}'
-        }))
+        })
     
     async def disconnect(self, close_code):
         # Leave user's notification group
@@ -804,26 +857,23 @@ class UserNotificationConsumer(AsyncWebsocketConsumer):
                 self.user_group_name,
                 self.channel_name
             )
-        print(f"User {self.user.username} disconnected from notification websocket")
+        log_event('disconnect', consumer='notifications', user=self.user.pk, code=close_code)
     
-    async def receive(self, text_data):
-        # This consumer is mainly for receiving notifications, but we can handle basic messages
-        try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            
-            if message_type == 'ping':
-                await self.send(text_data=json.dumps({
-                    'type': 'pong',
-                    'message': 'Notification websocket alive'
-                }))
-        except Exception as e:
-            print(f"Error in notification consumer receive: {e}")
+    async def handle_ping(self, data):
+        """Answer a keepalive ping"""
+        await self.send_event({
+            'type': 'pong',
+            'message': 'Notification websocket alive'
+        })
+    
+    async def handle_unknown_message(self, data):
+        # This consumer is mainly for receiving notifications; other messages are ignored
+        pass
     
     # Event handlers for different types of notifications
     async def call_invitation_received(self, event):
         """Handle incoming call invitation notification."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_invitation_received',
             'invitation_id': event['invitation_id'],
             'caller_username': event['caller_username'],
@@ -831,63 +881,79 @@ class UserNotificationConsumer(AsyncWebsocketConsumer):
             'message': event.get('message', ''),
             'match_id': event['match_id'],
             'expires_at': event['expires_at']
-        }))
+        })
     
     async def call_invitation_accepted(self, event):
         """Handle call invitation accepted notification."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_invitation_accepted',
             'invitation_id': event['invitation_id'],
             'accepter_username': event['accepter_username'],
             'room_url': event['room_url']
-        }))
+        })
     
     async def call_invitation_declined(self, event):
         """Handle call invitation declined notification."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_invitation_declined',
             'invitation_id': event['invitation_id'],
             'decliner_username': event['decliner_username']
-        }))
+        })
     
     async def call_invitation_cancelled(self, event):
         """Forward call invitation cancelled notification"""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'call_invitation_cancelled',
             'invitation_id': event['invitation_id'],
             'canceller_username': event['canceller_username']
-        }))
+        })
+
+    async def call_invitation_expired(self, event):
+        """Forward call invitation expired notification to caller and receiver"""
+        await self.send_event({
+            'type': 'call_invitation_expired',
+            'invitation_id': event['invitation_id']
+        })
 
-class TextChatConsumer(AsyncWebsocketConsumer):
+class TextChatConsumer(ProtocolMixin, AsyncWebsocketConsumer):
     """WebSocket consumer specifically for text chat functionality."""
     
+    message_handlers = {
+        'send_message': 'handle_send_message',
+        'edit_message': 'handle_edit_message',
+        'mark_messages_read': 'handle_mark_messages_read',
+        'typing_start': 'handle_typing_start',
+        'typing_stop': 'handle_typing_stop',
+        'load_messages': 'handle_load_messages',
+        'ping': 'handle_ping',
+    }
+    
     async def connect(self):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f'text_chat_{self.room_id}'
         self.user = self.scope['user']
         
-        print(f"Text chat connection attempt for room: {self.room_id}")
-        print(f"User: {self.user}")
+        log_event('connect', consumer='text_chat', room=self.room_id, user=self.user.pk, authenticated=self.user.is_authenticated)
         
         # Accept connection first
         await self.accept()
         
         # Check authentication
         if not self.user.is_authenticated:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Authentication required'
-            }))
+            })
             await self.close()
             return
         
         # Verify user has access to this chat room
         has_access = await self.check_chat_room_access()
         if not has_access:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error', 
                 'message': 'Chat room access denied'
-            }))
+            })
             await self.close()
             return
         
@@ -897,7 +963,7 @@ class TextChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        print(f"User {self.user.username} joined text chat room group")
+        log_event('room_joined', consumer='text_chat', room=self.room_id, user=self.user.pk)
         
         # Update user's online status for this room
         await self.set_user_online()
@@ -914,15 +980,15 @@ class TextChatConsumer(AsyncWebsocketConsumer):
         )
         
         # Send connection confirmation
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'connected',
             'message': 'Connected to text chat',
             'room_id': self.room_id,
             'user_id': self.user.id
-        }))
+        })
 
     async def disconnect(self, close_code):
-        print(f"Text chat disconnected with code: {close_code}")
+        log_event('disconnect', consumer='text_chat', room=getattr(self, 'room_id', None), code=close_code)
         
         # Set user offline and stop typing
         await self.set_user_offline()
@@ -947,49 +1013,23 @@ class TextChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
-    async def receive(self, text_data):
+    async def receive_message(self, data):
+        log_event('received', type=data.get('type'), room=self.room_id, user=self.user.pk)
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            
-            print(f"Received message type: {message_type} from user: {self.user.username}")
-            
-            if message_type == 'send_message':
-                await self.handle_send_message(data)
-            elif message_type == 'edit_message':
-                await self.handle_edit_message(data)
-            elif message_type == 'mark_messages_read':
-                await self.handle_mark_messages_read(data)
-            elif message_type == 'typing_start':
-                await self.handle_typing_start(data)
-            elif message_type == 'typing_stop':
-                await self.handle_typing_stop(data)
-            elif message_type == 'load_messages':
-                await self.handle_load_messages(data)
-            elif message_type == 'ping':
-                await self.send(text_data=json.dumps({
-                    'type': 'pong',
-                    'timestamp': data.get('timestamp')
-                }))
-            else:
-                print(f"Unknown message type: {message_type}")
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': f'Unknown message type: {message_type}'
-                }))
-                
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Invalid JSON data'
-            }))
+            await super().receive_message(data)
         except Exception as e:
-            print(f"Error in receive: {e}")
-            await self.send(text_data=json.dumps({
+            log_event('error', action='receive', room=self.room_id, user=self.user.pk, exc_info=True)
+            await self.send_event({
                 'type': 'error',
                 'message': f'Server error: {str(e)}'
-            }))
+            })
+
+    async def handle_ping(self, data):
+        """Answer a keepalive ping"""
+        await self.send_event({
+            'type': 'pong',
+            'timestamp': data.get('timestamp')
+        })
 
     async def handle_send_message(self, data):
         """Handle sending a new text message."""
@@ -997,18 +1037,18 @@ class TextChatConsumer(AsyncWebsocketConsumer):
         reply_to_id = data.get('reply_to')
         
         if not message_content:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Empty message content'
-            }))
+            })
             return
             
         # Validate message length
         if len(message_content) > 1000:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Message too long (max 1000 characters)'
-            }))
+            })
             return
         
         try:
@@ -1037,17 +1077,17 @@ class TextChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             else:
-                await self.send(text_data=json.dumps({
+                await self.send_event({
                     'type': 'error',
                     'message': 'Failed to save message'
-                }))
+                })
                 
-        except Exception as e:
-            print(f"Error handling send message: {e}")
-            await self.send(text_data=json.dumps({
+        except Exception:
+            log_event('error', action='send_message', room=self.room_id, user=self.user.pk, exc_info=True)
+            await self.send_event({
                 'type': 'error',
                 'message': 'Failed to send message'
-            }))
+            })
 
     async def handle_edit_message(self, data):
         """Handle editing an existing message."""
@@ -1055,10 +1095,10 @@ class TextChatConsumer(AsyncWebsocketConsumer):
         new_content = data.get('content', '').strip()
         
         if not message_id or not new_content:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'error',
                 'message': 'Invalid edit request'
-            }))
+            })
             return
         
         try:
@@ -1077,16 +1117,16 @@ class TextChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             else:
-                await self.send(text_data=json.dumps({
+                await self.send_event({
                     'type': 'error',
                     'message': 'Failed to edit message'
-                }))
-        except Exception as e:
-            print(f"Error handling edit message: {e}")
-            await self.send(text_data=json.dumps({
+                })
+        except Exception:
+            log_event('error', action='edit_message', room=self.room_id, user=self.user.pk, exc_info=True)
+            await self.send_event({
                 'type': 'error',
                 'message': 'Failed to edit message'
-            }))
+            })
 
     async def handle_mark_messages_read(self, data):
         """Handle marking messages as read."""
@@ -1131,34 +1171,34 @@ class TextChatConsumer(AsyncWebsocketConsumer):
         
         messages = await self.get_message_history(page, page_size)
         
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'message_history',
             'messages': messages,
             'page': page
-        }))
+        })
 
     # Group message handlers (events sent TO clients)
     async def user_joined(self, event):
         """Send user joined notification to client."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'user_joined',
             'user_id': event['user_id'],
             'username': event['username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def user_left(self, event):
         """Send user left notification to client."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'user_left',
             'user_id': event['user_id'],
             'username': event['username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def new_message(self, event):
         """Forward new message to clients."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'new_message',
             'message_id': event['message_id'],
             'content': event['content'],
@@ -1167,83 +1207,93 @@ class TextChatConsumer(AsyncWebsocketConsumer):
             'timestamp': event['timestamp'],
             'reply_to': event.get('reply_to'),
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def message_edited(self, event):
         """Forward message edit to clients."""
-        await self.send(text_data=json.dumps({
+        await self.send_event({
             'type': 'message_edited',
             'message_id': event['message_id'],
             'new_content': event['new_content'],
             'editor_id': event['editor_id'],
             'editor_username': event['editor_username'],
             'room_id': event.get('room_id', self.room_id)
-        }))
+        })
 
     async def typing_start(self, event):
         """Forward typing start notification to other users."""
         if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'typing_start',
                 'user_id': event['user_id'],
                 'username': event['username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     async def typing_stop(self, event):
         """Forward typing stop notification to other users."""
         if event['user_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
+            await self.send_event({
                 'type': 'typing_stop',
                 'user_id': event['user_id'],
                 'username': event['username'],
                 'room_id': event.get('room_id', self.room_id)
-            }))
+            })
 
     # Database operations
-    @database_sync_to_async
-    def check_chat_room_access(self):
+    async def check_chat_room_access(self):
+        """Check if user has access to the chat room, trusting a signed handshake token first."""
+        if token_grants_room(self.scope, 't', self.room_id):
+            return True
+        return await self.check_chat_room_access_db()
+
+    @db_sync_to_async('websocket')
+    def check_chat_room_access_db(self):
         """Check if user has access to the chat room."""
         try:
             from .models import ChatRoom
             
-            room = ChatRoom.objects.get(room_id=self.room_id)
-            return room.can_user_access(self.user)
-        except ChatRoom.DoesNotExist:
-            return False
-        except Exception as e:
-            print(f"Error checking chat room access: {e}")
+            self.room_pk = ChatRoom.objects.filter(
+                Q(match__user1=self.user) | Q(match__user2=self.user),
+                room_id=self.room_id
+            ).values_list('pk', flat=True).first()
+            return self.room_pk is not None
+        except Exception:
+            log_event('error', action='check_chat_room_access', room=self.room_id, user=self.user.pk, exc_info=True)
             return False
 
-    @database_sync_to_async
+    def get_room_pk(self):
+        """Primary key of the chat room, looked up once per connection; call from a DB helper."""
+        if getattr(self, 'room_pk', None) is None:
+            from .models import ChatRoom
+            
+            self.room_pk = ChatRoom.objects.filter(
+                room_id=self.room_id
+            ).values_list('pk', flat=True).first()
+        return self.room_pk
+
+    @db_sync_to_async('websocket')
     def save_chat_message(self, content, reply_to_id=None):
         """Save chat message to database."""
         try:
-            from .models import ChatRoom, ChatMessage
-            
-            room = ChatRoom.objects.get(room_id=self.room_id)
+            from .models import ChatMessage
             
-            reply_to = None
-            if reply_to_id:
-                try:
-                    reply_to = ChatMessage.objects.get(id=reply_to_id, room=room)
-                except ChatMessage.DoesNotExist:
-                    pass
+            room_pk = self.get_room_pk()
+            if reply_to_id and not ChatMessage.objects.filter(id=reply_to_id, room_id=room_pk).exists():
+                reply_to_id = None
             
-            message = ChatMessage.objects.create(
-                room=room,
+            return ChatMessage.objects.create(
+                room_id=room_pk,
                 sender=self.user,
                 content=content,
-                reply_to=reply_to
+                reply_to_id=reply_to_id
             )
-            print(f"Saved chat message: {message.id}")
-            return message
             
-        except Exception as e:
-            print(f"Error saving chat message: {e}")
+        except Exception:
+            log_event('error', action='save_chat_message', room=self.room_id, user=self.user.pk, exc_info=True)
             return None
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def edit_chat_message(self, message_id, new_content):
         """Edit a chat message."""
         try:
@@ -1262,25 +1312,27 @@ class TextChatConsumer(AsyncWebsocketConsumer):
             
         except ChatMessage.DoesNotExist:
             return False
-        except Exception as e:
-            print(f"Error editing chat message: {e}")
+        except Exception:
+            log_event('error', action='edit_chat_message', room=self.room_id, user=self.user.pk, exc_info=True)
             return False
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def mark_messages_read(self, message_ids):
         """Mark messages as read."""
         try:
+            from django.utils import timezone
             from .models import ChatMessage
             
             ChatMessage.objects.filter(
                 id__in=message_ids,
-                room__room_id=self.room_id
-            ).exclude(sender=self.user).update(is_read=True)
+                room_id=self.get_room_pk(),
+                is_read=False
+            ).exclude(sender=self.user).update(is_read=True, updated_at=timezone.now())
             
-        except Exception as e:
-            print(f"Error marking messages as read: {e}")
+        except Exception:
+            log_event('error', action='mark_messages_read', room=self.room_id, user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def get_message_history(self, page=1, page_size=50):
         """Get message history for the chat room."""
         try:
@@ -1314,65 +1366,267 @@ class TextChatConsumer(AsyncWebsocketConsumer):
             
             return messages
             
-        except Exception as e:
-            print(f"Error getting message history: {e}")
+        except Exception:
+            log_event('error', action='message_history', room=self.room_id, user=self.user.pk, exc_info=True)
             return []
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def set_typing_status(self, is_typing):
         """Set typing status for the user."""
         try:
-            from .models import ChatRoom, TypingStatus
+            from .models import TypingStatus
             
-            room = ChatRoom.objects.get(room_id=self.room_id)
-            TypingStatus.set_typing(room, self.user, is_typing)
+            TypingStatus.objects.update_or_create(
+                room_id=self.get_room_pk(),
+                user=self.user,
+                defaults={'is_typing': is_typing}
+            )
             
-        except Exception as e:
-            print(f"Error setting typing status: {e}")
+        except Exception:
+            log_event('error', action='set_typing', room=self.room_id, user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def stop_typing(self):
         """Stop typing for the user."""
         try:
-            from .models import ChatRoom, TypingStatus
+            from django.utils import timezone
+            from .models import TypingStatus
             
-            room = ChatRoom.objects.get(room_id=self.room_id)
-            TypingStatus.set_typing(room, self.user, False)
+            TypingStatus.objects.filter(
+                room_id=self.get_room_pk(),
+                user=self.user,
+                is_typing=True
+            ).update(is_typing=False, last_typed=timezone.now())
             
-        except Exception as e:
-            print(f"Error stopping typing: {e}")
+        except Exception:
+            log_event('error', action='stop_typing', room=self.room_id, user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def set_user_online(self):
         """Set user as online for this chat room."""
         try:
-            from .models import UserPresence, ChatRoom
+            from .models import UserPresence
             
-            room = ChatRoom.objects.get(room_id=self.room_id)
-            UserPresence.update_presence(self.user, is_online=True)
+            UserPresence.objects.update_or_create(
+                user=self.user,
+                defaults={'is_online': True}
+            )
             
-        except Exception as e:
-            print(f"Error setting user online: {e}")
+        except Exception:
+            log_event('error', action='set_online', user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def set_user_offline(self):
         """Set user as offline."""
         try:
             from .models import UserPresence
             
-            UserPresence.update_presence(self.user, is_online=False)
+            UserPresence.objects.update_or_create(
+                user=self.user,
+                defaults={'is_online': False, 'current_room': None}
+            )
             
-        except Exception as e:
-            print(f"Error setting user offline: {e}")
+        except Exception:
+            log_event('error', action='set_offline', user=self.user.pk, exc_info=True)
 
-    @database_sync_to_async
+    @db_sync_to_async('websocket')
     def update_room_activity(self):
         """Update the room's last activity timestamp."""
         try:
+            from django.utils import timezone
             from .models import ChatRoom
             
-            room = ChatRoom.objects.get(room_id=self.room_id)
-            room.update_activity()
+            ChatRoom.objects.filter(
+                pk=self.get_room_pk()
+            ).update(last_activity=timezone.now())
             
-        except Exception as e:
-            print(f"Error updating room activity: {e}") 
\ No newline at end of file
+        except Exception:
+            log_event('error', action='update_room_activity', room=self.room_id, exc_info=True)
+
+class StreamProxyMixin:
+    """Run a regular consumer as one stream of a MultiplexConsumer.
+    
+    The wrapped consumer keeps its own channel name and group memberships;
+    accept/send/close go through the parent connection instead of the socket.
+    Frames sent while ``connect()`` runs are held back until the stream is
+    confirmed (or flushed ahead of its ``unsubscribed`` when it is rejected),
+    so clients see the same order as on a socket of their own.
+    """
+    
+    def bind_stream(self, multiplexer, stream):
+        self.multiplexer = multiplexer
+        self.stream = stream
+        self.stream_accepted = False
+        self.stream_pending = []
+    
+    async def accept(self, subprotocol=None):
+        self.stream_accepted = True
+    
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is not None:
+            await self.send_event(json.loads(text_data))
+        if close:
+            await self.close(close)
+    
+    async def send_event(self, data, key=None):
+        if self.stream_pending is not None:
+            self.stream_pending.append((data, key))
+            return
+        await self.multiplexer.send_stream(self.stream, data, key)
+    
+    async def flush_stream(self):
+        pending, self.stream_pending = self.stream_pending or [], None
+        for data, key in pending:
+            await self.multiplexer.send_stream(self.stream, data, key)
+    
+    async def close(self, code=None):
+        await self.flush_stream()
+        await self.multiplexer.close_stream(self.stream, code)
+
+
+class MultiplexConsumer(ProtocolMixin, AsyncWebsocketConsumer):
+    """Single websocket per user carrying notifications, text chats and video signaling.
+    
+    Client frames:
+        {"type": "subscribe", "stream": "text_chat:<room_id>"}
+        {"type": "unsubscribe", "stream": "text_chat:<room_id>"}
+        {"stream": "text_chat:<room_id>", "payload": {...}}
+    
+    Server frames:
+        {"type": "subscribed" | "unsubscribed", "stream": "..."}
+        {"stream": "...", "payload": {...}}
+    
+    Streams are ``notifications``, ``text_chat:<room_id>`` and ``video:<room_id>``.
+    With the msgpack subprotocol both the frame and its payload use short
+    field codes.
+    """
+    
+    message_handlers = {
+        'subscribe': 'handle_subscribe',
+        'unsubscribe': 'handle_unsubscribe',
+    }
+    
+    stream_consumers = {
+        'notifications': type('NotificationStream', (StreamProxyMixin, UserNotificationConsumer), {}),
+        'text_chat': type('TextChatStream', (StreamProxyMixin, TextChatConsumer), {}),
+        'video': type('VideoCallStream', (StreamProxyMixin, VideoCallConsumer), {}),
+    }
+    
+    async def connect(self):
+        self.user = self.scope['user']
+        self.streams = {}
+        self.stream_tasks = {}
+        
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        
+        await self.accept()
+    
+    async def disconnect(self, close_code):
+        for stream in list(getattr(self, 'streams', {})):
+            await self.close_stream(stream, close_code, notify=False)
+    
+    async def receive_message(self, data):
+        stream = data.get('stream')
+        if data.get('type') in self.message_handlers:
+            await super().receive_message(data)
+        elif stream in self.streams:
+            payload = data.get('payload', {})
+            await self.streams[stream].receive_message(expand(payload) if self.binary_protocol else payload)
+        else:
+            await self.send_control('error', stream=stream, message='Not subscribed to stream')
+    
+    async def handle_subscribe(self, data):
+        await self.open_stream(data.get('stream'))
+    
+    async def handle_unsubscribe(self, data):
+        await self.close_stream(data.get('stream'), 1000)
+    
+    def parse_stream(self, stream):
+        """Split a stream name into its consumer class and URL kwargs."""
+        kind, _, room_id = (stream or '').partition(':')
+        consumer_class = self.stream_consumers.get(kind)
+        if consumer_class is None or (kind == 'notifications') != (room_id == ''):
+            return None, None
+        return consumer_class, ({'room_id': room_id} if room_id else {})
+    
+    async def open_stream(self, stream):
+        if stream in self.streams:
+            # A stream still connecting confirms itself once connect() returns
+            if self.streams[stream].stream_accepted:
+                await self.send_control('subscribed', stream=stream)
+            return
+        
+        consumer_class, kwargs = self.parse_stream(stream)
+        if consumer_class is None:
+            await self.send_control('error', stream=stream, message='Unknown stream')
+            return
+        
+        max_streams = getattr(settings, 'MULTIPLEX_MAX_STREAMS', 8)
+        if len(self.streams) >= max_streams:
+            await self.send_control('error', stream=stream, message=f'Too many streams (max {max_streams})')
+            return
+        
+        handler = consumer_class()
+        handler.bind_stream(self, stream)
+        handler.scope = {**self.scope, 'url_route': {'args': (), 'kwargs': kwargs}}
+        handler.channel_layer = self.channel_layer
+        handler.channel_name = await self.channel_layer.new_channel()
+        
+        self.streams[stream] = handler
+        self.stream_tasks[stream] = asyncio.ensure_future(self.pump_stream(handler))
+        try:
+            await handler.connect()
+        except Exception:
+            log_event('error', action='multiplex_connect', stream=stream, exc_info=True)
+            try:
+                await self.close_stream(stream, notify=False)
+            except Exception:
+                log_event('error', action='multiplex_disconnect', stream=stream, exc_info=True)
+            await self.send_control('error', stream=stream, message='Could not open stream')
+            return
+        
+        # Consumers accept before their checks so they can report errors; only a
+        # stream still registered after connect() returns was let in
+        if self.streams.get(stream) is not handler:
+            return
+        if handler.stream_accepted:
+            await self.send_control('subscribed', stream=stream)
+            await handler.flush_stream()
+        else:
+            await handler.close()
+    
+    async def close_stream(self, stream, code=None, notify=True):
+        handler = self.streams.pop(stream, None)
+        if handler is None:
+            return
+        
+        task = self.stream_tasks.pop(stream, None)
+        try:
+            await handler.disconnect(code)
+        finally:
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        
+        if notify:
+            await self.send_control('unsubscribed', stream=stream, code=code)
+    
+    async def pump_stream(self, handler):
+        """Deliver channel layer events for one stream to its handler."""
+        while True:
+            message = await self.channel_layer.receive(handler.channel_name)
+            try:
+                await handler.dispatch(message)
+            except Exception:
+                log_event('error', action='multiplex_dispatch', type=message.get('type'), stream=handler.stream, exc_info=True)
+    
+    async def send_stream(self, stream, data, key=None):
+        if self.binary_protocol:
+            frame = {'bytes_data': pack({'stream': stream, 'payload': compact(data)})}
+        else:
+            frame = self.encode_event({'stream': stream, 'payload': data})
+        await self.queue_frame(frame, (stream, *key) if key else coalesce_key(data, stream))
+    
+    async def send_control(self, message_type, **fields):
+        await self.send_event({'type': message_type, **fields})
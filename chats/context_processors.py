@@ -0,0 +1,11 @@
+from .tokens import mint_websocket_token
+
+
+def websocket_token(request):
+    """Provide a signed websocket token for the notification stream.
+    
+    Room pages override ``ws_token`` with a token that also grants their room.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'ws_token': mint_websocket_token(request.user)}
@@ -0,0 +1,231 @@
+"""
+Named, sized pools for sync work under ASGI.
+
+- ``websocket``: thread pool for the consumers' sync database helpers
+  (``db_sync_to_async``), so they no longer queue behind each other on
+  asgiref's single thread-sensitive thread.
+- ``http``: cap on HTTP requests in flight. Django runs each sync view on its
+  own request thread, so the cap is what bounds those threads.
+- ``batch``: small thread pool for heavy work such as match refreshes and
+  invitation expiry, so bursts of it can't crowd out chat traffic.
+
+Each pool reports queue wait, active workers and task latency.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+DEFAULT_EXECUTOR_SIZES = {
+    'websocket': 8,
+    'http': 16,
+    'batch': 2,
+}
+
+
+class PoolBusy(Exception):
+    """Raised when a pool could not start a task within its start timeout."""
+
+
+class PoolStats:
+    """Thread-safe counters shared by executors and the request limiter."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.waiting = 0
+        self.active = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def queued(self):
+        with self._lock:
+            self.submitted += 1
+            self.waiting += 1
+        return time.perf_counter()
+
+    def started(self, queued_at):
+        now = time.perf_counter()
+        wait = now - queued_at
+        with self._lock:
+            self.waiting -= 1
+            self.active += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return now
+
+    def withdrawn(self):
+        """Forget a queued task that was cancelled before it started."""
+        with self._lock:
+            self.submitted -= 1
+            self.waiting -= 1
+
+    def finished(self, started_at, failed=False):
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            self.failed += failed
+            self.run_total += elapsed
+            self.run_max = max(self.run_max, elapsed)
+
+    def snapshot(self, size):
+        with self._lock:
+            started = self.submitted - self.waiting
+            return {
+                'size': size,
+                'active': self.active,
+                'waiting': self.waiting,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': round(self.wait_total / started * 1000, 2) if started else 0.0,
+                'max_wait_ms': round(self.wait_max * 1000, 2),
+                'avg_task_ms': round(self.run_total / self.completed * 1000, 2) if self.completed else 0.0,
+                'max_task_ms': round(self.run_max * 1000, 2),
+            }
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that records queue wait and task latency."""
+
+    def __init__(self, name, max_workers):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f'{name}-pool')
+        self.name = name
+        self.size = max_workers
+        self.stats = PoolStats()
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued_at = self.stats.queued()
+
+        def run():
+            started_at = self.stats.started(queued_at)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                self.stats.finished(started_at, failed)
+
+        return super().submit(run)
+
+    def withdraw(self, future):
+        """Cancel ``future`` if no worker has picked it up yet; returns whether it was."""
+        if not future.cancel():
+            return False
+        self.stats.withdrawn()
+        return True
+
+    def metrics(self):
+        return self.stats.snapshot(self.size)
+
+
+class RequestLimiter:
+    """Bound the number of requests in flight with the same metrics as a pool."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.stats = PoolStats()
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def run(self, call):
+        """Await ``call(release)`` in a slot, held until it returns or calls ``release()``."""
+        queued_at = self.stats.queued()
+        await self._semaphore.acquire()
+        started_at = self.stats.started(queued_at)
+        held = True
+
+        def release(failed=False):
+            nonlocal held
+            if held:
+                held = False
+                self.stats.finished(started_at, failed)
+                self._semaphore.release()
+
+        try:
+            return await call(release)
+        except BaseException:
+            release(failed=True)
+            raise
+        finally:
+            release()
+
+    def metrics(self):
+        return self.stats.snapshot(self.size)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def executor_size(name):
+    sizes = {**DEFAULT_EXECUTOR_SIZES, **getattr(settings, 'DB_EXECUTOR_SIZES', {})}
+    return sizes[name]
+
+
+def get_executor(name):
+    """Return the named thread pool, creating it on first use."""
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = InstrumentedExecutor(name, executor_size(name))
+        return _pools[name]
+
+
+def get_request_limiter():
+    with _pools_lock:
+        if 'http' not in _pools:
+            _pools['http'] = RequestLimiter('http', executor_size('http'))
+        return _pools['http']
+
+
+def db_sync_to_async(executor='websocket'):
+    """Like ``database_sync_to_async`` but runs on the named pool."""
+    def decorator(func):
+        return DatabaseSyncToAsync(func, thread_sensitive=False, executor=get_executor(executor))
+    return decorator
+
+
+def _run_with_connection_cleanup(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run_in_executor(name, func, *args, start_timeout=None, **kwargs):
+    """Run sync ``func`` on the named pool and wait for the result.
+
+    Work inside an open transaction stays on the calling thread, since other
+    threads can't see its uncommitted rows. With ``start_timeout``, work that
+    no worker has picked up within that many seconds is withdrawn and
+    ``PoolBusy`` is raised, so a caller holding a request slot never waits
+    behind a saturated pool and the work never lands on its thread.
+    """
+    if connection.in_atomic_block:
+        return func(*args, **kwargs)
+    executor = get_executor(name)
+    future = executor.submit(_run_with_connection_cleanup, func, *args, **kwargs)
+    if start_timeout is not None:
+        try:
+            return future.result(timeout=start_timeout)
+        except FutureTimeoutError:
+            if executor.withdraw(future):
+                raise PoolBusy(f'The {name} pool did not start the task within {start_timeout:g}s')
+    return future.result()
+
+
+def executor_metrics():
+    pools = [get_executor('websocket'), get_request_limiter(), get_executor('batch')]
+    return {pool.name: pool.metrics() for pool in pools}
@@ -0,0 +1,174 @@
+"""
+In-process timer wheel that expires call invitations at their deadline.
+
+Invitations are scheduled when they are created and recovered from the
+database when the ASGI server starts. Due invitations are expired in batched
+UPDATEs and both the caller and the receiver get a ``call_invitation_expired``
+notification over their notification websocket.
+"""
+import asyncio
+import logging
+import math
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .executors import db_sync_to_async
+
+logger = logging.getLogger(__name__)
+
+
+class InvitationExpiryWheel:
+    """Hashed timer wheel keyed by invitation id.
+
+    Each slot holds the invitations that fall due on that tick; entries that
+    are further away than one full revolution carry a ``rounds`` counter that
+    is decremented every time their slot comes round.
+    """
+
+    def __init__(self, tick_seconds=None, slots=None, batch_size=None):
+        self.tick_seconds = tick_seconds or getattr(settings, 'INVITATION_EXPIRY_TICK_SECONDS', 1.0)
+        self.slot_count = slots or getattr(settings, 'INVITATION_EXPIRY_WHEEL_SLOTS', 512)
+        self.batch_size = batch_size or getattr(settings, 'INVITATION_EXPIRY_BATCH_SIZE', 500)
+        self._slots = [dict() for _ in range(self.slot_count)]
+        self._index = {}  # invitation_id -> slot number
+        self._cursor = 0
+        self._loop = None
+        self._task = None
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def __len__(self):
+        return len(self._index)
+
+    def ensure_started(self):
+        """Start the wheel on the running event loop (idempotent)."""
+        if self.is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._loop = None
+
+    def schedule(self, invitation_id, caller_id, receiver_id, expires_at):
+        """Schedule an invitation. Must be called on the wheel's event loop."""
+        self.cancel(invitation_id)
+        delay = (expires_at - timezone.now()).total_seconds()
+        ticks = max(0, math.ceil(delay / self.tick_seconds))
+        slot = (self._cursor + ticks) % self.slot_count
+        self._slots[slot][invitation_id] = [ticks // self.slot_count, caller_id, receiver_id]
+        self._index[invitation_id] = slot
+
+    def cancel(self, invitation_id):
+        """Drop an invitation that was answered or cancelled before expiring."""
+        slot = self._index.pop(invitation_id, None)
+        if slot is not None:
+            self._slots[slot].pop(invitation_id, None)
+
+    def schedule_threadsafe(self, invitation):
+        """Schedule from a sync view thread. Returns False if the wheel is not running."""
+        if not self.is_running:
+            return False
+        self._loop.call_soon_threadsafe(
+            self.schedule,
+            invitation.id, invitation.caller_id, invitation.receiver_id, invitation.expires_at,
+        )
+        return True
+
+    def cancel_threadsafe(self, invitation_id):
+        if self.is_running:
+            self._loop.call_soon_threadsafe(self.cancel, invitation_id)
+
+    def advance(self):
+        """Process the current slot and move the cursor; returns the due entries."""
+        bucket = self._slots[self._cursor]
+        due = []
+        for invitation_id, entry in list(bucket.items()):
+            if entry[0] <= 0:
+                del bucket[invitation_id]
+                self._index.pop(invitation_id, None)
+                due.append((invitation_id, entry[1], entry[2]))
+            else:
+                entry[0] -= 1
+        self._cursor = (self._cursor + 1) % self.slot_count
+        return due
+
+    async def expire(self, due):
+        """Expire due invitations in batches and notify both parties."""
+        expired = []
+        for start in range(0, len(due), self.batch_size):
+            expired.extend(await self._expire_batch(due[start:start + self.batch_size]))
+
+        channel_layer = get_channel_layer()
+        for invitation_id, caller_id, receiver_id in expired:
+            event = {'type': 'call_invitation_expired', 'invitation_id': invitation_id}
+            for user_id in (caller_id, receiver_id):
+                await channel_layer.group_send(f'user_notifications_{user_id}', event)
+        return expired
+
+    @db_sync_to_async('batch')
+    def _expire_batch(self, batch):
+        from django.core.cache import cache
+        from .models import CallInvitation
+
+        entries = {invitation_id: (caller_id, receiver_id) for invitation_id, caller_id, receiver_id in batch}
+        # Lock the rows so an accept or decline can't land between the read and the
+        # update; only invitations this update actually expired are notified
+        with transaction.atomic():
+            still_pending = list(CallInvitation.objects.select_for_update().filter(
+                id__in=entries.keys(),
+                status='pending',
+            ).order_by().values_list('id', flat=True))
+            if not still_pending:
+                return []
+            CallInvitation.objects.filter(id__in=still_pending).update(status='expired')
+        cache.delete_many([f"pending_invitations_{entries[i][1]}" for i in still_pending])
+        return [(i, *entries[i]) for i in still_pending]
+
+    @db_sync_to_async('batch')
+    def _load_pending(self):
+        from .models import CallInvitation
+
+        return list(CallInvitation.objects.filter(status='pending').values_list(
+            'id', 'caller_id', 'receiver_id', 'expires_at'
+        ))
+
+    async def recover(self):
+        """Reload pending invitations from the database after a restart."""
+        pending = await self._load_pending()
+        for invitation_id, caller_id, receiver_id, expires_at in pending:
+            self.schedule(invitation_id, caller_id, receiver_id, expires_at)
+        logger.info("Recovered %d pending call invitations into the expiry wheel", len(pending))
+
+    async def _run(self):
+        try:
+            await self.recover()
+        except Exception:
+            logger.exception("Failed to recover pending call invitations")
+
+        next_tick = self._loop.time()
+        while True:
+            due = self.advance()
+            if due:
+                try:
+                    await self.expire(due)
+                except Exception:
+                    logger.exception("Failed to expire %d call invitations", len(due))
+            next_tick += self.tick_seconds
+            await asyncio.sleep(max(0.0, next_tick - self._loop.time()))
+
+
+invitation_expiry_wheel = InvitationExpiryWheel()
+
@@ -0,0 +1,73 @@
+"""
+Server-driven heartbeats for websocket connections.
+
+Every accepted connection gets a ``Heartbeat`` task that sends a
+``{"type": "heartbeat"}`` frame each ``WEBSOCKET_HEARTBEAT_INTERVAL`` seconds.
+Any frame from the client (a ``heartbeat_ack``, a ``ping`` or real traffic)
+counts as a sign of life. A connection that stays silent for
+``WEBSOCKET_HEARTBEAT_MISSED_LIMIT`` consecutive intervals is reaped: closed
+with ``HEARTBEAT_TIMEOUT_CLOSE_CODE`` and run through its normal disconnect
+cleanup, so presence and group memberships don't outlive dead TCP sockets.
+"""
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+
+from .log import log_event
+
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 4001
+
+_heartbeats = weakref.WeakSet()
+_totals = {'sent': 0, 'reaped': 0}
+
+
+class Heartbeat:
+    """Periodic liveness check for one connection."""
+
+    def __init__(self, send_beat, on_timeout, interval=None, missed_limit=None, clock=time.monotonic):
+        self.send_beat = send_beat
+        self.on_timeout = on_timeout
+        self.interval = interval or getattr(settings, 'WEBSOCKET_HEARTBEAT_INTERVAL', 25.0)
+        self.missed_limit = missed_limit or getattr(settings, 'WEBSOCKET_HEARTBEAT_MISSED_LIMIT', 2)
+        self.clock = clock
+        self.last_seen = clock()
+        self.missed = 0
+        self._task = None
+        _heartbeats.add(self)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def touch(self):
+        """Record a frame from the client."""
+        self.last_seen = self.clock()
+        self.missed = 0
+
+    def stop(self):
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        _heartbeats.discard(self)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.clock() - self.last_seen >= self.interval:
+                self.missed += 1
+            if self.missed >= self.missed_limit:
+                _totals['reaped'] += 1
+                self.stop()
+                await self.on_timeout()
+                return
+            _totals['sent'] += 1
+            await self.send_beat()
+
+
+def heartbeat_metrics():
+    return {
+        'connections': len(_heartbeats),
+        'interval': getattr(settings, 'WEBSOCKET_HEARTBEAT_INTERVAL', 25.0),
+        'missed_limit': getattr(settings, 'WEBSOCKET_HEARTBEAT_MISSED_LIMIT', 2),
+        **_totals,
+    }
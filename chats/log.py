@@ -0,0 +1,161 @@
+"""
+Structured logging for the websocket consumers.
+
+Consumers call ``log_event('ice_candidate', user=..., room=...)`` instead of
+printing. Each event type has its own level, high-frequency events are
+rate-limited per second, and records are written by a background thread
+through ``NonBlockingQueueHandler`` so the event loop never blocks on stdout.
+Message bodies are only logged when ``WEBSOCKET_LOG_MESSAGE_BODIES`` is on.
+"""
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueListener
+
+from django.conf import settings
+
+logger = logging.getLogger('chats.websocket')
+
+DEFAULT_EVENT_LEVELS = {
+    'connect': logging.INFO,
+    'disconnect': logging.INFO,
+    'auth_required': logging.INFO,
+    'access_denied': logging.WARNING,
+    'room_joined': logging.DEBUG,
+    'room_created': logging.INFO,
+    'received': logging.DEBUG,
+    'unknown_message': logging.WARNING,
+    'invalid_json': logging.WARNING,
+    'offer': logging.DEBUG,
+    'answer': logging.DEBUG,
+    'ice_candidate': logging.DEBUG,
+    'forward': logging.DEBUG,
+    'peer_ready': logging.DEBUG,
+    'media_status': logging.DEBUG,
+    'chat_message': logging.DEBUG,
+    'typing': logging.DEBUG,
+    'call_start': logging.INFO,
+    'call_end': logging.INFO,
+    'session_created': logging.INFO,
+    'session_joined': logging.INFO,
+    'session_ended': logging.INFO,
+    'slow_consumer': logging.WARNING,
+    'reaped': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# Events that can fire many times a second per connection
+SAMPLED_EVENTS = frozenset({
+    'received', 'ice_candidate', 'forward', 'typing', 'chat_message', 'media_status',
+})
+
+
+class EventSampler:
+    """Let at most ``limit`` records per event type through each second.
+
+    Suppressed records are counted and the count is attached to the next
+    record that gets through, so volume is still visible in the logs.
+    """
+
+    def __init__(self, limit, clock=time.monotonic):
+        self.limit = limit
+        self.clock = clock
+        self._windows = {}  # event -> [window_start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def allow(self, event):
+        """Return ``(allowed, suppressed_since_last)``."""
+        now = self.clock()
+        with self._lock:
+            window = self._windows.get(event)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window else 0
+                self._windows[event] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < self.limit:
+                window[1] += 1
+                suppressed, window[2] = window[2], 0
+                return True, suppressed
+            window[2] += 1
+            return False, 0
+
+
+sampler = EventSampler(getattr(settings, 'WEBSOCKET_LOG_SAMPLE_LIMIT', 20))
+
+
+def event_level(event):
+    overrides = getattr(settings, 'WEBSOCKET_LOG_LEVELS', {})
+    level = overrides.get(event, DEFAULT_EVENT_LEVELS.get(event, logging.INFO))
+    return logging.getLevelName(level) if isinstance(level, str) else level
+
+
+def log_event(event, exc_info=False, **fields):
+    """Log a consumer event with structured fields."""
+    level = event_level(event)
+    if not logger.isEnabledFor(level):
+        return
+    if event in SAMPLED_EVENTS:
+        allowed, suppressed = sampler.allow(event)
+        if not allowed:
+            return
+        if suppressed:
+            fields['suppressed'] = suppressed
+    logger.log(level, event, exc_info=exc_info, extra={'event': event, 'fields': fields})
+
+
+def message_body(content):
+    """Log-safe representation of a chat message body."""
+    if getattr(settings, 'WEBSOCKET_LOG_MESSAGE_BODIES', False):
+        return content
+    return f'<{len(content or "")} chars>'
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None) or record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.Handler):
+    """Hand records to a bounded queue written out by a listener thread.
+
+    When the queue is full records are dropped and counted rather than
+    blocking the caller.
+    """
+
+    def __init__(self, queue_size=10000, level=logging.NOTSET):
+        super().__init__(level)
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.target = logging.StreamHandler()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
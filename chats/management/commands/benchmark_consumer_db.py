@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chats.benchmark import throwaway_database
+from chats.consumers import TextChatConsumer
+from chats.models import ChatRoom
+from matches.models import Match
+from users.models import Language
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure messages per second through the text chat consumer database layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections',
+            type=int,
+            default=20,
+            help='Concurrent simulated connections (default: 20)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Message rounds per connection (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        connections = options['connections']
+        iterations = options['iterations']
+
+        # A throwaway test database keeps the fixtures and benchmark messages out of real data
+        with throwaway_database():
+            users = self.create_fixtures('bench', connections)
+            consumers = [self.build_consumer(user, room_id) for user, room_id in users]
+            elapsed, frames = async_to_sync(self.run)(consumers, iterations)
+
+        self.stdout.write(f"Connections: {connections}")
+        self.stdout.write(f"Frames:      {frames}")
+        self.stdout.write(f"Elapsed:     {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Throughput:  {frames / elapsed:.0f} messages/s"))
+
+    def create_fixtures(self, prefix, connections):
+        """One active match and chat room per pair of connections."""
+        english = Language.objects.create(code='en', name='English')
+        korean = Language.objects.create(code='ko', name='Korean')
+
+        users = []
+        for pair in range((connections + 1) // 2):
+            user1 = User.objects.create_user(username=f'{prefix}_{pair}_a', password='bench')
+            user2 = User.objects.create_user(username=f'{prefix}_{pair}_b', password='bench')
+            match = Match.objects.create(
+                user1=user1, user2=user2,
+                user1_teaches=english, user1_learns=korean,
+                status='active'
+            )
+            room = ChatRoom.objects.create(match=match)
+            users.extend([(user1, str(room.room_id)), (user2, str(room.room_id))])
+        return users[:connections]
+
+    def build_consumer(self, user, room_id):
+        consumer = TextChatConsumer()
+        consumer.scope = {'user': user, 'url_route': {'kwargs': {'room_id': room_id}}}
+        consumer.user = user
+        consumer.room_id = room_id
+        return consumer
+
+    async def run(self, consumers, iterations):
+        """Replay typing, send and read-receipt frames; returns (elapsed, frames)."""
+
+        async def connection(consumer):
+            await consumer.check_chat_room_access_db()
+            await consumer.set_user_online()
+            for _ in range(iterations):
+                await consumer.set_typing_status(True)
+                message = await consumer.save_chat_message('benchmark message')
+                await consumer.stop_typing()
+                await consumer.update_room_activity()
+                await consumer.mark_messages_read([message.id])
+            await consumer.set_user_offline()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(connection(consumer) for consumer in consumers))
+        return time.perf_counter() - start, len(consumers) * (iterations * 3 + 2)
@@ -0,0 +1,117 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from chats.benchmark import (
+    DEFAULT_LAYER_LATENCY, DEFAULT_THRESHOLD, LAYERS, SCENARIOS, compare, run_benchmark, throwaway_database,
+)
+
+
+def parse_choices(value, choices, option):
+    selected = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = set(selected) - set(choices)
+    if unknown:
+        raise CommandError(f"Unknown {option}: {', '.join(sorted(unknown))} (choose from {', '.join(choices)})")
+    return selected
+
+
+class Command(BaseCommand):
+    help = 'Measure websocket consumer throughput, broadcast latency, queries per message and event-loop lag'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layers', default='memory,local', help=f"Channel layers to run against: {', '.join(LAYERS)} (default: memory,local)")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Scenarios to run (default: {','.join(SCENARIOS)})")
+        parser.add_argument('--rooms', type=int, default=20, help='Concurrent rooms, two clients each (default: 20)')
+        parser.add_argument('--messages', type=int, default=20, help='Chat messages per client (default: 20)')
+        parser.add_argument('--typing-burst', type=int, default=3, help='typing_start frames before each message (default: 3)')
+        parser.add_argument('--candidates', type=int, default=50, help='ICE candidates per client in the ICE storm (default: 50)')
+        parser.add_argument('--notifications', type=int, default=20, help='Notifications per user (default: 20)')
+        parser.add_argument('--rate', type=float, default=0, help='Messages per second per client; 0 sends as fast as possible (default: 0)')
+        parser.add_argument('--rate-limits', action='store_true', help='Keep the message rate limits instead of lifting them')
+        parser.add_argument(
+            '--layer-latency', type=float, default=DEFAULT_LAYER_LATENCY * 1000,
+            help=f'Simulated round trip of the local layer stand-in in ms (default: {DEFAULT_LAYER_LATENCY * 1000:g})'
+        )
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379', help='Redis server for the redis layer')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', metavar='BASELINE', help='Flag regressions against this results file')
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help=f'Percent change that counts as a regression (default: {DEFAULT_THRESHOLD:g})'
+        )
+
+    def handle(self, *args, **options):
+        layers = parse_choices(options['layers'], LAYERS, 'layer')
+        scenarios = parse_choices(options['scenarios'], SCENARIOS, 'scenario')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rooms': options['rooms'],
+            'rate': options['rate'],
+            'rate_limits': options['rate_limits'],
+            'layers': {},
+        }
+        # Per-frame INFO records would bury the results; -v 2 keeps them
+        if options['verbosity'] < 2:
+            logging.getLogger('chats.websocket').setLevel(logging.WARNING)
+
+        # A throwaway test database keeps the fixtures and their messages out of real data
+        with throwaway_database():
+            for layer in layers:
+                self.stdout.write(self.style.HTTP_INFO(f'⏱️  {layer} layer, {options["rooms"]} rooms'))
+                results['layers'][layer] = run_benchmark(
+                    layer, scenarios,
+                    rooms=options['rooms'],
+                    messages=options['messages'],
+                    typing_burst=options['typing_burst'],
+                    candidates=options['candidates'],
+                    notifications=options['notifications'],
+                    rate=options['rate'],
+                    rate_limits=options['rate_limits'],
+                    latency=options['layer_latency'] / 1000,
+                    redis_url=options['redis_url'],
+                )
+                for name, summary in results['layers'][layer].items():
+                    self.write_scenario(name, summary)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if baseline is None:
+            return
+        regressions = compare(baseline, results, options['threshold'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"  {regression['layer']} {regression['scenario']} {regression['metric']}: "
+                f"{regression['baseline']} → {regression['current']} ({regression['change']:+}%)"
+            ))
+        raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+
+    def write_scenario(self, name, summary):
+        latency = summary['latency_ms'] or {'p50': 0, 'p95': 0, 'p99': 0}
+        lag = summary['loop_lag_ms'] or {'p99': 0, 'max': 0}
+        self.stdout.write(
+            f"  {name:<14} {summary['messages_per_second']:>9.1f} msg/s  "
+            f"latency p50/p95/p99 {latency['p50']:.1f}/{latency['p95']:.1f}/{latency['p99']:.1f} ms  "
+            f"{summary['queries_per_message']:>5.2f} queries/msg  loop lag p99 {lag['p99']:.1f} ms (max {lag['max']:.1f})"
+        )
+        if summary['lost'] or summary['rate_limited']:
+            self.stdout.write(self.style.WARNING(
+                f"  {'':<14} {summary['lost']} lost, {summary['rate_limited']} rate limited of {summary['messages_sent']}"
+            ))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from chats.models import CallInvitation
-from datetime import timedelta
+from main.retention import POLICIES, purge
 
 class Command(BaseCommand):
     help = 'Cleanup expired call invitations from the database'
@@ -18,83 +18,78 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Invitations deleted per transaction (default: RETENTION_BATCH_SIZE)'
+        )
 
     def handle(self, *args, **options):
         days = options['days']
         dry_run = options['dry_run']
+        policy = POLICIES['call_invitations']
         
         # Calculate cutoff time
-        cutoff_time = timezone.now() - timedelta(days=days)
-        
-        # Find expired invitations
-        expired_invitations = CallInvitation.objects.filter(
-            created_at__lt=cutoff_time
-        ).exclude(status='pending')  # Don't delete pending ones, just mark them expired
+        now = timezone.now()
+        cutoff_time = now - timezone.timedelta(days=days)
         
-        # Find pending invitations that should be marked as expired
+        # Old answered invitations are deleted; pending ones are only marked expired
+        expired_invitations = policy.expired(cutoff_time)
         pending_expired = CallInvitation.objects.filter(
             status='pending',
-            expires_at__lt=timezone.now()
+            expires_at__lt=now
         )
         
-        expired_count = expired_invitations.count()
-        pending_count = pending_expired.count()
-        
         if dry_run:
+            expired_by_status = policy.status_counts(expired_invitations)
+            # The real run marks these expired before purging, so they are deleted too
+            old_pending = pending_expired.filter(created_at__lt=cutoff_time).count()
+            if old_pending:
+                expired_by_status['expired'] = expired_by_status.get('expired', 0) + old_pending
+            expired_count = sum(expired_by_status.values())
             self.stdout.write(
-                self.style.WARNING(f"DRY RUN - Would delete {expired_count} old invitations")
+                self.style.WARNING(f"DRY RUN - Would delete {expired_count} old invitations {expired_by_status or ''}")
             )
+            pending_count = pending_expired.count()
             self.stdout.write(
                 self.style.WARNING(f"DRY RUN - Would mark {pending_count} pending invitations as expired")
             )
             
-            if expired_count > 0:
-                self.stdout.write("Old invitations to delete:")
-                for invitation in expired_invitations[:10]:  # Show first 10
-                    self.stdout.write(f"  - ID {invitation.id}: {invitation.caller.username} -> {invitation.receiver.username} ({invitation.status}) - {invitation.created_at}")
-                if expired_count > 10:
-                    self.stdout.write(f"  ... and {expired_count - 10} more")
-            
             if pending_count > 0:
                 self.stdout.write("Pending invitations to mark as expired:")
-                for invitation in pending_expired[:10]:  # Show first 10
+                for invitation in pending_expired.select_related('caller', 'receiver')[:10]:  # Show first 10
                     self.stdout.write(f"  - ID {invitation.id}: {invitation.caller.username} -> {invitation.receiver.username} - expired {invitation.expires_at}")
                 if pending_count > 10:
                     self.stdout.write(f"  ... and {pending_count - 10} more")
         else:
             # Mark pending invitations as expired
+            pending_count = pending_expired.update(status='expired')
             if pending_count > 0:
-                pending_expired.update(status='expired')
                 self.stdout.write(
                     self.style.SUCCESS(f"Marked {pending_count} pending invitations as expired")
                 )
             
-            # Delete old invitations
-            if expired_count > 0:
-                expired_invitations.delete()
+            # Delete old invitations in throttled primary-key ranges
+            result = purge(policy, days=days, batch_size=options['batch_size'])
+            if result['deleted'] > 0:
                 self.stdout.write(
-                    self.style.SUCCESS(f"Deleted {expired_count} old invitations (older than {days} days)")
+                    self.style.SUCCESS(
+                        f"Deleted {result['deleted']} old invitations (older than {days} days) "
+                        f"in {result['batches']} batches"
+                    )
                 )
             
-            if expired_count == 0 and pending_count == 0:
+            if result['deleted'] == 0 and pending_count == 0:
                 self.stdout.write(
                     self.style.SUCCESS("No invitations to clean up")
                 )
         
-        # Show current statistics
-        total_invitations = CallInvitation.objects.count()
-        pending_invitations = CallInvitation.objects.filter(status='pending').count()
+        # Show current statistics from one GROUP BY
+        status_counts = policy.status_counts()
         
         self.stdout.write(f"\nCurrent statistics:")
-        self.stdout.write(f"  Total invitations: {total_invitations}")
-        self.stdout.write(f"  Pending invitations: {pending_invitations}")
-        
-        # Show status breakdown
-        status_counts = {}
-        for status, _ in CallInvitation.STATUS_CHOICES:
-            count = CallInvitation.objects.filter(status=status).count()
-            if count > 0:
-                status_counts[status] = count
+        self.stdout.write(f"  Total invitations: {sum(status_counts.values())}")
+        self.stdout.write(f"  Pending invitations: {status_counts.get('pending', 0)}")
         
         if status_counts:
-            self.stdout.write(f"  Status breakdown: {status_counts}") 
\ No newline at end of file
+            self.stdout.write(f"  Status breakdown: {status_counts}")
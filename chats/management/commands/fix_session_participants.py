@@ -1,41 +1,49 @@
 from django.core.management.base import BaseCommand
-from chats.models import CallSession, VideoRoom
+from chats.call_sessions import REPAIR_BATCH_SIZE, missing_participants, repair_participants
+
+PROGRESS_WIDTH = 30
 
 class Command(BaseCommand):
     help = 'Fix existing call sessions that might not have proper participants assigned'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the missing participants without adding them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REPAIR_BATCH_SIZE,
+            help=f'Participants inserted per query (default: {REPAIR_BATCH_SIZE})'
+        )
+
     def handle(self, *args, **options):
-        fixed_count = 0
-        total_sessions = CallSession.objects.all().count()
+        missing = {side: missing_participants(side).count() for side in ('user1', 'user2')}
+        total = sum(missing.values())
         
-        self.stdout.write(f"Checking {total_sessions} call sessions...")
+        self.stdout.write(
+            f"Found {total} missing participants "
+            f"({missing['user1']} first match users, {missing['user2']} second match users)"
+        )
         
-        for session in CallSession.objects.all():
-            room = session.room
-            match = room.match
-            
-            # Get current participants count
-            current_participants = session.participants.count()
-            
-            # Add both match users as participants if not already added
-            added_users = []
-            for user in [match.user1, match.user2]:
-                if not session.participants.filter(id=user.id).exists():
-                    session.participants.add(user)
-                    added_users.append(user.username)
-            
-            if added_users:
-                fixed_count += 1
+        if options['dry_run'] or total == 0:
+            if total == 0:
                 self.stdout.write(
-                    f"Session {session.id}: Added participants {', '.join(added_users)} "
-                    f"(was {current_participants}, now {session.participants.count()})"
+                    self.style.SUCCESS("All sessions already have proper participants assigned")
                 )
+            return
         
-        if fixed_count > 0:
+        def progress(done):
+            filled = int(PROGRESS_WIDTH * min(done, total) / total)
             self.stdout.write(
-                self.style.SUCCESS(f"Fixed {fixed_count} sessions with missing participants")
+                f"\r[{'#' * filled}{'.' * (PROGRESS_WIDTH - filled)}] {done}/{total}", ending=''
             )
-        else:
-            self.stdout.write(
-                self.style.SUCCESS("All sessions already have proper participants assigned")
-            ) 
\ No newline at end of file
+            self.stdout.flush()
+        
+        added = repair_participants(options['batch_size'], progress)
+        self.stdout.write('')
+        self.stdout.write(
+            self.style.SUCCESS(f"Added {added} missing participants")
+        )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chats.call_sessions import rebuild_rollups
+from chats.models import RoomCallStats, UserCallStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-room and per-user call statistics rollups from ended sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild even if sessions deleted by retention would drop out of the totals'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            rebuild_rollups(force=options['force'])
+        except ValueError as e:
+            raise CommandError(f"{e}; pass --force to rebuild anyway")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt call stats for {RoomCallStats.objects.count()} rooms "
+            f"and {UserCallStats.objects.count()} users"
+        ))
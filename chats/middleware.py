@@ -0,0 +1,128 @@
+"""
+ASGI middleware for the chats app.
+"""
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+
+from .admission import ADMISSION_REJECTED_CLOSE_CODE, connection_admission
+from .call_sessions import call_session_reaper
+from .executors import get_request_limiter
+from .expiry import invitation_expiry_wheel
+from .notifications import notification_dispatcher
+from .tokens import read_websocket_token, user_from_token
+
+
+class BackgroundTasksMiddleware:
+    """Start the in-process background services on the server's event loop.
+
+    Daphne does not send lifespan events, so the services are started lazily
+    on the first connection; servers that do send them (uvicorn) get a clean
+    startup and shutdown.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def start_services(self):
+        invitation_expiry_wheel.ensure_started()
+        notification_dispatcher.ensure_started()
+        call_session_reaper.ensure_started()
+
+    async def stop_services(self):
+        await call_session_reaper.stop()
+        await notification_dispatcher.stop()
+        await invitation_expiry_wheel.stop()
+
+    async def __call__(self, scope, receive, send):
+        self.start_services()
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        return await self.app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop_services()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+class TokenAuthMiddleware:
+    """Authenticate websocket handshakes from a signed ``?token=`` query parameter.
+
+    A valid token sets ``scope['user']`` and ``scope['ws_token']`` without any
+    database access; anything else goes through the regular session-based
+    ``AuthMiddlewareStack``.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_auth = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        token = query.get('token', [None])[0]
+        payload = read_websocket_token(token) if token else None
+
+        if payload is None:
+            return await self.session_auth(scope, receive, send)
+
+        scope = dict(scope)
+        scope['user'] = user_from_token(payload)
+        scope['ws_token'] = payload
+        return await self.inner(scope, receive, send)
+
+
+class AdmissionControlMiddleware:
+    """Admit websocket connections through the node's token bucket.
+
+    Rejected handshakes are accepted and closed straight away with close code
+    4429 and a ``retry_after=<seconds>`` reason, before any authentication or
+    consumer work runs.
+    """
+
+    def __init__(self, inner, admission=None):
+        self.inner = inner
+        self.admission = admission or connection_admission
+
+    async def __call__(self, scope, receive, send):
+        admitted, retry_after = self.admission.admit()
+        if admitted:
+            return await self.inner(scope, receive, send)
+
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        await send({'type': 'websocket.accept'})
+        await send({
+            'type': 'websocket.close',
+            'code': ADMISSION_REJECTED_CLOSE_CODE,
+            'reason': f'retry_after={retry_after}',
+        })
+
+
+class RequestLimitMiddleware:
+    """Cap HTTP requests in flight through the ``http`` pool.
+
+    Django runs each sync view on its own request thread, so this bounds the
+    number of those threads competing for the database. The slot is freed as
+    soon as the response starts: by then the view has returned, and a slow
+    client reading a long streamed export must not hold it.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        async def handle(release):
+            async def send_and_release(message):
+                await send(message)
+                if message['type'] == 'http.response.start':
+                    release()
+            return await self.inner(scope, receive, send_and_release)
+
+        return await get_request_limiter().run(handle)
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0012_chatroom_chatmessage_typingstatus'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callsession',
+            name='last_heartbeat',
+            field=models.DateTimeField(blank=True, help_text='Last time a participant was connected to the call', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='callsession',
+            index=models.Index(fields=['status', 'last_heartbeat'], name='session_heartbeat_idx'),
+        ),
+    ]
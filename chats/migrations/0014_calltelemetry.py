@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0013_callsession_last_heartbeat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallTelemetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bucket_seconds', models.PositiveSmallIntegerField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField(help_text='Per-bucket min/max/mean/p95 series, see chats.telemetry')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telemetry', to='chats.callsession')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='call_telemetry', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['session', 'user'], name='session_telemetry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:28
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0014_calltelemetry'),
+        ('users', '0002_language_userlanguage_user_languages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomCallStats',
+            fields=[
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('successful_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('end_reasons', models.JSONField(default=dict, help_text='end_reason -> number of sessions')),
+                ('last_session_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='call_stats', serialize=False, to='chats.videoroom')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserCallStats',
+            fields=[
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('successful_count', models.PositiveIntegerField(default=0)),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('end_reasons', models.JSONField(default=dict, help_text='end_reason -> number of sessions')),
+                ('last_session_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='call_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:14
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_ended_sessions(apps, schema_editor):
+    """Sessions ended before this column existed were finalized no later than their end time."""
+    CallSession = apps.get_model('chats', 'CallSession')
+    CallSession.objects.filter(ended_at__isnull=False).update(finalized_at=F('ended_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0015_call_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callsession',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, help_text='When the session was marked ended; the reaper backdates ended_at', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='callsession',
+            index=models.Index(fields=['finalized_at'], name='session_finalized_idx'),
+        ),
+        migrations.RunPython(stamp_ended_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:02
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def stamp_last_change(apps, schema_editor):
+    """Existing messages last changed when they were edited, or else when they were sent."""
+    ChatMessage = apps.get_model('chats', 'ChatMessage')
+    ChatMessage.objects.update(updated_at=Coalesce('edited_at', 'timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0016_callsession_finalized_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(stamp_last_change, migrations.RunPython.noop),
+    ]
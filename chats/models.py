@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from matches.models import Match
 from django.utils import timezone
+from datetime import timedelta
 import uuid
 
 User = get_user_model()
@@ -113,12 +114,18 @@ class CallSession(models.Model):
         ('network_failure', 'Network failure'),
     ]
     
+    SUCCESSFUL_END_REASONS = ('normal', 'user_hangup', 'partner_hangup')
+    
     room = models.ForeignKey(VideoRoom, on_delete=models.CASCADE, related_name='sessions')
     participants = models.ManyToManyField(User, related_name='call_sessions')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='starting')
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
     duration = models.DurationField(null=True, blank=True)
+    last_heartbeat = models.DateTimeField(null=True, blank=True,
+                                          help_text='Last time a participant was connected to the call')
+    finalized_at = models.DateTimeField(null=True, blank=True,
+                                        help_text='When the session was marked ended; the reaper backdates ended_at')
     
     # Enhanced call end tracking
     ended_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, 
@@ -141,6 +148,12 @@ class CallSession(models.Model):
     
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            # Stale session reaper: open sessions by last heartbeat
+            models.Index(fields=['status', 'last_heartbeat'], name='session_heartbeat_idx'),
+            # Export deltas and metric snapshots: sessions by when they were ended
+            models.Index(fields=['finalized_at'], name='session_finalized_idx'),
+        ]
     
     def __str__(self):
         return f"Call session in {self.room.room_id} at {self.started_at}"
@@ -169,13 +182,87 @@ class CallSession(models.Model):
     
     def was_successful(self):
         """Check if the call was successfully completed."""
-        return self.status == 'ended' and self.end_reason in ['normal', 'user_hangup', 'partner_hangup']
+        return self.status == 'ended' and self.end_reason in self.SUCCESSFUL_END_REASONS
     
     def get_end_reason_display(self):
         """Get human-readable end reason."""
         reason_map = dict(self.END_REASON_CHOICES)
         return reason_map.get(self.end_reason, 'Unknown')
 
+class CallStatsRollup(models.Model):
+    """Running totals over ended call sessions, updated as each session ends."""
+    session_count = models.PositiveIntegerField(default=0)
+    successful_count = models.PositiveIntegerField(default=0)
+    total_duration = models.DurationField(default=timedelta)
+    end_reasons = models.JSONField(default=dict, help_text='end_reason -> number of sessions')
+    last_session_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    @property
+    def average_duration(self):
+        return self.total_duration / self.session_count if self.session_count else timedelta(0)
+    
+    @property
+    def success_rate(self):
+        return self.successful_count / self.session_count * 100 if self.session_count else 0
+    
+    def add(self, sessions, successful, duration, end_reasons, last_session_at):
+        """Fold a batch of newly ended sessions into the totals."""
+        self.session_count += sessions
+        self.successful_count += successful
+        self.total_duration += duration
+        for reason, count in end_reasons.items():
+            self.end_reasons[reason] = self.end_reasons.get(reason, 0) + count
+        if last_session_at and (self.last_session_at is None or last_session_at > self.last_session_at):
+            self.last_session_at = last_session_at
+    
+    def end_reason_counts(self):
+        """End reasons, most common first."""
+        return sorted(
+            ({'end_reason': reason, 'count': count} for reason, count in self.end_reasons.items()),
+            key=lambda entry: -entry['count']
+        )
+
+class RoomCallStats(CallStatsRollup):
+    """Call totals for one video room."""
+    room = models.OneToOneField(VideoRoom, on_delete=models.CASCADE, primary_key=True, related_name='call_stats')
+    
+    def __str__(self):
+        return f"Call stats for {self.room.room_id}"
+
+class UserCallStats(CallStatsRollup):
+    """Call totals for one user across all their rooms."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='call_stats')
+    
+    def __str__(self):
+        return f"Call stats for {self.user.username}"
+
+class CallTelemetry(models.Model):
+    """Downsampled WebRTC stats for one participant's connection to a call."""
+    session = models.ForeignKey(CallSession, on_delete=models.CASCADE, related_name='telemetry')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='call_telemetry')
+    created_at = models.DateTimeField(auto_now_add=True)
+    bucket_seconds = models.PositiveSmallIntegerField()
+    sample_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField(help_text='Per-bucket min/max/mean/p95 series, see chats.telemetry')
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['session', 'user'], name='session_telemetry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Telemetry for {self.user.username} in session {self.session_id}"
+    
+    def series(self):
+        """Decode the stored series into a list of per-bucket dicts."""
+        from .telemetry import decode
+        return decode(self.data)
+
 class RoomMessage(models.Model):
     """Model for chat messages within video rooms."""
     room = models.ForeignKey(VideoRoom, on_delete=models.CASCADE, related_name='messages')
@@ -232,6 +319,8 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     is_read = models.BooleanField(default=False, db_index=True)
     edited_at = models.DateTimeField(null=True, blank=True)
+    # Stamped on every change; queryset updates set it explicitly
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     reply_to = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='replies')
     
     # File/Image fields (for future enhancement)
@@ -253,7 +342,7 @@ class ChatMessage(models.Model):
         """Mark this message as read."""
         if not self.is_read:
             self.is_read = True
-            self.save(update_fields=['is_read'])
+            self.save(update_fields=['is_read', 'updated_at'])
     
     def can_edit(self, user):
         """Check if a user can edit this message."""
@@ -263,7 +352,7 @@ class ChatMessage(models.Model):
         """Edit the message content."""
         self.content = new_content
         self.edited_at = timezone.now()
-        self.save(update_fields=['content', 'edited_at'])
+        self.save(update_fields=['content', 'edited_at', 'updated_at'])
 
 class TypingStatus(models.Model):
     """Track user typing status in chat rooms."""
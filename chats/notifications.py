@@ -0,0 +1,144 @@
+"""
+Non-blocking dispatcher for user notifications sent from sync views.
+
+Views enqueue group sends on a bounded queue and return immediately. A
+background task on the ASGI server's event loop drains the queue in batches
+and issues the sends of different groups concurrently (each group's in queue
+order), so a slow channel layer never holds up a request thread. When no event loop is running (WSGI, management
+commands, tests) notifications are sent inline as before.
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """Bounded queue of ``(group, message)`` pairs with an async batch sender."""
+
+    def __init__(self, max_queue_size=None, batch_size=None):
+        self.max_queue_size = max_queue_size or getattr(settings, 'NOTIFICATION_QUEUE_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 100)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'inline': 0,
+            'max_queue_depth': 0,
+        }
+
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    def ensure_started(self):
+        """Start the sender on the running event loop (idempotent)."""
+        if self.is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """Flush what is queued and stop the sender."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+        self._task = None
+        self._loop = None
+
+    def dispatch(self, group_name, message):
+        """Queue a group send. Returns False if the notification was dropped."""
+        if not self.is_running:
+            async_to_sync(get_channel_layer().group_send)(group_name, message)
+            self._stats['inline'] += 1
+            return True
+
+        with self._lock:
+            if len(self._queue) >= self.max_queue_size:
+                self._stats['dropped'] += 1
+                return False
+            self._queue.append((group_name, message))
+            self._stats['enqueued'] += 1
+            depth = len(self._queue)
+            if depth > self._stats['max_queue_depth']:
+                self._stats['max_queue_depth'] = depth
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    async def flush(self):
+        """Send everything currently queued."""
+        batch = self._take_batch()
+        while batch:
+            await self._send_batch(batch)
+            batch = self._take_batch()
+
+    async def _send_batch(self, batch):
+        # One sender per group: a group's notifications go out in the order they
+        # were queued, and only different groups are sent concurrently
+        channel_layer = get_channel_layer()
+        by_group = {}
+        for group_name, message in batch:
+            by_group.setdefault(group_name, []).append(message)
+        failures = await asyncio.gather(
+            *(self._send_group(channel_layer, group_name, messages) for group_name, messages in by_group.items())
+        )
+        failed = sum(failures)
+        if failed:
+            logger.warning("Failed to deliver %d of %d notifications", failed, len(batch))
+        self._stats['sent'] += len(batch) - failed
+        self._stats['failed'] += failed
+        self._stats['batches'] += 1
+
+    @staticmethod
+    async def _send_group(channel_layer, group_name, messages):
+        """Send one group's messages in order; returns how many failed."""
+        failed = 0
+        for message in messages:
+            try:
+                await channel_layer.group_send(group_name, message)
+            except Exception:
+                failed += 1
+        return failed
+
+    async def _run(self):
+        while not self._stopping:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Notification dispatcher batch failed")
+
+    def metrics(self):
+        """Snapshot of queue depth and delivery counters."""
+        return {
+            'running': self.is_running,
+            'queue_depth': len(self._queue),
+            'max_queue_size': self.max_queue_size,
+            **self._stats,
+        }
+
+
+notification_dispatcher = NotificationDispatcher()
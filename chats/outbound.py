@@ -0,0 +1,177 @@
+"""
+Bounded outbound queues for websocket connections.
+
+Every accepted connection gets an ``OutboundQueue`` drained by its own writer
+task. ``send`` returns as soon as the server has buffered a frame, so the
+writer also runs a credit window: every ``WEBSOCKET_SEND_WINDOW // 2`` frames
+it writes a ``{"type": "heartbeat", "seq": n}`` probe, the client echoes ``n``
+in its ``heartbeat_ack`` once it has read that far, and the writer stops once a
+full window is unacknowledged. A client that stops reading therefore backs up
+into this queue instead of the server's write buffer.
+
+Frames for droppable events (typing, media status) carry a coalescing key so
+only the latest one per sender is kept, and are dropped outright when the
+queue is full. A connection that stays over the limit longer than the grace
+period, or reaches twice the limit, is evicted.
+"""
+import asyncio
+import json
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+SLOW_CONSUMER_CLOSE_CODE = 4408
+
+# Event types whose latest value supersedes earlier ones from the same sender
+COALESCED_EVENTS = {
+    'typing_start': 'typing',
+    'typing_stop': 'typing',
+    'video_status_change': 'video_status',
+    'audio_status_change': 'audio_status',
+}
+
+_queues = weakref.WeakSet()
+_totals = {'dropped': 0, 'coalesced': 0, 'evicted': 0}
+
+
+def coalesce_key(data, stream=None):
+    """Coalescing key for droppable events, or None for everything else."""
+    group = COALESCED_EVENTS.get(data.get('type'))
+    if group is None:
+        return None
+    return (stream, group, data.get('sender_id', data.get('user_id')))
+
+
+def heartbeat_probe(seq):
+    """JSON ack probe for the first ``seq`` frames."""
+    return {'text_data': json.dumps({'type': 'heartbeat', 'seq': seq})}
+
+
+class OutboundQueue:
+    """FIFO of encoded frames for one connection, written by a background task."""
+
+    def __init__(self, send, on_evict, probe=heartbeat_probe, max_size=None, window=None,
+                 grace_seconds=None, clock=time.monotonic):
+        self.send = send
+        self.on_evict = on_evict
+        self.probe = probe
+        self.max_size = max_size or getattr(settings, 'WEBSOCKET_SEND_QUEUE_SIZE', 256)
+        self.window = window or getattr(settings, 'WEBSOCKET_SEND_WINDOW', 64)
+        self.probe_every = max(1, self.window // 2)
+        self.grace_seconds = grace_seconds or getattr(settings, 'WEBSOCKET_SLOW_CONSUMER_GRACE', 5.0)
+        self.clock = clock
+        self.over_limit_since = None
+        self.written = 0
+        self.acked = 0
+        self.probed = 0
+        self.closed = False
+        self._entries = deque()
+        self._pending = {}  # coalescing key -> queued entry
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = None
+        _queues.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def in_flight(self):
+        """Frames written to the server that the client has not confirmed reading."""
+        return self.written - self.acked
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def put(self, frame, key=None):
+        """Queue a frame. Returns False if it was dropped."""
+        if self.closed:
+            return False
+
+        if key is not None and key in self._pending:
+            self._pending[key][1] = frame
+            _totals['coalesced'] += 1
+            return True
+
+        depth = len(self)
+        if depth >= self.max_size:
+            if key is not None:
+                _totals['dropped'] += 1
+                return False
+            now = self.clock()
+            if self.over_limit_since is None:
+                self.over_limit_since = now
+            elif now - self.over_limit_since >= self.grace_seconds or depth >= 2 * self.max_size:
+                self.evict()
+                return False
+
+        entry = [key, frame]
+        self._entries.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    def ack(self, seq):
+        """Record that the client has read the first ``seq`` frames."""
+        if isinstance(seq, int) and not isinstance(seq, bool) and self.acked < seq <= self.written:
+            self.acked = seq
+            self._wakeup.set()
+
+    def evict(self):
+        _totals['evicted'] += 1
+        self.stop()
+        asyncio.ensure_future(self.on_evict())
+
+    async def drain(self, timeout=1.0):
+        """Wait until everything queued has been written."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self):
+        self.closed = True
+        self._entries.clear()
+        self._pending.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        _queues.discard(self)
+
+    async def _run(self):
+        while not self.closed:
+            self._wakeup.clear()
+            while self._entries and self.in_flight < self.window:
+                key, frame = self._entries.popleft()
+                if key is not None:
+                    self._pending.pop(key, None)
+                await self.send(**frame)
+                self.written += 1
+                if self.written - self.probed >= self.probe_every:
+                    self.probed = self.written
+                    await self.send(**self.probe(self.written))
+            if len(self) < self.max_size:
+                self.over_limit_since = None
+            if not self._entries:
+                self._idle.set()
+            await self._wakeup.wait()
+
+
+def send_queue_metrics():
+    """Node-level queue depth and pressure counters."""
+    queues = list(_queues)
+    depths = [len(outbound) for outbound in queues]
+    return {
+        'connections': len(depths),
+        'queued': sum(depths),
+        'unacknowledged': sum(outbound.in_flight for outbound in queues),
+        'max_depth': max(depths, default=0),
+        'max_size': getattr(settings, 'WEBSOCKET_SEND_QUEUE_SIZE', 256),
+        'window': getattr(settings, 'WEBSOCKET_SEND_WINDOW', 64),
+        **_totals,
+    }
@@ -0,0 +1,221 @@
+"""
+Websocket frame formats for the chat consumers.
+
+Clients speak JSON text frames by default. A client that offers the
+``speakle.msgpack.v1`` subprotocol on connect gets msgpack binary frames with
+the common field names shortened to the codes in ``FIELD_CODES`` (top-level
+keys only; nested values such as SDP offers are left untouched). Both
+formats are decoded to the same dict, and incoming messages are routed
+through each consumer's ``message_handlers`` table.
+"""
+import json
+
+import msgpack
+
+from .heartbeat import HEARTBEAT_TIMEOUT_CLOSE_CODE, Heartbeat
+from .log import log_event
+from .outbound import SLOW_CONSUMER_CLOSE_CODE, OutboundQueue, coalesce_key
+from .ratelimit import MessageRateLimiter
+
+MSGPACK_SUBPROTOCOL = 'speakle.msgpack.v1'
+
+FIELD_CODES = {
+    'type': 't',
+    'message': 'm',
+    'room_id': 'r',
+    'sender_id': 's',
+    'sender_username': 'sn',
+    'user_id': 'u',
+    'username': 'un',
+    'timestamp': 'ts',
+    'message_id': 'mi',
+    'content': 'co',
+    'offer': 'o',
+    'answer': 'a',
+    'candidate': 'c',
+    'video_enabled': 've',
+    'audio_enabled': 'ae',
+    'invitation_id': 'i',
+    'reply_to': 'rt',
+    'stream': 'st',
+    'payload': 'p',
+    'code': 'cd',
+}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+
+
+class FrameDecodeError(ValueError):
+    """Raised when a frame cannot be decoded into a message dict."""
+
+
+def compact(data):
+    return {FIELD_CODES.get(key, key): value for key, value in data.items()}
+
+
+def expand(data):
+    return {FIELD_NAMES.get(key, key): value for key, value in data.items()}
+
+
+def pack(data):
+    """Encode a message as a compact msgpack frame."""
+    return msgpack.packb(compact(data), use_bin_type=True)
+
+
+def unpack(frame):
+    """Decode a msgpack frame produced by ``pack``."""
+    try:
+        data = msgpack.unpackb(frame, raw=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise FrameDecodeError(str(e)) from e
+    if not isinstance(data, dict):
+        raise FrameDecodeError('Frame is not a map')
+    return expand(data)
+
+
+def decode_text(text_data):
+    try:
+        data = json.loads(text_data)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise FrameDecodeError(str(e)) from e
+    if not isinstance(data, dict):
+        raise FrameDecodeError('Frame is not an object')
+    return data
+
+
+class ProtocolMixin:
+    """Frame negotiation and table-driven message dispatch for consumers.
+
+    Subclasses map message types to handler method names in
+    ``message_handlers`` and send with ``send_event`` instead of
+    ``send(text_data=json.dumps(...))``; frames then go through the
+    connection's bounded ``OutboundQueue``. Accepted connections also run a
+    ``Heartbeat`` and are reaped when the client stops answering.
+    """
+
+    message_handlers = {}
+    binary_protocol = False
+
+    async def accept(self, subprotocol=None):
+        offered = self.scope.get('subprotocols') or ()
+        if subprotocol is None and MSGPACK_SUBPROTOCOL in offered:
+            subprotocol = MSGPACK_SUBPROTOCOL
+        self.binary_protocol = subprotocol == MSGPACK_SUBPROTOCOL
+        await super().accept(subprotocol=subprotocol)
+        self.outbound = OutboundQueue(self.send, self.evict_slow_consumer, probe=self.encode_probe)
+        self.outbound.start()
+        self.heartbeat = Heartbeat(self.send_heartbeat, self.reap)
+        self.heartbeat.start()
+
+    def encode_event(self, data):
+        if self.binary_protocol:
+            return {'bytes_data': pack(data)}
+        return {'text_data': json.dumps(data)}
+
+    def encode_probe(self, seq):
+        return self.encode_event({'type': 'heartbeat', 'seq': seq})
+
+    async def send_event(self, data, key=None):
+        await self.queue_frame(self.encode_event(data), key or coalesce_key(data))
+
+    async def queue_frame(self, frame, key=None):
+        """Send a frame through the connection's outbound queue."""
+        outbound = getattr(self, 'outbound', None)
+        if outbound is None:
+            await self.send(**frame)
+        else:
+            outbound.put(frame, key)
+
+    async def close(self, code=None):
+        self.stop_heartbeat()
+        outbound = getattr(self, 'outbound', None)
+        if outbound is not None:
+            await outbound.drain()
+            outbound.stop()
+        await super().close(code)
+
+    def stop_heartbeat(self):
+        heartbeat = getattr(self, 'heartbeat', None)
+        if heartbeat is not None:
+            heartbeat.stop()
+
+    async def send_heartbeat(self):
+        await self.send_event({'type': 'heartbeat'}, key=('heartbeat',))
+
+    async def reap(self):
+        """Close a connection that stopped answering heartbeats.
+
+        The disconnect is routed back through our own channel so the usual
+        ``websocket_disconnect`` path runs cleanup and stops the consumer.
+        """
+        log_event('reaped', consumer=type(self).__name__, user=getattr(self.scope.get('user'), 'pk', None))
+        outbound = getattr(self, 'outbound', None)
+        if outbound is not None:
+            outbound.stop()
+        await super().close(HEARTBEAT_TIMEOUT_CLOSE_CODE)
+        message = {'type': 'websocket.disconnect', 'code': HEARTBEAT_TIMEOUT_CLOSE_CODE}
+        if self.channel_layer is not None:
+            await self.channel_layer.send(self.channel_name, message)
+        else:
+            await self.disconnect(HEARTBEAT_TIMEOUT_CLOSE_CODE)
+
+    async def evict_slow_consumer(self):
+        log_event('slow_consumer', consumer=type(self).__name__, user=getattr(self.scope.get('user'), 'pk', None))
+        await super().close(SLOW_CONSUMER_CLOSE_CODE)
+
+    async def websocket_disconnect(self, message):
+        self.stop_heartbeat()
+        outbound = getattr(self, 'outbound', None)
+        if outbound is not None:
+            outbound.stop()
+        await super().websocket_disconnect(message)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = unpack(bytes_data) if bytes_data is not None else decode_text(text_data)
+        except FrameDecodeError as e:
+            log_event('invalid_json', consumer=type(self).__name__, error=str(e))
+            await self.send_event({'type': 'error', 'message': 'Invalid JSON data'})
+            return
+        heartbeat = getattr(self, 'heartbeat', None)
+        if heartbeat is not None:
+            heartbeat.touch()
+        if data.get('type') == 'heartbeat_ack':
+            outbound = getattr(self, 'outbound', None)
+            if outbound is not None:
+                outbound.ack(data.get('seq'))
+            return
+        await self.receive_message(data)
+
+    async def receive_message(self, data):
+        """Route a decoded message to its handler, subject to rate limits."""
+        message_type = data.get('type')
+        retry_after = self.check_rate_limit(message_type)
+        if retry_after:
+            await self.send_event({
+                'type': 'error',
+                'code': 'rate_limited',
+                'message': 'Too many messages, slow down',
+                'message_type': message_type,
+                'retry_after': round(retry_after, 2),
+            }, key=('rate_limited', message_type))
+            return
+
+        handler_name = self.message_handlers.get(message_type)
+        if handler_name is None:
+            await self.handle_unknown_message(data)
+        else:
+            await getattr(self, handler_name)(data)
+
+    def check_rate_limit(self, message_type):
+        limiter = getattr(self, 'rate_limiter', None)
+        if limiter is None:
+            limiter = self.rate_limiter = MessageRateLimiter(getattr(self.scope.get('user'), 'pk', None))
+        return limiter.check(message_type)
+
+    async def handle_unknown_message(self, data):
+        message_type = data.get('type')
+        log_event('unknown_message', consumer=type(self).__name__, type=message_type)
+        await self.send_event({
+            'type': 'error',
+            'message': f'Unknown message type: {message_type}'
+        })
@@ -0,0 +1,121 @@
+"""
+Message rate limits for the websocket consumers.
+
+Every incoming frame is charged against two token buckets for its message
+type: one for the connection and one shared by all of the user's connections
+on this node. Frames over either limit are answered with a ``rate_limited``
+error instead of reaching the handler, so they never cost a database call.
+"""
+import time
+
+from django.conf import settings
+
+from .admission import TokenBucket
+
+# message type -> (tokens per second, burst) for a single connection
+DEFAULT_MESSAGE_RATE_LIMITS = {
+    # Text chat
+    'send_message': (2, 10),
+    'edit_message': (1, 5),
+    'mark_messages_read': (1, 5),
+    'load_messages': (2, 5),
+    'typing_start': (2, 5),
+    'typing_stop': (2, 5),
+    # Video signalling
+    'offer': (2, 10),
+    'answer': (2, 10),
+    'ice_candidate': (50, 200),
+    'peer_ready': (1, 5),
+    'chat_message': (2, 10),
+    'call_start': (1, 3),
+    'call_end': (1, 3),
+    'video_status': (5, 10),
+    'audio_status': (5, 10),
+    'telemetry': (1, 5),
+    # Multiplexed socket
+    'subscribe': (2, 10),
+}
+
+_totals = {'limited': 0}
+_limited_by_type = {}
+
+
+def message_rate_limits():
+    return {**DEFAULT_MESSAGE_RATE_LIMITS, **getattr(settings, 'WEBSOCKET_MESSAGE_RATE_LIMITS', {})}
+
+
+class UserBuckets:
+    """Buckets shared by all connections of a user, pruned when idle."""
+
+    def __init__(self, idle_seconds=300, clock=time.monotonic):
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._buckets = {}
+        self._pruned_at = clock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get(self, user_id, message_type, rate, burst):
+        now = self.clock()
+        if now - self._pruned_at >= self.idle_seconds:
+            self._buckets = {
+                key: bucket for key, bucket in self._buckets.items()
+                if now - bucket.updated_at < self.idle_seconds
+            }
+            self._pruned_at = now
+
+        key = (user_id, message_type)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, clock=self.clock)
+        return bucket
+
+
+user_buckets = UserBuckets()
+
+
+class MessageRateLimiter:
+    """Per-connection limiter; per-user limits are ``multiplier`` times larger."""
+
+    def __init__(self, user_id, limits=None, multiplier=None, buckets=None, clock=time.monotonic):
+        self.user_id = user_id
+        self.limits = limits if limits is not None else message_rate_limits()
+        self.multiplier = multiplier or getattr(settings, 'WEBSOCKET_USER_RATE_MULTIPLIER', 3)
+        self.user_buckets = buckets if buckets is not None else user_buckets
+        self.clock = clock
+        self._buckets = {}
+
+    def check(self, message_type):
+        """Charge one frame. Returns 0.0 if allowed, else seconds to wait."""
+        limit = self.limits.get(message_type)
+        if limit is None:
+            return 0.0
+
+        rate, burst = limit
+        buckets = [self._buckets.get(message_type)]
+        if buckets[0] is None:
+            buckets[0] = self._buckets[message_type] = TokenBucket(rate, burst, clock=self.clock)
+        if self.user_id is not None:
+            buckets.append(self.user_buckets.get(
+                self.user_id, message_type, rate * self.multiplier, burst * self.multiplier
+            ))
+
+        for bucket in buckets:
+            bucket.refill()
+        if all(bucket.tokens >= 1 for bucket in buckets):
+            for bucket in buckets:
+                bucket.tokens -= 1
+            return 0.0
+
+        _totals['limited'] += 1
+        _limited_by_type[message_type] = _limited_by_type.get(message_type, 0) + 1
+        return max(bucket.wait_time() for bucket in buckets)
+
+
+def rate_limit_metrics():
+    return {
+        **_totals,
+        'by_type': dict(_limited_by_type),
+        'tracked_user_buckets': len(user_buckets),
+    }
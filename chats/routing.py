@@ -5,4 +5,5 @@ websocket_urlpatterns = [
     re_path(r'ws/video/(?P<room_id>[^/]+)/$', consumers.VideoCallConsumer.as_asgi()),
     re_path(r'ws/notifications/$', consumers.UserNotificationConsumer.as_asgi()),
     re_path(r'ws/text-chat/(?P<room_id>[^/]+)/$', consumers.TextChatConsumer.as_asgi()),
+    re_path(r'ws/multiplex/$', consumers.MultiplexConsumer.as_asgi()),
 ] 
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+In-memory downsampling of WebRTC ``getStats`` telemetry.
+
+The video client sends a ``telemetry`` frame every few seconds with its
+current bitrate, round-trip time, packet loss and framerate. Each connection
+folds the samples into fixed ``CALL_TELEMETRY_BUCKET_SECONDS`` buckets that
+keep count, min, max, mean and p95 per metric, and the downsampled series is
+written once, as a compact binary blob, when the participant leaves the call.
+"""
+import bisect
+import math
+import struct
+import time
+
+from django.conf import settings
+
+# Order matters: it is the column order in the encoded blob
+METRICS = ('bitrate', 'rtt', 'packet_loss', 'framerate')
+
+TELEMETRY_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<BHHB')  # version, bucket seconds, bucket count, metric count
+_BUCKET = struct.Struct('<HH')  # bucket index, sample count
+_STATS = struct.Struct('<4f')  # min, max, mean, p95
+_FLOAT32_MAX = struct.unpack('<f', b'\xff\xff\x7f\x7f')[0]  # Largest value a stats field holds
+_BIGINT_MAX = 2 ** 63 - 1  # CallSession.total_data_transferred
+
+# Thresholds for the session-level quality fields
+POOR_RTT_MS = 400
+POOR_PACKET_LOSS = 5.0  # Percent
+HD_FRAMERATE = 24
+HD_BITRATE = 1_000_000  # Bits per second
+
+
+class MetricBucket:
+    """Running min/max/mean and p95 for one metric in one time bucket.
+
+    Samples are kept sorted as they arrive so the percentile is a lookup;
+    a bucket only ever sees a handful of samples per connection.
+    """
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', '_sorted')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self._sorted = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        bisect.insort(self._sorted, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def p95(self):
+        if not self._sorted:
+            return 0.0
+        return self._sorted[min(len(self._sorted) - 1, int(0.95 * len(self._sorted)))]
+
+    def stats(self):
+        return (self.minimum or 0.0, self.maximum or 0.0, self.mean, self.p95)
+
+
+class TelemetrySeries:
+    """Time-bucketed telemetry for one participant connection in one call."""
+
+    def __init__(self, bucket_seconds=None, max_buckets=None, clock=time.monotonic):
+        self.bucket_seconds = int(bucket_seconds or getattr(settings, 'CALL_TELEMETRY_BUCKET_SECONDS', 10))
+        self.max_buckets = max_buckets or getattr(settings, 'CALL_TELEMETRY_MAX_BUCKETS', 1440)
+        self.clock = clock
+        self.started = clock()
+        self.samples = 0
+        self.dropped = 0
+        self._buckets = {}  # bucket index -> {metric: MetricBucket}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def add(self, stats):
+        """Fold one sample into its bucket. Returns False if it was rejected."""
+        values = {}
+        for metric in METRICS:
+            value = stats.get(metric)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if isinstance(value, float) and not math.isfinite(value):
+                continue
+            # Clamped to what a stats field holds, so one oversized sample cannot
+            # make the whole series unencodable
+            value = float(min(value, _FLOAT32_MAX))
+            if value >= 0:
+                values[metric] = value
+        if not values:
+            return False
+
+        index = int((self.clock() - self.started) // self.bucket_seconds)
+        bucket = self._buckets.get(index)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets or index > 0xFFFF:
+                self.dropped += 1
+                return False
+            bucket = self._buckets[index] = {metric: MetricBucket() for metric in METRICS}
+        for metric, value in values.items():
+            bucket[metric].add(value)
+        self.samples += 1
+        return True
+
+    def encode(self):
+        """Pack the series into the compact binary format read by ``decode``."""
+        parts = [_HEADER.pack(TELEMETRY_FORMAT_VERSION, self.bucket_seconds, len(self._buckets), len(METRICS))]
+        for index in sorted(self._buckets):
+            bucket = self._buckets[index]
+            parts.append(_BUCKET.pack(index, min(0xFFFF, max(b.count for b in bucket.values()))))
+            for metric in METRICS:
+                parts.append(_STATS.pack(*bucket[metric].stats()))
+        return b''.join(parts)
+
+    def summary(self):
+        """Session-level quality fields derived from the series."""
+        means = {}
+        for metric in METRICS:
+            buckets = [bucket[metric] for bucket in self._buckets.values() if bucket[metric].count]
+            means[metric] = sum(b.mean for b in buckets) / len(buckets) if buckets else None
+
+        poor_buckets = sum(
+            1 for bucket in self._buckets.values()
+            if bucket['rtt'].p95 > POOR_RTT_MS or bucket['packet_loss'].p95 > POOR_PACKET_LOSS
+        )
+        data_transferred = sum(
+            bucket['bitrate'].mean * self.bucket_seconds / 8 for bucket in self._buckets.values()
+        )
+
+        if means['framerate'] is None and means['bitrate'] is None:
+            video_quality = ''
+        elif (means['framerate'] or 0) >= HD_FRAMERATE and (means['bitrate'] or 0) >= HD_BITRATE:
+            video_quality = 'HD'
+        elif (means['framerate'] or 0) >= HD_FRAMERATE / 2:
+            video_quality = 'SD'
+        else:
+            video_quality = 'Poor'
+
+        return {
+            'average_video_quality': video_quality,
+            'network_issues_count': poor_buckets,
+            'total_data_transferred': int(min(data_transferred, _BIGINT_MAX)),
+        }
+
+
+def decode(blob):
+    """Unpack a telemetry blob into a list of per-bucket dicts."""
+    blob = bytes(blob)
+    version, bucket_seconds, bucket_count, metric_count = _HEADER.unpack_from(blob)
+    if version != TELEMETRY_FORMAT_VERSION or metric_count != len(METRICS):
+        raise ValueError(f'Unsupported telemetry format {version} with {metric_count} metrics')
+
+    offset = _HEADER.size
+    series = []
+    for _ in range(bucket_count):
+        index, count = _BUCKET.unpack_from(blob, offset)
+        offset += _BUCKET.size
+        entry = {'offset_seconds': index * bucket_seconds, 'samples': count}
+        for metric in METRICS:
+            minimum, maximum, mean, p95 = _STATS.unpack_from(blob, offset)
+            offset += _STATS.size
+            entry[metric] = {'min': minimum, 'max': maximum, 'mean': mean, 'p95': p95}
+        series.append(entry)
+    return series
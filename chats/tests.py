@@ -1,3 +1,4 @@
+import asyncio
 import json
 import uuid
 from datetime import timedelta
@@ -8,14 +9,32 @@ from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+import msgpack
 from channels.testing import WebsocketCommunicator
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 
 from users.models import Language, UserLanguage
 from matches.models import Match
-from .models import VideoRoom, CallInvitation, UserPresence, CallSession, RoomMessage
-from .consumers import VideoCallConsumer, UserNotificationConsumer
+from .models import VideoRoom, CallInvitation, UserPresence, CallSession, RoomMessage, ChatRoom, RoomCallStats, UserCallStats
+from .consumers import VideoCallConsumer, UserNotificationConsumer, TextChatConsumer, MultiplexConsumer
+from .executors import InstrumentedExecutor, PoolBusy, RequestLimiter, run_in_executor
+from .expiry import InvitationExpiryWheel
+from .heartbeat import HEARTBEAT_TIMEOUT_CLOSE_CODE, heartbeat_metrics
+from .notifications import NotificationDispatcher
+from .admission import ConnectionAdmission, ADMISSION_REJECTED_CLOSE_CODE
+from .benchmark import LocalChannelLayer, compare as compare_benchmarks, run_benchmark
+from .call_sessions import (
+    add_participants, end_sessions, end_stale_sessions, missing_participants, rebuild_rollups,
+    repair_participants, session_summaries,
+)
+from .log import EventSampler, StructuredFormatter, message_body
+from .middleware import TokenAuthMiddleware, AdmissionControlMiddleware
+from .outbound import OutboundQueue, coalesce_key, send_queue_metrics
+from .ratelimit import MessageRateLimiter, UserBuckets
+from .protocol import MSGPACK_SUBPROTOCOL, FrameDecodeError, pack, unpack, expand
+from .telemetry import TelemetrySeries, decode
+from .tokens import mint_websocket_token, read_websocket_token
 
 User = get_user_model()
 
@@ -661,6 +680,24 @@ class ChatsViewsTest(TestCase):
         # Check notification was sent
         mock_notification.assert_called_once()
     
+    @patch('chats.views.send_user_notification')
+    def test_cancel_invitation_keeps_an_expired_invitation_expired(self, mock_notification):
+        """A cancel that loses the race with the expiry wheel is refused."""
+        room = VideoRoom.objects.create(match=self.match)
+        invitation = CallInvitation.objects.create(room=room, caller=self.user1, receiver=self.user2)
+        # The view loaded the row while pending; the wheel expires it before the write
+        CallInvitation.objects.filter(pk=invitation.pk).update(status='expired')
+        
+        self.client.login(username='testuser1', password='testpass123')
+        with patch('chats.views.get_object_or_404', return_value=invitation):
+            response = self.client.post(reverse('chats:cancel_invitation', args=[invitation.id]))
+        
+        self.assertEqual(response.status_code, 400)
+        invitation.refresh_from_db()
+        self.assertEqual(invitation.status, 'expired')
+        self.assertIsNone(invitation.responded_at)
+        mock_notification.assert_not_called()
+    
     def test_get_pending_invitations(self):
         """Test getting pending invitations."""
         # Create room and invitation
@@ -700,6 +737,19 @@ class ChatsViewsTest(TestCase):
         presence = UserPresence.objects.get(user=self.user1)
         self.assertTrue(presence.is_online)
     
+    def test_realtime_metrics_requires_staff(self):
+        """Test realtime metrics endpoint is staff only."""
+        self.client.login(username='testuser1', password='testpass123')
+        response = self.client.get(reverse('chats:realtime_metrics'))
+        self.assertEqual(response.status_code, 403)
+        
+        self.user1.is_staff = True
+        self.user1.save()
+        response = self.client.get(reverse('chats:realtime_metrics'))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertIn('queue_depth', data['notifications'])
+    
     def test_unauthorized_api_access(self):
         """Test that API endpoints require authentication."""
         endpoints = [
@@ -894,6 +944,1089 @@ class WebSocketConsumerTest(TransactionTestCase):
         await communicator.disconnect()
 
 
+class MultiplexConsumerTest(TransactionTestCase):
+    """Test the multiplexed websocket consumer."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(
+            username='testuser1',
+            email='test1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.chat_room = ChatRoom.objects.create(match=self.match)
+    
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), '/ws/multiplex/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+    
+    async def receive_stream(self, communicator, stream, payload_type):
+        """Receive frames until a payload of the given type arrives on the stream."""
+        while True:
+            frame = await communicator.receive_json_from()
+            if frame.get('stream') == stream and frame.get('payload', {}).get('type') == payload_type:
+                return frame['payload']
+    
+    async def test_streams_share_one_connection(self):
+        """Notifications and text chat are carried over one socket."""
+        communicator = await self.connect(self.user1)
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        
+        await communicator.send_json_to({'type': 'subscribe', 'stream': 'notifications'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'stream': 'notifications'})
+        await communicator.send_json_to({'type': 'subscribe', 'stream': chat_stream})
+        await self.receive_stream(communicator, 'notifications', 'notification_connected')
+        await self.receive_stream(communicator, chat_stream, 'connected')
+        
+        await get_channel_layer().group_send(
+            f'user_notifications_{self.user1.id}',
+            {'type': 'call_invitation_cancelled', 'invitation_id': 7, 'canceller_username': 'testuser2'}
+        )
+        payload = await self.receive_stream(communicator, 'notifications', 'call_invitation_cancelled')
+        self.assertEqual(payload['invitation_id'], 7)
+        
+        await communicator.send_json_to({'stream': chat_stream, 'payload': {'type': 'ping', 'timestamp': 1}})
+        payload = await self.receive_stream(communicator, chat_stream, 'pong')
+        self.assertEqual(payload['timestamp'], 1)
+        
+        await communicator.send_json_to({'type': 'unsubscribe', 'stream': chat_stream})
+        while True:
+            frame = await communicator.receive_json_from()
+            if frame.get('type') == 'unsubscribed':
+                break
+        self.assertEqual(frame['stream'], chat_stream)
+        
+        await communicator.disconnect()
+    
+    async def test_rejects_unknown_and_denied_streams(self):
+        """Unknown streams error out and denied rooms are unsubscribed."""
+        communicator = await self.connect(self.user1)
+        
+        await communicator.send_json_to({'type': 'subscribe', 'stream': 'bogus'})
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['type'], 'error')
+        
+        denied = f'text_chat:{uuid.uuid4()}'
+        await communicator.send_json_to({'type': 'subscribe', 'stream': denied})
+        frames = [await communicator.receive_json_from()]
+        while frames[-1].get('type') != 'unsubscribed':
+            frames.append(await communicator.receive_json_from())
+        self.assertEqual(frames[0]['payload']['message'], 'Chat room access denied')
+        self.assertNotIn('subscribed', [frame.get('type') for frame in frames])
+        
+        await communicator.disconnect()
+    
+    async def test_stream_that_fails_to_connect_is_unregistered(self):
+        """A handler raising in connect() gets an error frame, never a subscription."""
+        communicator = await self.connect(self.user1)
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        
+        with patch.object(MultiplexConsumer.stream_consumers['text_chat'], 'connect', side_effect=RuntimeError), \
+                self.assertLogs('chats.websocket', 'ERROR'):
+            await communicator.send_json_to({'type': 'subscribe', 'stream': chat_stream})
+            frame = await communicator.receive_json_from()
+        self.assertEqual((frame['type'], frame['stream']), ('error', chat_stream))
+        
+        await communicator.send_json_to({'stream': chat_stream, 'payload': {'type': 'ping', 'timestamp': 1}})
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['message'], 'Not subscribed to stream')
+        
+        await communicator.disconnect()
+
+
+    async def test_msgpack_subprotocol(self):
+        """Clients offering the msgpack subprotocol get compact binary frames."""
+        communicator = WebsocketCommunicator(
+            MultiplexConsumer.as_asgi(), '/ws/multiplex/', subprotocols=[MSGPACK_SUBPROTOCOL]
+        )
+        communicator.scope['user'] = self.user1
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, MSGPACK_SUBPROTOCOL)
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        
+        await communicator.send_to(bytes_data=pack({'type': 'subscribe', 'stream': chat_stream}))
+        await communicator.send_to(bytes_data=pack({'stream': chat_stream, 'payload': {'t': 'ping', 'ts': 5}}))
+        while True:
+            frame = unpack(await communicator.receive_from())
+            payload = expand(frame.get('payload', {}))
+            if payload.get('type') == 'pong':
+                break
+        self.assertEqual(frame['stream'], chat_stream)
+        self.assertEqual(payload['timestamp'], 5)
+        
+        await communicator.disconnect()
+
+
+    async def test_stream_messages_are_rate_limited(self):
+        """Frames over the per-type limit get an error instead of reaching the handler."""
+        communicator = await self.connect(self.user1)
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        await communicator.send_json_to({'type': 'subscribe', 'stream': chat_stream})
+        await self.receive_stream(communicator, chat_stream, 'connected')
+        
+        with self.settings(WEBSOCKET_MESSAGE_RATE_LIMITS={'ping': (1, 1)}):
+            for timestamp in (1, 2):
+                await communicator.send_json_to({'stream': chat_stream, 'payload': {'type': 'ping', 'timestamp': timestamp}})
+            await self.receive_stream(communicator, chat_stream, 'pong')
+            payload = await self.receive_stream(communicator, chat_stream, 'error')
+        self.assertEqual(payload['code'], 'rate_limited')
+        self.assertEqual(payload['message_type'], 'ping')
+        self.assertGreater(payload['retry_after'], 0)
+        
+        await communicator.disconnect()
+
+    async def test_telemetry_is_persisted_once_when_leaving(self):
+        """getStats samples are kept in memory and written as one row on disconnect."""
+        from .models import CallTelemetry
+        
+        room = await VideoRoom.objects.acreate(match=self.match, is_active=True)
+        session = await CallSession.objects.acreate(room=room, status='active')
+        await session.participants.aadd(self.user1)
+        video_stream = f'video:{room.room_id}'
+        
+        communicator = await self.connect(self.user1)
+        await communicator.send_json_to({'type': 'subscribe', 'stream': video_stream})
+        await self.receive_stream(communicator, video_stream, 'connection_test')
+        for rtt in (40, 60, 80):
+            await communicator.send_json_to({'stream': video_stream, 'payload': {
+                'type': 'telemetry',
+                'stats': {'rtt': rtt, 'bitrate': 800_000, 'framerate': 15, 'packet_loss': 1},
+            }})
+        self.assertFalse(await CallTelemetry.objects.filter(session=session).aexists())
+        
+        await communicator.send_json_to({'type': 'unsubscribe', 'stream': video_stream})
+        while (await communicator.receive_json_from()).get('type') != 'unsubscribed':
+            pass
+        
+        telemetry = await CallTelemetry.objects.aget(session=session, user=self.user1)
+        self.assertEqual(telemetry.sample_count, 3)
+        self.assertEqual(telemetry.series()[0]['rtt']['mean'], 60.0)
+        await session.arefresh_from_db()
+        self.assertEqual(session.average_video_quality, 'SD')
+        self.assertEqual(session.total_data_transferred, 1_000_000)
+        
+        await communicator.disconnect()
+
+    async def test_silent_connection_is_reaped(self):
+        """A client that stops answering heartbeats is closed and its streams cleaned up."""
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        group = f'text_chat_{self.chat_room.room_id}'
+        channel_layer = get_channel_layer()
+
+        with self.settings(WEBSOCKET_HEARTBEAT_INTERVAL=0.05, WEBSOCKET_HEARTBEAT_MISSED_LIMIT=2):
+            communicator = await self.connect(self.user1)
+            await communicator.send_json_to({'type': 'subscribe', 'stream': chat_stream})
+            await self.receive_stream(communicator, chat_stream, 'connected')
+            self.assertTrue(channel_layer.groups.get(group))
+
+            frames = []
+            while True:
+                output = await communicator.receive_output(timeout=2)
+                if output['type'] == 'websocket.close':
+                    break
+                frames.append(json.loads(output['text']))
+            await communicator.wait(timeout=2)
+
+        self.assertEqual(output['code'], HEARTBEAT_TIMEOUT_CLOSE_CODE)
+        self.assertIn({'type': 'heartbeat'}, frames)
+        self.assertFalse(channel_layer.groups.get(group))
+        self.assertGreaterEqual(heartbeat_metrics()['reaped'], 1)
+
+    async def test_heartbeat_ack_keeps_connection_open(self):
+        """Answering heartbeats keeps an otherwise idle connection alive."""
+        with self.settings(WEBSOCKET_HEARTBEAT_INTERVAL=0.05, WEBSOCKET_HEARTBEAT_MISSED_LIMIT=2):
+            communicator = await self.connect(self.user1)
+            for _ in range(4):
+                frame = await communicator.receive_json_from(timeout=2)
+                self.assertEqual(frame, {'type': 'heartbeat'})
+                await communicator.send_json_to({'type': 'heartbeat_ack'})
+            await communicator.disconnect()
+
+
+    async def test_send_message_persists_on_the_websocket_pool(self):
+        """Sending a message saves it, clears typing and updates room activity on the websocket pool."""
+        from .executors import get_executor
+        from .models import ChatMessage, TypingStatus
+        
+        completed = get_executor('websocket').metrics()['completed']
+        communicator = await self.connect(self.user1)
+        chat_stream = f'text_chat:{self.chat_room.room_id}'
+        await communicator.send_json_to({'type': 'subscribe', 'stream': chat_stream})
+        await self.receive_stream(communicator, chat_stream, 'connected')
+        
+        await communicator.send_json_to({'stream': chat_stream, 'payload': {'type': 'typing_start'}})
+        await communicator.send_json_to({'stream': chat_stream, 'payload': {'type': 'send_message', 'message': 'Hello'}})
+        payload = await self.receive_stream(communicator, chat_stream, 'new_message')
+        
+        message = await ChatMessage.objects.aget(id=payload['message_id'])
+        self.assertEqual(message.content, 'Hello')
+        self.assertEqual(message.room_id, self.chat_room.pk)
+        typing = await TypingStatus.objects.aget(room=self.chat_room, user=self.user1)
+        self.assertFalse(typing.is_typing)
+        room = await ChatRoom.objects.aget(pk=self.chat_room.pk)
+        self.assertIsNotNone(room.last_activity)
+        # Access check, presence, typing start, save, typing stop and room activity
+        self.assertGreaterEqual(get_executor('websocket').metrics()['completed'] - completed, 6)
+        
+        await communicator.disconnect()
+
+
+class WebsocketTokenTest(TransactionTestCase):
+    """Test signed websocket handshake tokens."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(
+            username='testuser1',
+            email='test1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.chat_room = ChatRoom.objects.create(match=self.match)
+    
+    def test_token_round_trip(self):
+        """Tokens carry the user and granted rooms and reject tampering."""
+        token = mint_websocket_token(self.user1, text_rooms=[self.chat_room.room_id])
+        payload = read_websocket_token(token)
+        self.assertEqual(payload['u'], self.user1.id)
+        self.assertEqual(payload['t'], [str(self.chat_room.room_id)])
+        self.assertIsNone(read_websocket_token(token + 'x'))
+    
+    def test_tokens_expire_after_five_minutes_by_default(self):
+        """Tokens can't be revoked, so they stop working soon after they are minted."""
+        import time
+        token = mint_websocket_token(self.user1)
+        with patch('django.core.signing.time.time', return_value=time.time() + 301):
+            self.assertIsNone(read_websocket_token(token))
+    
+    def test_text_chat_view_mints_room_token(self):
+        """The text chat page embeds a token granting its room."""
+        self.client.login(username='testuser1', password='testpass123')
+        response = self.client.get(reverse('chats:text_chat', args=[self.chat_room.room_id]))
+        payload = read_websocket_token(response.context['ws_token'])
+        self.assertEqual(payload['t'], [str(self.chat_room.room_id)])
+    
+    def test_handshake_skips_session_and_room_queries(self):
+        """A valid token authenticates the handshake and room access without the database."""
+        from asgiref.sync import async_to_sync
+        token = mint_websocket_token(self.user1, text_rooms=[self.chat_room.room_id])
+        captured = {}
+        
+        async def app(scope, receive, send):
+            captured['user'] = scope['user']
+            captured['allowed'] = await TextChatConsumer.check_chat_room_access(
+                MagicMock(scope=scope, room_id=str(self.chat_room.room_id))
+            )
+        
+        middleware = TokenAuthMiddleware(app)
+        middleware.session_auth = MagicMock(side_effect=AssertionError('session path used'))
+        async_to_sync(middleware)(
+            {'type': 'websocket', 'query_string': f'token={token}'.encode()}, None, None
+        )
+        self.assertEqual(captured['user'].id, self.user1.id)
+        self.assertTrue(captured['user'].is_authenticated)
+        self.assertTrue(captured['allowed'])
+
+class InvitationExpiryWheelTest(TransactionTestCase):
+    """Test the invitation expiry timer wheel."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(
+            username='testuser1',
+            email='test1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.room = VideoRoom.objects.create(match=self.match)
+    
+    def create_invitation(self, expires_in):
+        return CallInvitation.objects.create(
+            room=self.room,
+            caller=self.user1,
+            receiver=self.user2,
+            expires_at=timezone.now() + timedelta(seconds=expires_in)
+        )
+    
+    def test_schedule_and_advance(self):
+        """Invitations fall due on the tick matching their deadline."""
+        wheel = InvitationExpiryWheel(tick_seconds=1, slots=4)
+        soon = self.create_invitation(expires_in=-1)
+        later = self.create_invitation(expires_in=10)
+        wheel.schedule(soon.id, soon.caller_id, soon.receiver_id, soon.expires_at)
+        wheel.schedule(later.id, later.caller_id, later.receiver_id, later.expires_at)
+        
+        self.assertEqual([entry[0] for entry in wheel.advance()], [soon.id])
+        due_ticks = [tick for tick in range(1, 12) if wheel.advance()]
+        self.assertEqual(len(due_ticks), 1)
+        self.assertIn(due_ticks[0], (10, 11))
+        self.assertEqual(len(wheel), 0)
+    
+    def test_cancel(self):
+        """Cancelled invitations never fall due."""
+        wheel = InvitationExpiryWheel(tick_seconds=1, slots=4)
+        invitation = self.create_invitation(expires_in=-1)
+        wheel.schedule(invitation.id, invitation.caller_id, invitation.receiver_id, invitation.expires_at)
+        wheel.cancel(invitation.id)
+        self.assertEqual(wheel.advance(), [])
+    
+    async def test_expire_marks_and_notifies(self):
+        """Due invitations are expired in the database and both users are notified."""
+        invitation = await database_sync_to_async(self.create_invitation)(-1)
+        answered = await database_sync_to_async(self.create_invitation)(-1)
+        answered.status = 'accepted'
+        await database_sync_to_async(answered.save)()
+        
+        channel_layer = get_channel_layer()
+        caller_channel = await channel_layer.new_channel()
+        receiver_channel = await channel_layer.new_channel()
+        await channel_layer.group_add(f'user_notifications_{self.user1.id}', caller_channel)
+        await channel_layer.group_add(f'user_notifications_{self.user2.id}', receiver_channel)
+        
+        wheel = InvitationExpiryWheel(tick_seconds=1, slots=4)
+        for inv in (invitation, answered):
+            wheel.schedule(inv.id, inv.caller_id, inv.receiver_id, inv.expires_at)
+        expired = await wheel.expire(wheel.advance())
+        
+        self.assertEqual([entry[0] for entry in expired], [invitation.id])
+        await database_sync_to_async(invitation.refresh_from_db)()
+        await database_sync_to_async(answered.refresh_from_db)()
+        self.assertEqual(invitation.status, 'expired')
+        self.assertEqual(answered.status, 'accepted')
+        
+        for channel in (caller_channel, receiver_channel):
+            message = await channel_layer.receive(channel)
+            self.assertEqual(message['type'], 'call_invitation_expired')
+            self.assertEqual(message['invitation_id'], invitation.id)
+
+
+class NotificationDispatcherTest(TransactionTestCase):
+    """Test the non-blocking notification dispatcher."""
+    
+    def test_sends_inline_without_event_loop(self):
+        """Without a running sender notifications are delivered inline."""
+        dispatcher = NotificationDispatcher(max_queue_size=10, batch_size=10)
+        channel_layer = get_channel_layer()
+        
+        async def subscribe():
+            channel = await channel_layer.new_channel()
+            await channel_layer.group_add('user_notifications_1', channel)
+            return channel
+        
+        from asgiref.sync import async_to_sync
+        channel = async_to_sync(subscribe)()
+        self.assertTrue(dispatcher.dispatch('user_notifications_1', {'type': 'ping'}))
+        message = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(message['type'], 'ping')
+        self.assertEqual(dispatcher.metrics()['inline'], 1)
+    
+    async def test_queue_is_bounded_and_drained(self):
+        """Queued notifications are sent in batches and overflow is dropped."""
+        channel_layer = get_channel_layer()
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add('user_notifications_2', channel)
+        
+        dispatcher = NotificationDispatcher(max_queue_size=2, batch_size=10)
+        dispatcher.ensure_started()
+        results = [
+            dispatcher.dispatch('user_notifications_2', {'type': 'ping', 'n': n})
+            for n in range(3)
+        ]
+        self.assertEqual(results, [True, True, False])
+        
+        received = [await channel_layer.receive(channel) for _ in range(2)]
+        self.assertEqual([message['n'] for message in received], [0, 1])
+        await dispatcher.stop()
+        
+        metrics = dispatcher.metrics()
+        self.assertEqual(metrics['dropped'], 1)
+        self.assertEqual(metrics['sent'], 2)
+        self.assertEqual(metrics['queue_depth'], 0)
+    
+    async def test_batch_keeps_order_within_a_group(self):
+        """A slow first send to a group never lets that group's next message overtake it."""
+        delivered = []
+        
+        class SlowFirstLayer:
+            async def group_send(self, group_name, message):
+                if message['n'] == 0:
+                    await asyncio.sleep(0.05)
+                delivered.append((group_name, message['n']))
+        
+        dispatcher = NotificationDispatcher(max_queue_size=10, batch_size=10)
+        with patch('chats.notifications.get_channel_layer', return_value=SlowFirstLayer()):
+            await dispatcher._send_batch([
+                ('user_notifications_1', {'n': 0}),
+                ('user_notifications_1', {'n': 1}),
+                ('user_notifications_2', {'n': 2}),
+            ])
+        
+        self.assertEqual([n for group, n in delivered if group == 'user_notifications_1'], [0, 1])
+        # Other groups are not held up behind the slow one
+        self.assertEqual(delivered[0], ('user_notifications_2', 2))
+        self.assertEqual(dispatcher.metrics()['sent'], 3)
+
+
+class ConnectionAdmissionTest(TransactionTestCase):
+    """Test websocket admission control."""
+    
+    def test_bucket_limits_and_spreads_retries(self):
+        """Connections beyond the burst are rejected with staggered retry hints."""
+        now = [100.0]
+        admission = ConnectionAdmission(rate=2, burst=2, max_retry=3, clock=lambda: now[0])
+        
+        self.assertEqual(admission.admit(), (True, 0.0))
+        self.assertEqual(admission.admit(), (True, 0.0))
+        retries = [admission.admit()[1] for _ in range(8)]
+        self.assertEqual(retries[:3], [0.5, 1.0, 1.5])
+        self.assertEqual(max(retries), 3.0)
+        
+        now[0] += 0.5
+        self.assertTrue(admission.admit()[0])
+        metrics = admission.metrics()
+        self.assertEqual(metrics['admitted'], 3)
+        self.assertEqual(metrics['rejected'], 8)
+    
+    async def test_rejected_connection_is_closed_with_retry_hint(self):
+        """Over the limit the handshake is accepted and closed with 4429."""
+        user = await database_sync_to_async(User.objects.create_user)(
+            username='testuser1', email='test1@example.com', password='testpass123'
+        )
+        admission = ConnectionAdmission(rate=1, burst=1, max_retry=30)
+        application = AdmissionControlMiddleware(UserNotificationConsumer.as_asgi(), admission=admission)
+        
+        first = WebsocketCommunicator(application, '/ws/notifications/')
+        first.scope['user'] = user
+        connected, _ = await first.connect()
+        self.assertTrue(connected)
+        
+        second = WebsocketCommunicator(application, '/ws/notifications/')
+        second.scope['user'] = user
+        connected, _ = await second.connect()
+        self.assertTrue(connected)
+        message = await second.receive_output()
+        self.assertEqual(message['type'], 'websocket.close')
+        self.assertEqual(message['code'], ADMISSION_REJECTED_CLOSE_CODE)
+        self.assertTrue(message['reason'].startswith('retry_after='))
+        
+        await first.disconnect()
+
+
+class StructuredLoggingTest(TestCase):
+    """Test the structured consumer logging helpers."""
+    
+    def test_sampler_limits_each_event_per_second(self):
+        """High-frequency events are capped and the suppressed count is reported."""
+        now = [0.0]
+        sampler = EventSampler(limit=2, clock=lambda: now[0])
+        
+        results = [sampler.allow('ice_candidate')[0] for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertTrue(sampler.allow('typing')[0])
+        
+        now[0] = 1.5
+        self.assertEqual(sampler.allow('ice_candidate'), (True, 3))
+    
+    def test_message_bodies_hidden_by_default(self):
+        """Chat content is replaced by its length unless explicitly enabled."""
+        self.assertEqual(message_body('secret words'), '<12 chars>')
+        with self.settings(WEBSOCKET_LOG_MESSAGE_BODIES=True):
+            self.assertEqual(message_body('secret words'), 'secret words')
+    
+    def test_formatter_emits_json_fields(self):
+        """Records are formatted as one JSON object with their fields."""
+        import logging
+        record = logging.LogRecord('chats.websocket', logging.INFO, __file__, 1, 'connect', None, None)
+        record.event = 'connect'
+        record.fields = {'room': 'abc', 'user': 1}
+        entry = json.loads(StructuredFormatter().format(record))
+        self.assertEqual(entry['event'], 'connect')
+        self.assertEqual(entry['room'], 'abc')
+        self.assertEqual(entry['level'], 'INFO')
+
+
+class ProtocolCodecTest(TestCase):
+    """Test the compact msgpack frame codec."""
+    
+    def test_round_trip_is_smaller_than_json(self):
+        """Packed frames decode to the original message and are much smaller."""
+        event = {
+            'type': 'ice_candidate',
+            'candidate': {'candidate': 'candidate:1 1 udp 2122260223 10.0.0.2 54321 typ host', 'sdpMid': '0'},
+            'sender_id': 42,
+            'sender_username': 'testuser1',
+            'room_id': str(uuid.uuid4()),
+        }
+        frame = pack(event)
+        self.assertEqual(unpack(frame), event)
+        self.assertLess(len(frame), len(json.dumps(event).encode()) * 0.9)
+    
+    def test_invalid_frames_raise(self):
+        """Garbage and non-map frames are rejected."""
+        with self.assertRaises(FrameDecodeError):
+            unpack(b'\xc1')
+        with self.assertRaises(FrameDecodeError):
+            unpack(msgpack.packb([1, 2, 3]))
+
+
+class OutboundQueueTest(TransactionTestCase):
+    """Test per-connection outbound queues."""
+    
+    async def test_coalesces_and_drains_in_order(self):
+        """Typing events from one sender collapse to the latest; others keep order."""
+        sent = []
+        
+        async def send(**frame):
+            sent.append(frame['text_data'])
+        
+        async def on_evict():
+            pass
+        
+        outbound = OutboundQueue(send, on_evict, max_size=10)
+        typing = {'type': 'typing_start', 'sender_id': 1}
+        outbound.put({'text_data': 'start'}, coalesce_key(typing))
+        outbound.put({'text_data': 'message'})
+        outbound.put({'text_data': 'stop'}, coalesce_key({'type': 'typing_stop', 'sender_id': 1}))
+        self.assertEqual(len(outbound), 2)
+        
+        outbound.start()
+        await outbound.drain()
+        self.assertEqual(sent, ['stop', 'message'])
+        outbound.stop()
+    
+    async def test_slow_consumer_is_evicted(self):
+        """Droppable frames are dropped when full; staying over the limit evicts."""
+        now = [0.0]
+        evicted = []
+        
+        async def send(**frame):
+            pass
+        
+        async def on_evict():
+            evicted.append(True)
+        
+        outbound = OutboundQueue(send, on_evict, max_size=2, grace_seconds=5, clock=lambda: now[0])
+        self.assertTrue(outbound.put({'text_data': 'a'}))
+        self.assertTrue(outbound.put({'text_data': 'b'}))
+        self.assertFalse(outbound.put({'text_data': 'typing'}, ('room', 'typing', 2)))
+        self.assertTrue(outbound.put({'text_data': 'c'}))
+        
+        now[0] = 6.0
+        self.assertFalse(outbound.put({'text_data': 'd'}))
+        await asyncio.sleep(0)
+        self.assertEqual(evicted, [True])
+        self.assertTrue(outbound.closed)
+    
+    async def test_reader_that_stops_acknowledging_backs_up_into_the_queue(self):
+        """send() returning at once doesn't drain the queue; only acknowledged probes open the window."""
+        now = [0.0]
+        sent = []
+        evicted = []
+        
+        async def send(**frame):
+            sent.append(frame['text_data'])
+        
+        async def on_evict():
+            evicted.append(True)
+        
+        outbound = OutboundQueue(send, on_evict, max_size=2, window=4, grace_seconds=5, clock=lambda: now[0])
+        outbound.start()
+        for name in 'abcd':
+            outbound.put({'text_data': name})
+        await asyncio.sleep(0)
+        probes = [json.dumps({'type': 'heartbeat', 'seq': seq}) for seq in (2, 4, 6)]
+        self.assertEqual(sent, ['a', 'b', probes[0], 'c', 'd', probes[1]])
+        self.assertEqual(outbound.in_flight, 4)
+        
+        typing = coalesce_key({'type': 'typing_start', 'sender_id': 1})
+        self.assertTrue(outbound.put({'text_data': 'typing'}, typing))
+        self.assertTrue(outbound.put({'text_data': 'stopped'}, typing))
+        self.assertTrue(outbound.put({'text_data': 'e'}))
+        self.assertFalse(outbound.put({'text_data': 'other'}, coalesce_key({'type': 'typing_start', 'sender_id': 2})))
+        self.assertTrue(outbound.put({'text_data': 'f'}))
+        await asyncio.sleep(0)
+        self.assertEqual((len(sent), len(outbound)), (6, 3))
+        
+        outbound.ack(2)
+        await asyncio.sleep(0)
+        self.assertEqual(sent[6:], ['stopped', 'e', probes[2]])
+        self.assertEqual(len(outbound), 1)
+        self.assertGreaterEqual(send_queue_metrics()['unacknowledged'], 4)
+        
+        outbound.put({'text_data': 'g'})
+        outbound.put({'text_data': 'h'})
+        now[0] = 6.0
+        self.assertFalse(outbound.put({'text_data': 'i'}))
+        await asyncio.sleep(0)
+        self.assertEqual(evicted, [True])
+
+
+class MessageRateLimiterTest(TestCase):
+    """Test per-connection and per-user message rate limits."""
+    
+    def test_connection_and_user_buckets(self):
+        """Each connection has its own budget and a user's connections share a larger one."""
+        now = [0.0]
+        clock = lambda: now[0]
+        buckets = UserBuckets(clock=clock)
+        limits = {'send_message': (1, 2)}
+        first = MessageRateLimiter(7, limits=limits, multiplier=2, buckets=buckets, clock=clock)
+        second = MessageRateLimiter(7, limits=limits, multiplier=2, buckets=buckets, clock=clock)
+        third = MessageRateLimiter(7, limits=limits, multiplier=2, buckets=buckets, clock=clock)
+        
+        self.assertEqual([first.check('send_message') for _ in range(2)], [0.0, 0.0])
+        self.assertEqual(first.check('send_message'), 1.0)
+        self.assertEqual([second.check('send_message') for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(third.check('send_message'), 0)
+        self.assertEqual(first.check('ping'), 0.0)
+        
+        now[0] = 1.0
+        self.assertEqual(first.check('send_message'), 0.0)
+
+
+class TelemetrySeriesTest(TestCase):
+    """Test time-bucketed WebRTC telemetry."""
+    
+    def test_samples_are_bucketed_and_round_trip(self):
+        """Samples fold into fixed buckets and survive encoding."""
+        now = [0.0]
+        series = TelemetrySeries(bucket_seconds=10, clock=lambda: now[0])
+        for second, rtt in enumerate(range(10, 110, 10)):
+            now[0] = second
+            series.add({'rtt': rtt, 'bitrate': 1_500_000, 'framerate': 30, 'packet_loss': 0})
+        now[0] = 25
+        series.add({'rtt': 600, 'packet_loss': 12, 'framerate': 'bogus'})
+        self.assertFalse(series.add({'rtt': -1}))
+        
+        decoded = decode(series.encode())
+        
+        self.assertEqual(len(series.encode()), 6 + 2 * (4 + 4 * 16))
+        self.assertEqual([entry['offset_seconds'] for entry in decoded], [0, 20])
+        self.assertEqual(decoded[0]['samples'], 10)
+        self.assertEqual(decoded[0]['rtt'], {'min': 10.0, 'max': 100.0, 'mean': 55.0, 'p95': 100.0})
+        self.assertEqual(decoded[1]['framerate']['max'], 0.0)
+        self.assertEqual(series.summary(), {
+            'average_video_quality': 'HD',
+            'network_issues_count': 1,
+            'total_data_transferred': 1_875_000,
+        })
+    
+    def test_non_finite_and_oversized_samples(self):
+        """inf and NaN are rejected; values past a field's range are clamped and still encode."""
+        series = TelemetrySeries(bucket_seconds=10, clock=lambda: 0.0)
+        self.assertFalse(series.add({'rtt': float('inf'), 'bitrate': float('nan')}))
+        self.assertTrue(series.add({'rtt': 1e40, 'bitrate': 10 ** 400, 'framerate': 30}))
+        
+        decoded = decode(series.encode())
+        
+        self.assertEqual(series.samples, 1)
+        self.assertEqual(decoded[0]['rtt']['max'], decoded[0]['bitrate']['max'])
+        self.assertGreater(decoded[0]['rtt']['max'], 3e38)
+        self.assertEqual(decoded[0]['framerate']['max'], 30.0)
+        self.assertEqual(series.summary()['total_data_transferred'], 2 ** 63 - 1)
+
+
+class ExecutorsTest(TestCase):
+    """Test the named, instrumented pools."""
+    
+    def test_executor_records_latency(self):
+        """Completed tasks show up in the pool metrics."""
+        import time
+        executor = InstrumentedExecutor('test', 2)
+        futures = [executor.submit(time.sleep, 0.01) for _ in range(4)]
+        for future in futures:
+            future.result()
+        executor.shutdown()
+        
+        metrics = executor.metrics()
+        self.assertEqual(metrics['completed'], 4)
+        self.assertEqual(metrics['active'], 0)
+        self.assertEqual(metrics['waiting'], 0)
+        self.assertGreaterEqual(metrics['avg_task_ms'], 10)
+    
+    def test_queued_task_can_be_withdrawn(self):
+        """A task no worker has started can be cancelled and leaves the queue metrics clean."""
+        import threading
+        executor = InstrumentedExecutor('test', 1)
+        started, release = threading.Event(), threading.Event()
+        running = executor.submit(lambda: started.set() or release.wait())
+        queued = executor.submit(threading.get_ident)
+        started.wait()
+        
+        self.assertTrue(executor.withdraw(queued))
+        self.assertFalse(executor.withdraw(running))
+        release.set()
+        executor.shutdown()
+        
+        metrics = executor.metrics()
+        self.assertEqual((metrics['submitted'], metrics['completed'], metrics['waiting']), (1, 1, 0))
+    
+    def test_task_a_busy_pool_cannot_start_is_refused(self):
+        """Work not started within start_timeout is withdrawn, never run on the caller's thread."""
+        import threading
+        executor = InstrumentedExecutor('test', 1)
+        started, release = threading.Event(), threading.Event()
+        executor.submit(lambda: started.set() or release.wait())
+        started.wait()
+        ran = []
+        
+        with patch('chats.executors.get_executor', return_value=executor), \
+                patch('chats.executors.connection') as connection:
+            connection.in_atomic_block = False
+            with self.assertRaises(PoolBusy):
+                run_in_executor('test', ran.append, 1, start_timeout=0.01)
+        release.set()
+        executor.shutdown()
+        
+        self.assertEqual(ran, [])
+        self.assertEqual(executor.metrics()['waiting'], 0)
+    
+    def test_work_inside_transaction_stays_on_thread(self):
+        """Offloading is skipped inside an atomic block so uncommitted rows stay visible."""
+        import threading
+        self.assertEqual(run_in_executor('batch', threading.get_ident), threading.get_ident())
+    
+    def test_request_limiter_bounds_concurrency(self):
+        """No more than ``size`` calls run at once."""
+        from asgiref.sync import async_to_sync
+        limiter = RequestLimiter('http', 2)
+        running = []
+        peak = []
+        
+        async def call(release):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+        
+        async def burst():
+            await asyncio.gather(*(limiter.run(call) for _ in range(5)))
+        
+        async_to_sync(burst)()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(limiter.metrics()['completed'], 5)
+    
+    def test_request_slot_is_freed_once_the_response_starts(self):
+        """A response still streaming its body does not keep other requests waiting."""
+        from asgiref.sync import async_to_sync
+        from .middleware import RequestLimitMiddleware
+        limiter = RequestLimiter('http', 1)
+        body_sent = asyncio.Event()
+        
+        async def app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            if scope['path'] == '/export/':
+                await body_sent.wait()
+            await send({'type': 'http.response.body', 'body': b''})
+        
+        async def noop(message):
+            pass
+        
+        async def requests():
+            middleware = RequestLimitMiddleware(app)
+            export = asyncio.ensure_future(middleware({'type': 'http', 'path': '/export/'}, None, noop))
+            await asyncio.sleep(0)
+            await asyncio.wait_for(middleware({'type': 'http', 'path': '/'}, None, noop), timeout=1)
+            body_sent.set()
+            await export
+        
+        with patch('chats.middleware.get_request_limiter', return_value=limiter):
+            async_to_sync(requests)()
+        self.assertEqual(limiter.metrics()['completed'], 2)
+        self.assertEqual(limiter.metrics()['active'], 0)
+
+
+class CallSessionReaperTest(TestCase):
+    """Test set-based call session bookkeeping and the stale session reaper."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(
+            username='testuser1',
+            email='test1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.room = VideoRoom.objects.create(match=self.match, is_active=True)
+        self.now = timezone.now()
+    
+    def create_session(self, started_minutes_ago, heartbeat_minutes_ago=None):
+        session = CallSession.objects.create(room=self.room, status='active')
+        CallSession.objects.filter(pk=session.pk).update(
+            started_at=self.now - timedelta(minutes=started_minutes_ago),
+            last_heartbeat=(self.now - timedelta(minutes=heartbeat_minutes_ago)
+                            if heartbeat_minutes_ago is not None else None),
+        )
+        return session
+    
+    def test_stale_session_is_ended_at_last_heartbeat(self):
+        """Stale sessions end with reason timeout and a duration up to their last heartbeat."""
+        session = self.create_session(started_minutes_ago=20, heartbeat_minutes_ago=10)
+        
+        ended, closed = end_stale_sessions(self.now - timedelta(minutes=2), batch_size=100)
+        
+        self.assertEqual((ended, closed), (1, 1))
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'ended')
+        self.assertEqual(session.end_reason, 'timeout')
+        self.assertEqual(session.duration, timedelta(minutes=10))
+        self.assertEqual(session.ended_at, session.last_heartbeat)
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.is_active)
+    
+    def test_live_session_keeps_room_active(self):
+        """Fresh sessions and sessions without heartbeats yet are left alone."""
+        stale = self.create_session(started_minutes_ago=30)
+        fresh = self.create_session(started_minutes_ago=30, heartbeat_minutes_ago=1)
+        
+        ended, closed = end_stale_sessions(self.now - timedelta(minutes=2), batch_size=100)
+        
+        self.assertEqual((ended, closed), (1, 0))
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.duration, timedelta(0))
+        self.assertEqual(fresh.status, 'active')
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.is_active)
+    
+    def test_end_sessions_computes_duration_in_sql(self):
+        """Ending sessions sets status and duration without loading them."""
+        session = self.create_session(started_minutes_ago=5)
+        add_participants([session.id], [self.user1.pk])
+        add_participants([session.id], [self.user1.pk, self.user2.pk])
+        
+        with self.assertNumQueries(12):
+            ended = end_sessions([session.id], ended_at=self.now, end_reason='user_hangup')
+        with self.assertNumQueries(1):
+            summaries = session_summaries([session.id])
+        
+        self.assertEqual(ended, 1)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'ended')
+        self.assertEqual(session.duration, timedelta(minutes=5))
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]['participants'], ['testuser1', 'testuser2'])
+        self.assertEqual(summaries[0]['duration'], '5m 0s')
+        self.assertTrue(summaries[0]['was_successful'])
+    
+    def test_ending_room_sessions_is_constant_in_queries(self):
+        """The consumer ends every active session with the same handful of queries."""
+        sessions = [self.create_session(started_minutes_ago=minutes) for minutes in (3, 2, 1)]
+        consumer = VideoCallConsumer()
+        consumer.room_id = str(self.room.room_id)
+        
+        with self.assertNumQueries(16):
+            session_ids = consumer.end_room_sessions(end_reason='normal')
+        
+        self.assertCountEqual(session_ids, [session.id for session in sessions])
+        self.assertFalse(CallSession.objects.filter(status='active').exists())
+        for session in sessions:
+            self.assertCountEqual(session.participants.all(), [self.user1, self.user2])
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.is_active)
+    
+    def test_reaper_skips_sessions_refreshed_after_the_batch_read(self):
+        """A heartbeat landing before the lock is taken keeps the session open."""
+        from . import call_sessions
+        session = self.create_session(started_minutes_ago=10, heartbeat_minutes_ago=5)
+        end_and_roll_up = call_sessions._end_and_roll_up
+        
+        def heartbeat_then_end(*args, **kwargs):
+            CallSession.objects.filter(pk=session.pk).update(last_heartbeat=timezone.now())
+            return end_and_roll_up(*args, **kwargs)
+        
+        with patch.object(call_sessions, '_end_and_roll_up', heartbeat_then_end):
+            ended, _ = end_stale_sessions(self.now - timedelta(minutes=2), batch_size=10)
+        
+        self.assertEqual(ended, 0)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'active')
+    
+    def test_rollups_are_updated_as_sessions_end(self):
+        """Room and user rollups accumulate ended sessions and match a full rebuild."""
+        first = self.create_session(started_minutes_ago=10)
+        second = self.create_session(started_minutes_ago=4)
+        add_participants([first.id, second.id], [self.user1.pk, self.user2.pk])
+        
+        end_sessions([first.id], ended_at=self.now, end_reason='user_hangup')
+        end_sessions([first.id, second.id], ended_at=self.now, end_reason='technical_issue')
+        
+        stats = RoomCallStats.objects.get(room=self.room)
+        self.assertEqual(stats.session_count, 2)
+        self.assertEqual(stats.successful_count, 1)
+        self.assertEqual(stats.total_duration, timedelta(minutes=14))
+        self.assertEqual(stats.average_duration, timedelta(minutes=7))
+        self.assertEqual(stats.end_reasons, {'user_hangup': 1, 'technical_issue': 1})
+        self.assertEqual(UserCallStats.objects.get(user=self.user2).session_count, 2)
+        
+        rebuild_rollups()
+        rebuilt = RoomCallStats.objects.get(room=self.room)
+        self.assertEqual(
+            (rebuilt.session_count, rebuilt.successful_count, rebuilt.total_duration, rebuilt.end_reasons),
+            (stats.session_count, stats.successful_count, stats.total_duration, stats.end_reasons)
+        )
+    
+    def test_rebuild_refuses_to_drop_deleted_history(self):
+        """Sessions deleted after they were rolled up keep the rebuild from lowering the totals."""
+        session = self.create_session(started_minutes_ago=5)
+        add_participants([session.id], [self.user1.pk])
+        end_sessions([session.id], ended_at=self.now, end_reason='normal')
+        session.delete()
+        
+        with self.assertRaises(ValueError):
+            rebuild_rollups()
+        self.assertEqual(RoomCallStats.objects.get(room=self.room).session_count, 1)
+        
+        rebuild_rollups(force=True)
+        self.assertFalse(RoomCallStats.objects.exists())
+    
+    def test_call_statistics_read_the_rollup(self):
+        """The statistics endpoint reports the rollup totals."""
+        session = self.create_session(started_minutes_ago=6)
+        add_participants([session.id], [self.user1.pk, self.user2.pk])
+        end_sessions([session.id], ended_at=self.now, end_reason='normal')
+        self.client.login(username='testuser1', password='testpass123')
+        
+        response = self.client.get(reverse('chats:get_call_statistics', kwargs={'room_id': self.room.room_id}))
+        
+        statistics = response.json()['statistics']
+        self.assertEqual(statistics['total_sessions'], 1)
+        self.assertEqual(statistics['success_rate'], 100)
+        self.assertEqual(statistics['total_duration_minutes'], 6)
+        self.assertEqual(statistics['end_reasons'], [{'end_reason': 'normal', 'count': 1}])
+        self.assertEqual(len(statistics['recent_sessions']), 1)
+    
+    def test_repair_participants_inserts_missing_pairs_in_pages(self):
+        """Missing match users are found by anti-join and added page by page."""
+        sessions = [self.create_session(started_minutes_ago=5) for _ in range(3)]
+        add_participants([sessions[0].id], [self.user1.pk, self.user2.pk])
+        add_participants([sessions[1].id], [self.user2.pk])
+        self.assertEqual(
+            missing_participants('user1').count() + missing_participants('user2').count(), 3
+        )
+        
+        with self.assertNumQueries(5):
+            added = repair_participants(batch_size=2)
+        
+        self.assertEqual(added, 3)
+        for session in sessions:
+            self.assertEqual(set(session.participants.values_list('pk', flat=True)), {self.user1.pk, self.user2.pk})
+        self.assertFalse(missing_participants('user1').exists() or missing_participants('user2').exists())
+
+
+class WebsocketBenchmarkTest(TransactionTestCase):
+    """Test the websocket consumer benchmark harness."""
+
+    def test_local_layer_round_trips_messages(self):
+        """The stand-in layer delivers decoded copies to every group member."""
+        layer = LocalChannelLayer(latency=0)
+
+        async def exchange():
+            await layer.group_add('room', 'a.inmemory!x')
+            await layer.group_add('room', 'b.inmemory!y')
+            message = {'type': 'new_message', 'content': 'hi', 'ids': [1, 2]}
+            await layer.group_send('room', message)
+            return message, await layer.receive('a.inmemory!x'), await layer.receive('b.inmemory!y')
+
+        message, first, second = asyncio.run(exchange())
+
+        self.assertEqual(first, message)
+        self.assertEqual(second, message)
+        self.assertIsNot(first, message)
+
+    def test_scenarios_deliver_every_tracked_frame(self):
+        """Every scenario delivers all tracked frames and reports latencies and query counts."""
+        results = run_benchmark(
+            'local', rooms=2, messages=2, typing_burst=1, candidates=5, notifications=3, latency=0
+        )
+
+        self.assertEqual(results['text_chat']['delivered'], 8)
+        self.assertEqual(results['ice_storm']['delivered'], 20)
+        self.assertEqual(results['notifications']['delivered'], 12)
+        for summary in results.values():
+            self.assertEqual(summary['lost'], 0)
+            self.assertIn('p99', summary['latency_ms'])
+        self.assertGreater(results['text_chat']['queries_per_message'], 0)
+        self.assertEqual(results['notifications']['queries'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='wsbench_').exists())
+
+    def test_compare_flags_regressions(self):
+        """Throughput drops and latency or query growth beyond the threshold are flagged."""
+        def results(rate, p95, queries):
+            scenario = {'messages_per_second': rate, 'latency_ms': {'p95': p95}, 'queries_per_message': queries}
+            return {'layers': {'memory': {'text_chat': scenario}}}
+
+        self.assertEqual(compare_benchmarks(results(100, 10, 4), results(90, 11, 4), threshold=20), [])
+        self.assertEqual(
+            [r['metric'] for r in compare_benchmarks(results(100, 10, 0), results(100, 10, 0.5), threshold=20)],
+            ['queries_per_message'],
+        )
+
+        regressions = compare_benchmarks(results(100, 10, 4), results(50, 20, 5), threshold=20)
+
+        self.assertEqual(
+            [(r['metric'], r['change']) for r in regressions],
+            [('messages_per_second', -50.0), ('latency_ms.p95', 100.0), ('queries_per_message', 25.0)],
+        )
+
+
 class ChatsIntegrationTest(TestCase):
     """Integration tests for chats functionality."""
     
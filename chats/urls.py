@@ -44,4 +44,7 @@ urlpatterns = [
     path('api/mark-read/<uuid:room_id>/', views.mark_messages_read, name='mark_messages_read'),
     path('api/unread-count/<uuid:room_id>/', views.get_unread_count, name='get_unread_count'),
     path('api/total-unread-count/', views.get_total_unread_count, name='get_total_unread_count'),
+    
+    # Monitoring
+    path('api/realtime-metrics/', views.realtime_metrics, name='realtime_metrics'),
 ] 
\ No newline at end of file
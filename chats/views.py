@@ -4,23 +4,31 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
-from django.db.models import Q, Count
+from django.db.models import Q
 from django.core.cache import cache
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from matches.models import Match
-from .models import VideoRoom, CallSession, CallInvitation, UserPresence, ChatRoom, ChatMessage
+from .models import VideoRoom, CallSession, CallInvitation, UserPresence, ChatRoom, ChatMessage, RoomCallStats
+from .expiry import invitation_expiry_wheel
+from .notifications import notification_dispatcher
+from .tokens import mint_websocket_token
+from .admission import connection_admission
+from .call_sessions import call_session_reaper, end_sessions, session_summaries as call_session_summaries
+from .executors import executor_metrics
+from .heartbeat import heartbeat_metrics
+from .outbound import send_queue_metrics
+from .ratelimit import rate_limit_metrics
 import uuid
 from django.db import transaction
 
 # Utility function for sending WebSocket notifications
 def send_user_notification(user_id, notification_type, data):
-    """Send a WebSocket notification to a specific user."""
-    channel_layer = get_channel_layer()
-    group_name = f'user_notifications_{user_id}'
+    """Queue a WebSocket notification for a specific user.
     
-    async_to_sync(channel_layer.group_send)(
-        group_name,
+    Returns immediately; the notification dispatcher delivers it from the
+    ASGI event loop.
+    """
+    notification_dispatcher.dispatch(
+        f'user_notifications_{user_id}',
         {
             'type': notification_type,
             **data
@@ -112,6 +120,9 @@ def send_call_invitation(request, match_id):
         message=request.POST.get('message', ''),
     )
     
+    # Expire the invitation at its deadline when running under the ASGI server
+    invitation_expiry_wheel.schedule_threadsafe(invitation)
+    
     # Invalidate pending invitations cache for the receiver
     cache.delete(f"pending_invitations_{partner.id}")
     
@@ -142,12 +153,21 @@ def respond_to_invitation(request, invitation_id):
         return JsonResponse({'error': 'Invitation expired or already responded'}, status=400)
     
     response = request.POST.get('response')  # 'accept' or 'decline'
+    if response not in ('accept', 'decline'):
+        return JsonResponse({'error': 'Invalid response'}, status=400)
+    
+    # Only a still-pending row can be answered, so a response racing the expiry
+    # wheel either wins or is refused; it never overwrites 'expired'
+    invitation.status = 'accepted' if response == 'accept' else 'declined'
+    invitation.responded_at = timezone.now()
+    answered = CallInvitation.objects.filter(pk=invitation.pk, status='pending').update(
+        status=invitation.status, responded_at=invitation.responded_at
+    )
+    if not answered:
+        return JsonResponse({'error': 'Invitation expired or already responded'}, status=400)
+    invitation_expiry_wheel.cancel_threadsafe(invitation.id)
     
     if response == 'accept':
-        invitation.status = 'accepted'
-        invitation.responded_at = timezone.now()
-        invitation.save()
-        
         # Invalidate pending invitations cache for the receiver
         cache.delete(f"pending_invitations_{request.user.id}")
         
@@ -164,11 +184,7 @@ def respond_to_invitation(request, invitation_id):
             'room_url': f'/chats/room/{invitation.room.room_id}/'
         })
     
-    elif response == 'decline':
-        invitation.status = 'declined'
-        invitation.responded_at = timezone.now()
-        invitation.save()
-        
+    else:
         # Invalidate pending invitations cache for the receiver
         cache.delete(f"pending_invitations_{request.user.id}")
         
@@ -182,9 +198,6 @@ def respond_to_invitation(request, invitation_id):
             'success': True,
             'action': 'declined'
         })
-    
-    else:
-        return JsonResponse({'error': 'Invalid response'}, status=400)
 
 @login_required
 def get_pending_invitations(request):
@@ -283,6 +296,7 @@ def video_room(request, room_id):
         'recent_messages': recent_messages,
         'call_history': call_history,
         'room_id_str': str(room.room_id),
+        'ws_token': mint_websocket_token(request.user, video_rooms=[room.room_id]),
     }
     
     return render(request, 'chats/video_room.html', context)
@@ -391,9 +405,16 @@ def cancel_invitation(request, invitation_id):
     if invitation.status != 'pending':
         return JsonResponse({'error': 'Can only cancel pending invitations'}, status=400)
     
+    # Same conditional update as respond_to_invitation: an invitation the
+    # expiry wheel already expired stays expired
     invitation.status = 'cancelled'
     invitation.responded_at = timezone.now()
-    invitation.save()
+    cancelled = CallInvitation.objects.filter(pk=invitation.pk, status='pending').update(
+        status=invitation.status, responded_at=invitation.responded_at
+    )
+    if not cancelled:
+        return JsonResponse({'error': 'Can only cancel pending invitations'}, status=400)
+    invitation_expiry_wheel.cancel_threadsafe(invitation.id)
     
     # Invalidate pending invitations cache for the receiver
     cache.delete(f"pending_invitations_{invitation.receiver.id}")
@@ -456,31 +477,19 @@ def end_call_with_reason(request, room_id):
         end_notes = request.POST.get('end_notes', '')
         connection_quality = request.POST.get('connection_quality', '')
         
-        # End active sessions
-        active_sessions = room.sessions.filter(status='active')
-        session_summaries = []
-        
-        for session in active_sessions:
-            session.status = 'ended'
-            session.ended_at = timezone.now()
-            session.ended_by = request.user
-            session.end_reason = end_reason
-            session.end_notes = end_notes
-            if connection_quality:
-                session.connection_quality = connection_quality
-            session.calculate_duration()
-            session.save()
-            
-            session_summaries.append({
-                'session_id': session.id,
-                'duration': session.get_duration_display(),
-                'was_successful': session.was_successful(),
-                'participants': [user.username for user in session.participants.all()]
-            })
+        # End active sessions in one UPDATE and summarise them in one query
+        session_ids = list(room.sessions.filter(status='active').values_list('id', flat=True))
+        fields = {'ended_by': request.user, 'end_reason': end_reason, 'end_notes': end_notes}
+        if connection_quality:
+            fields['connection_quality'] = connection_quality
+        end_sessions(session_ids, **fields)
+        session_summaries = [
+            {key: summary[key] for key in ('session_id', 'duration', 'was_successful', 'participants')}
+            for summary in call_session_summaries(session_ids)
+        ]
         
         # Update room status
-        room.is_active = False
-        room.save()
+        VideoRoom.objects.filter(pk=room.pk).update(is_active=False, last_activity=timezone.now())
         
         # Send WebSocket notification to other participants
         send_user_notification(
@@ -513,34 +522,17 @@ def get_call_statistics(request, room_id):
         if not room.can_user_access(request.user):
             return JsonResponse({'error': 'Access denied'}, status=403)
         
-        # Get session statistics
-        sessions = room.sessions.filter(status='ended')
-        total_sessions = sessions.count()
-        successful_sessions = sessions.filter(
-            end_reason__in=['normal', 'user_hangup', 'partner_hangup']
-        ).count()
-        
-        # Calculate total call time
-        total_duration = sum(
-            [session.duration.total_seconds() for session in sessions if session.duration],
-            0
-        )
-        
-        # Average session duration
-        avg_duration = total_duration / total_sessions if total_sessions > 0 else 0
-        
-        # Most common end reasons
-        end_reasons = sessions.values('end_reason').annotate(
-            count=Count('end_reason')
-        ).order_by('-count')
+        # Totals come from the room's rollup row
+        stats = RoomCallStats.objects.filter(room=room).first() or RoomCallStats(room=room)
+        recent_sessions = room.sessions.filter(status='ended').select_related('ended_by')[:5]
         
         statistics = {
-            'total_sessions': total_sessions,
-            'successful_sessions': successful_sessions,
-            'success_rate': (successful_sessions / total_sessions * 100) if total_sessions > 0 else 0,
-            'total_duration_minutes': total_duration / 60,
-            'average_duration_minutes': avg_duration / 60,
-            'end_reasons': list(end_reasons),
+            'total_sessions': stats.session_count,
+            'successful_sessions': stats.successful_count,
+            'success_rate': stats.success_rate,
+            'total_duration_minutes': stats.total_duration.total_seconds() / 60,
+            'average_duration_minutes': stats.average_duration.total_seconds() / 60,
+            'end_reasons': stats.end_reason_counts(),
             'recent_sessions': [
                 {
                     'id': session.id,
@@ -550,7 +542,7 @@ def get_call_statistics(request, room_id):
                     'was_successful': session.was_successful(),
                     'ended_by': session.ended_by.username if session.ended_by else 'Unknown'
                 }
-                for session in sessions[:5]
+                for session in recent_sessions
             ]
         }
         
@@ -590,15 +582,11 @@ def call_summary(request, room_id, session_id):
         user_teaches = room.match.get_user_teaches(request.user)
         user_learns = room.match.get_user_learns(request.user)
         
-        # Get session statistics
-        total_sessions = room.sessions.filter(status='ended').count()
-        successful_sessions = room.sessions.filter(
-            status='ended',
-            end_reason__in=['normal', 'user_hangup', 'partner_hangup']
-        ).count()
-        
-        # Calculate success rate
-        success_rate = (successful_sessions / total_sessions * 100) if total_sessions > 0 else 0
+        # Get session statistics from the room's rollup row
+        stats = RoomCallStats.objects.filter(room=room).first() or RoomCallStats(room=room)
+        total_sessions = stats.session_count
+        successful_sessions = stats.successful_count
+        success_rate = stats.success_rate
         
         # Get recent call history (last 5 calls excluding current)
         recent_calls = room.sessions.filter(status='ended').exclude(id=session.id)[:5]
@@ -722,7 +710,7 @@ def text_chat(request, room_id):
         
         # Mark messages from partner as read
         unread_messages = room.messages.filter(sender=partner, is_read=False)
-        unread_messages.update(is_read=True)
+        unread_messages.update(is_read=True, updated_at=timezone.now())
         
         # Update room activity
         room.update_activity()
@@ -735,6 +723,7 @@ def text_chat(request, room_id):
             'room_id': str(room.room_id),
             'user_teaches': match.get_user_teaches(request.user),
             'user_learns': match.get_user_learns(request.user),
+            'ws_token': mint_websocket_token(request.user, text_rooms=[room.room_id]),
         }
         
         return render(request, 'chats/text_chat.html', context)
@@ -920,7 +909,7 @@ def mark_messages_read(request, room_id):
         
         # Mark all unread messages from partner as read
         partner = room.get_partner(request.user)
-        unread_count = room.messages.filter(sender=partner, is_read=False).update(is_read=True)
+        unread_count = room.messages.filter(sender=partner, is_read=False).update(is_read=True, updated_at=timezone.now())
         
         return JsonResponse({
             'success': True,
@@ -1044,3 +1033,24 @@ def get_total_unread_count(request):
         'success': True,
         'unread_count': total_unread
     })
+
+@login_required
+def realtime_metrics(request):
+    """Staff-only API endpoint exposing in-process realtime metrics."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'notifications': notification_dispatcher.metrics(),
+        'admission': connection_admission.metrics(),
+        'send_queues': send_queue_metrics(),
+        'rate_limits': rate_limit_metrics(),
+        'executors': executor_metrics(),
+        'heartbeats': heartbeat_metrics(),
+        'call_sessions': call_session_reaper.metrics(),
+        'invitation_expiry': {
+            'running': invitation_expiry_wheel.is_running,
+            'scheduled': len(invitation_expiry_wheel),
+        },
+    })
@@ -10,16 +10,18 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 import chats.routing
+from chats.middleware import (
+    AdmissionControlMiddleware, BackgroundTasksMiddleware, RequestLimitMiddleware, TokenAuthMiddleware,
+)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+application = BackgroundTasksMiddleware(ProtocolTypeRouter({
+    "http": RequestLimitMiddleware(get_asgi_application()),
+    "websocket": AdmissionControlMiddleware(TokenAuthMiddleware(
         URLRouter(
             chats.routing.websocket_urlpatterns
         )
-    ),
-})
+    )),
+}))
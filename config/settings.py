@@ -68,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'chats.context_processors.websocket_token',
             ],
         },
     },
@@ -83,6 +84,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Writers on request and websocket pool threads take the write lock up
+        # front and wait for it, instead of failing when a read upgrades
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # A file rather than shared-cache memory, where consumer writes on
+        # different pool threads fail on table locks instead of waiting
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -162,3 +169,90 @@ CHANNEL_LAYERS = {
 #         },
 #     },
 # }
+
+# Call invitation expiry timer wheel (runs inside the ASGI server)
+INVITATION_EXPIRY_TICK_SECONDS = 1.0
+INVITATION_EXPIRY_WHEEL_SLOTS = 512
+INVITATION_EXPIRY_BATCH_SIZE = 500
+
+# Notification dispatcher for sync views (bounded queue drained by the ASGI loop)
+NOTIFICATION_QUEUE_SIZE = 10000
+NOTIFICATION_BATCH_SIZE = 100
+
+# Maximum streams (notifications, text chats, video rooms) on one multiplexed websocket
+MULTIPLEX_MAX_STREAMS = 8
+
+# Signed websocket handshake tokens (seconds before the session fallback is used). Tokens
+# are not checked against the database, so this bounds how long one outlives a logout
+WEBSOCKET_TOKEN_MAX_AGE = 300
+
+# Websocket admission control per node (token bucket, close code 4429 with retry hint)
+WEBSOCKET_ADMISSION_RATE = 50  # Connections admitted per second
+WEBSOCKET_ADMISSION_BURST = 200
+WEBSOCKET_ADMISSION_MAX_RETRY = 30  # Seconds
+
+# Structured websocket logging: JSON lines written by a background thread.
+# Set the chats.websocket level to DEBUG to see signalling and typing events.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {'()': 'chats.log.StructuredFormatter'},
+    },
+    'handlers': {
+        'chats_queue': {
+            'class': 'chats.log.NonBlockingQueueHandler',
+            'formatter': 'structured',
+            'queue_size': 10000,
+        },
+    },
+    'loggers': {
+        'chats': {'handlers': ['chats_queue'], 'level': 'INFO', 'propagate': False},
+        'chats.websocket': {'level': 'INFO'},
+    },
+}
+WEBSOCKET_LOG_SAMPLE_LIMIT = 20  # Records per second for high-frequency event types
+WEBSOCKET_LOG_MESSAGE_BODIES = False  # Never log chat message content unless debugging
+WEBSOCKET_LOG_LEVELS = {}  # Per-event overrides, e.g. {'ice_candidate': 'INFO'}
+
+# Per-connection outbound queues: writers pause while a window of frames is unacknowledged;
+# typing/status events coalesce and readers that stay behind are closed with 4408
+WEBSOCKET_SEND_QUEUE_SIZE = 256  # Frames
+WEBSOCKET_SEND_WINDOW = 64  # Frames written but not yet acknowledged by the client
+WEBSOCKET_SLOW_CONSUMER_GRACE = 5.0  # Seconds over the limit before eviction
+
+# Websocket message rate limits: per-type (rate/s, burst) overrides of
+# chats.ratelimit.DEFAULT_MESSAGE_RATE_LIMITS; per-user limits are this many times larger
+WEBSOCKET_MESSAGE_RATE_LIMITS = {}
+WEBSOCKET_USER_RATE_MULTIPLIER = 3
+
+# Named pools for sync work under ASGI: websocket DB helpers, HTTP requests in flight, heavy batch work
+DB_EXECUTOR_SIZES = {
+    'websocket': 8,
+    'http': 16,
+    'batch': 2,
+}
+# Seconds a request waits for a busy batch pool to start its work before answering 503
+BATCH_START_TIMEOUT = 2.0
+
+# Server heartbeats: connections silent for MISSED_LIMIT intervals are closed with 4001 and cleaned up
+WEBSOCKET_HEARTBEAT_INTERVAL = 25.0  # Seconds
+WEBSOCKET_HEARTBEAT_MISSED_LIMIT = 2
+
+# Call sessions: connected video consumers bump last_heartbeat; open sessions without one
+# for CALL_SESSION_STALE_AFTER seconds are ended with end_reason='timeout'
+CALL_SESSION_HEARTBEAT_INTERVAL = 30.0  # Seconds
+CALL_SESSION_STALE_AFTER = 120.0  # Seconds
+CALL_SESSION_REAP_INTERVAL = 60.0  # Seconds
+CALL_SESSION_REAP_BATCH_SIZE = 500
+
+# WebRTC telemetry: getStats samples are folded into buckets of this many seconds in memory
+# and written once per participant connection when it leaves the call
+CALL_TELEMETRY_BUCKET_SECONDS = 10
+CALL_TELEMETRY_MAX_BUCKETS = 1440  # Four hours at 10s buckets
+
+# Retention (main.retention): expired rows are deleted in pk ranges of this many rows with a pause
+# between ranges; RETENTION_DAYS overrides a policy's default age, e.g. {'room_messages': 30}
+RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_SLEEP = 0.1  # Seconds
+RETENTION_DAYS = {}
@@ -23,6 +23,9 @@ DATABASES = {
         config('DATABASE_URL', default='sqlite:///db.sqlite3')
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Concurrent writers wait for the write lock instead of failing on upgrade
+    DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
 
 # Redis configuration for Django Channels
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
@@ -103,6 +106,7 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'structured': {'()': 'chats.log.StructuredFormatter'},
     },
     'handlers': {
         'file': {
@@ -116,6 +120,12 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        # Websocket records are formatted as JSON and written off the event loop
+        'chats_queue': {
+            'class': 'chats.log.NonBlockingQueueHandler',
+            'formatter': 'structured',
+            'queue_size': 10000,
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
@@ -132,6 +142,8 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'chats': {'handlers': ['chats_queue'], 'level': 'INFO', 'propagate': False},
+        'chats.websocket': {'level': 'INFO'},
     },
 }
 
@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import PlatformSnapshot
+
+
+@admin.register(PlatformSnapshot)
+class PlatformSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['date', 'taken_at']
+    readonly_fields = ['date', 'taken_at', 'metrics']
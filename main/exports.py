@@ -0,0 +1,143 @@
+"""
+Streaming analytics exports.
+
+Each export reads one table with ``values_list(...).iterator(chunk_size)``,
+which uses a server-side cursor on PostgreSQL and chunked fetches elsewhere,
+so no queryset is ever materialized. Rows are encoded as CSV or JSON Lines
+and, optionally, compressed incrementally with a gzip ``compressobj``; the
+same byte generator feeds the ``export_analytics`` command and the staff
+download endpoint, so both run in constant memory.
+
+Every export has a watermark column. Passing the previous run's ``until`` as
+``since`` exports exactly the rows that arrived in between, which is how the
+daily deltas are produced. Watermarks are stamped when a row is written or
+finalized, never backdated: call sessions use ``finalized_at`` (the reaper
+backdates ``ended_at`` to the last heartbeat) so a session is exported once,
+after it has finished, while chat messages and match requests use
+``updated_at`` so a row is exported again after it is read, edited, answered
+or cancelled.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from django.db.models.functions import Length
+from django.utils import timezone
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+_GZIP_WBITS = 16 + zlib.MAX_WBITS  # gzip header and trailer
+
+
+def _call_sessions():
+    from chats.models import CallSession
+
+    return CallSession.objects.filter(finalized_at__isnull=False), 'finalized_at', [
+        'id', 'room_id', 'room__match_id', 'status', 'started_at', 'ended_at', 'finalized_at', 'duration',
+        'end_reason', 'ended_by_id', 'video_enabled', 'audio_enabled', 'connection_quality',
+        'max_participants', 'disconnection_count', 'average_video_quality',
+        'network_issues_count', 'total_data_transferred',
+    ]
+
+
+def _chat_messages():
+    from chats.models import ChatMessage
+
+    # Message bodies stay in the database; analysts get their length
+    return ChatMessage.objects.annotate(content_length=Length('content')), 'updated_at', [
+        'id', 'room_id', 'room__match_id', 'sender_id', 'message_type', 'content_length',
+        'timestamp', 'is_read', 'edited_at', 'reply_to_id', 'updated_at',
+    ]
+
+
+def _match_requests():
+    from matches.models import MatchRequest
+
+    return MatchRequest.objects.all(), 'updated_at', [
+        'id', 'sender_id', 'receiver_id', 'sender_teaches_id', 'sender_learns_id',
+        'status', 'created_at', 'responded_at', 'updated_at',
+    ]
+
+
+EXPORTS = {
+    'call_sessions': _call_sessions,
+    'chat_messages': _chat_messages,
+    'match_requests': _match_requests,
+}
+
+
+def _plain(value):
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_rows(name, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return the column names and a lazy iterator over the rows of one export."""
+    queryset, watermark, columns = EXPORTS[name]()
+    if since:
+        queryset = queryset.filter(**{f'{watermark}__gt': since})
+    if until:
+        queryset = queryset.filter(**{f'{watermark}__lte': until})
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    return columns, rows
+
+
+def _encode_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _encode_jsonl(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_plain, row)))).encode() + b'\n'
+
+
+def _gzip(chunks, flush_bytes):
+    compressor = zlib.compressobj(wbits=_GZIP_WBITS)
+    pending = []
+    size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        if size >= flush_bytes:
+            yield compressor.compress(b''.join(pending))
+            pending, size = [], 0
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
+
+
+def stream_export(name, fmt='csv', since=None, until=None, compress=False,
+                  chunk_size=DEFAULT_CHUNK_SIZE, flush_bytes=64 * 1024):
+    """Yield the encoded (and optionally gzipped) bytes of one export.
+
+    ``until`` defaults to now so rows written while the export runs are left
+    for the next delta instead of being half-included.
+    """
+    if name not in EXPORTS:
+        raise ValueError(f'Unknown export {name!r}; choose from {", ".join(EXPORTS)}')
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format {fmt!r}; choose from {", ".join(FORMATS)}')
+
+    columns, rows = export_rows(name, since, until or timezone.now(), chunk_size)
+    chunks = _encode_csv(columns, rows) if fmt == 'csv' else _encode_jsonl(columns, rows)
+    if compress:
+        chunks = _gzip(chunks, flush_bytes)
+    return (chunk for chunk in chunks if chunk)
+
+
+def export_filename(name, fmt, compress=False, until=None):
+    stamp = timezone.localtime(until or timezone.now()).strftime('%Y%m%dT%H%M%S')
+    return f"{name}-{stamp}.{fmt}{'.gz' if compress else ''}"
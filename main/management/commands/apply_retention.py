@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.retention import POLICIES, purge
+
+
+class Command(BaseCommand):
+    help = 'Delete rows past their retention age in throttled primary-key ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'policies',
+            nargs='*',
+            metavar='policy',
+            help=f"Policies to apply (default: all of {', '.join(POLICIES)})"
+        )
+        parser.add_argument('--days', type=int, help='Override the retention age in days')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction (default: RETENTION_BATCH_SIZE)')
+        parser.add_argument('--sleep', type=float, help='Seconds to pause between batches (default: RETENTION_BATCH_SLEEP)')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be deleted without actually deleting'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['policies']) - set(POLICIES)
+        if unknown:
+            raise CommandError(f"Unknown policies: {', '.join(sorted(unknown))}")
+        policies = [POLICIES[name] for name in options['policies'] or POLICIES]
+
+        for policy in policies:
+            days = policy.days if options['days'] is None else options['days']
+            if options['dry_run']:
+                expired = policy.expired(timezone.now() - timezone.timedelta(days=days))
+                by_status = policy.status_counts(expired)
+                count = sum(by_status.values()) if by_status else expired.count()
+                self.stdout.write(self.style.WARNING(
+                    f"DRY RUN - {policy.name}: would delete {count} rows older than {days} days"
+                    + (f" {by_status}" if by_status else '')
+                ))
+                continue
+
+            self.stdout.write(f"{policy.name}: deleting rows older than {days} days...")
+            started = time.monotonic()
+            result = purge(
+                policy, days=days, batch_size=options['batch_size'], sleep=options['sleep'],
+                progress=self.report_progress,
+            )
+            cascaded = ', '.join(f'{count} {label}' for label, count in sorted(result['cascaded'].items()))
+            self.stdout.write(self.style.SUCCESS(
+                f"{policy.name}: deleted {result['deleted']} rows in {result['batches']} batches "
+                f"({time.monotonic() - started:.1f}s)" + (f"; cascaded {cascaded}" if cascaded else '')
+            ))
+
+            by_status = policy.status_counts()
+            if by_status:
+                self.stdout.write(f"  Remaining by status: {by_status}")
+
+    def report_progress(self, policy, result):
+        if result['batches'] and result['batches'] % 10 == 0:
+            self.stdout.write(f"  {policy.name}: {result['deleted']} rows deleted after {result['batches']} batches")
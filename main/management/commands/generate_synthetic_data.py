@@ -0,0 +1,106 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main.synthetic import (
+    DEFAULT_LEARN_COUNTS, DEFAULT_TEACH_COUNTS, SyntheticDataGenerator, parse_distribution,
+)
+
+User = get_user_model()
+
+
+def format_distribution(distribution):
+    return ','.join(f'{count}:{weight}' for count, weight in distribution.items())
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic synthetic dataset with bulk inserts for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Number of users (default: 10000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--prefix', default='synth', help='Username prefix (default: synth)')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of language popularity; 0 is uniform (default: 1.0)'
+        )
+        parser.add_argument(
+            '--teach-languages', default=format_distribution(DEFAULT_TEACH_COUNTS),
+            help='Distribution of teaching languages per user as count:weight pairs '
+                 f'(default: {format_distribution(DEFAULT_TEACH_COUNTS)})'
+        )
+        parser.add_argument(
+            '--learn-languages', default=format_distribution(DEFAULT_LEARN_COUNTS),
+            help='Distribution of learning languages per user as count:weight pairs '
+                 f'(default: {format_distribution(DEFAULT_LEARN_COUNTS)})'
+        )
+        parser.add_argument('--matches-per-user', type=float, default=0.3, help='Average matches per user (default: 0.3)')
+        parser.add_argument('--messages-per-match', type=float, default=20, help='Mean chat messages per match (default: 20)')
+        parser.add_argument('--calls-per-match', type=float, default=3, help='Mean call sessions per match (default: 3)')
+        parser.add_argument('--days', type=int, default=90, help='Spread timestamps over this many days (default: 90)')
+        parser.add_argument(
+            '--now',
+            help='ISO timestamp the generated history ends at; the same --seed and --now '
+                 'reproduce the same dataset (default: the current time)'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert (default: 5000)')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete users with this prefix (and everything that cascades from them) first'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            teach_counts = parse_distribution(options['teach_languages'])
+            learn_counts = parse_distribution(options['learn_languages'])
+        except ValueError as e:
+            raise CommandError(f'Invalid distribution: {e}')
+
+        now = timezone.now()
+        if options['now']:
+            now = parse_datetime(options['now'])
+            if now is None:
+                raise CommandError(f"Invalid --now: {options['now']}")
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now)
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=f"{options['prefix']}_").delete()
+            self.stdout.write(self.style.WARNING(f'Deleted {deleted} rows from a previous run'))
+
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users with prefix {options['prefix']!r} already exist; use --clear or another --prefix")
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"🚀 Generating {options['users']} users (seed {options['seed']}, now {now.isoformat()})..."
+        ))
+        started = time.perf_counter()
+        generator = SyntheticDataGenerator(
+            users=options['users'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            skew=options['skew'],
+            teach_counts=teach_counts,
+            learn_counts=learn_counts,
+            matches_per_user=options['matches_per_user'],
+            messages_per_match=options['messages_per_match'],
+            calls_per_match=options['calls_per_match'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            now=now,
+            log=lambda message: self.stdout.write(f'  {message}'),
+        )
+        try:
+            counts = generator.run()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write('')
+        for label, count in counts.items():
+            self.stdout.write(f'  {label}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 Wrote {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.metrics import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write today's platform metrics snapshot (run daily from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recompute every total from scratch instead of building on the previous snapshot'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the snapshot as JSON'
+        )
+
+    def handle(self, *args, **options):
+        snapshot = take_snapshot(full=options['full'])
+        if options['json']:
+            self.stdout.write(json.dumps({'date': snapshot.date.isoformat(), **snapshot.metrics}, indent=2))
+            return
+        metrics = snapshot.metrics
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot for {snapshot.date}: {metrics['users']['total']} users, "
+            f"{metrics['calls']['sessions']} calls ({metrics['calls']['minutes']:.0f} minutes)"
+        ))
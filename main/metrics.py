@@ -0,0 +1,170 @@
+"""
+Platform-wide metrics for the daily snapshot and the stats commands.
+
+Every breakdown is one GROUP BY (or conditional aggregate) pass per table, so
+collecting a snapshot costs the same handful of queries however large the
+tables get. Status breakdowns are recomputed each time because rows move
+between statuses; append-only totals (call sessions and minutes) carry
+forward from the previous snapshot and only scan the sessions marked ended
+since it was taken.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import PlatformSnapshot
+
+LANGUAGE_REGIONS = {
+    'European': ['en', 'es', 'fr', 'de', 'it', 'pt', 'ru', 'nl', 'sv', 'no', 'da', 'fi', 'pl', 'cs', 'hu', 'el', 'ro', 'bg', 'hr', 'sr', 'uk', 'sk', 'sl', 'et', 'lv', 'lt', 'ga', 'cy', 'is', 'eu', 'ca', 'gl', 'mt', 'lb', 'sq', 'mk', 'bs', 'cnr'],
+    'Asian': ['zh', 'ja', 'ko', 'hi', 'th', 'vi', 'id', 'ms', 'fil', 'bn', 'ur', 'pa', 'ta', 'te', 'mr', 'gu', 'kn', 'ml', 'si', 'my', 'km', 'lo', 'mn', 'ne'],
+    'Middle Eastern': ['ar', 'he', 'fa', 'tr', 'ku', 'hy', 'ka', 'az'],
+    'African': ['sw', 'am', 'yo', 'ig', 'ha', 'zu', 'xh', 'af', 'so'],
+    'Americas': ['pt-br', 'qu', 'gn', 'nah', 'fr-ca'],
+    'Pacific': ['mi', 'haw', 'sm', 'to', 'fj'],
+    'Central Asian': ['kk', 'uz', 'ky', 'tg', 'tk'],
+    'Sign/Constructed': ['asl', 'bsl', 'eo', 'la'],
+}
+
+TEACHING_TYPES = ('native', 'fluent')
+
+
+def _counts_by(queryset, field):
+    return dict(queryset.order_by().values_list(field).annotate(count=Count('pk')))
+
+
+def _user_metrics(since):
+    User = get_user_model()
+    return User.objects.aggregate(
+        total=Count('pk'),
+        regular=Count('pk', filter=Q(is_superuser=False, is_staff=False)),
+        admin=Count('pk', filter=Q(is_superuser=True)),
+        new=Count('pk', filter=Q(date_joined__gt=since)) if since else Count('pk'),
+    )
+
+
+def _language_metrics():
+    from users.models import Language, UserLanguage
+
+    languages = {
+        language_id: {'code': code, 'name': name, 'flag': flag, 'native': 0, 'fluent': 0, 'learning': 0, 'total': 0}
+        for language_id, code, name, flag in Language.objects.order_by('name').values_list('id', 'code', 'name', 'flag_emoji')
+    }
+    rows = UserLanguage.objects.order_by().values_list('language_id', 'language_type').annotate(count=Count('pk'))
+    for language_id, language_type, count in rows:
+        entry = languages[language_id]
+        entry[language_type] = entry.get(language_type, 0) + count
+        entry['total'] += count
+
+    by_type = {}
+    for entry in languages.values():
+        for language_type in ('native', 'fluent', 'learning'):
+            if entry[language_type]:
+                by_type[language_type] = by_type.get(language_type, 0) + entry[language_type]
+
+    codes = {entry['code'] for entry in languages.values()}
+    return {
+        'languages': {
+            'total': len(languages),
+            'unused': sum(1 for entry in languages.values() if not entry['total']),
+            'teaching': sum(1 for entry in languages.values() if any(entry[t] for t in TEACHING_TYPES)),
+            'learning': sum(1 for entry in languages.values() if entry['learning']),
+            'by_region': {
+                region: len(codes.intersection(region_codes))
+                for region, region_codes in LANGUAGE_REGIONS.items()
+            },
+        },
+        'user_languages': {
+            'total': sum(by_type.values()),
+            'by_type': by_type,
+            'by_proficiency': _counts_by(UserLanguage.objects.all(), 'proficiency'),
+            'by_language': sorted(languages.values(), key=lambda entry: entry['name']),
+        },
+    }
+
+
+def _status_and_new(queryset, since):
+    """Counts by status plus rows created since ``since``, in one GROUP BY."""
+    new = Count('pk', filter=Q(created_at__gt=since)) if since else Count('pk')
+    rows = queryset.order_by().values_list('status').annotate(count=Count('pk'), new=new)
+    by_status = {}
+    created = 0
+    for status, count, new_count in rows:
+        by_status[status] = count
+        created += new_count
+    return {'by_status': by_status, 'new': created}
+
+
+def _match_metrics(since):
+    from matches.models import Match, MatchRequest, PotentialMatch
+
+    return {
+        'matches': {
+            'potential': PotentialMatch.objects.count(),
+            **_status_and_new(Match.objects.all(), since),
+        },
+        'match_requests': _status_and_new(MatchRequest.objects.all(), since),
+    }
+
+
+def _call_metrics(previous, since, now):
+    from chats.models import CallInvitation, CallSession
+
+    # Windowed on when sessions were marked ended; the reaper backdates ended_at
+    ended = CallSession.objects.filter(status='ended', finalized_at__lte=now)
+    if since:
+        ended = ended.filter(finalized_at__gt=since)
+    window = ended.aggregate(sessions=Count('pk'), duration=Sum('duration'))
+    new_sessions = window['sessions']
+    new_minutes = window['duration'].total_seconds() / 60 if window['duration'] else 0.0
+
+    carried = previous['calls'] if previous else {'sessions': 0, 'minutes': 0.0}
+    return {
+        'invitations': {
+            'by_status': _counts_by(CallInvitation.objects.all(), 'status'),
+        },
+        'calls': {
+            'sessions': carried['sessions'] + new_sessions,
+            'minutes': round(carried['minutes'] + new_minutes, 2),
+            'new_sessions': new_sessions,
+            'new_minutes': round(new_minutes, 2),
+        },
+    }
+
+
+def collect_metrics(previous=None, now=None):
+    """Aggregate platform metrics.
+
+    With a ``previous`` snapshot, append-only totals are carried forward and
+    only activity since ``previous.taken_at`` is scanned; ``new`` counts are
+    relative to it. Without one everything is computed from scratch.
+    """
+    now = now or timezone.now()
+    since = previous.taken_at if previous else None
+    previous_metrics = previous.metrics if previous else None
+
+    metrics = {
+        'users': _user_metrics(since),
+        **_language_metrics(),
+        **_match_metrics(since),
+        **_call_metrics(previous_metrics, since, now),
+    }
+    metrics['since'] = since.isoformat() if since else None
+    return metrics
+
+
+def take_snapshot(full=False, now=None):
+    """Write today's snapshot, building on the latest earlier one unless ``full``."""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    previous = None
+    if not full:
+        previous = PlatformSnapshot.objects.filter(date__lt=today).order_by('-date').first()
+    snapshot, _ = PlatformSnapshot.objects.update_or_create(
+        date=today,
+        defaults={'taken_at': now, 'metrics': collect_metrics(previous, now)},
+    )
+    return snapshot
+
+
+def latest_snapshot():
+    return PlatformSnapshot.objects.order_by('-date').first()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('taken_at', models.DateTimeField()),
+                ('metrics', models.JSONField(default=dict, help_text='See main.metrics.collect_metrics for the layout')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'get_latest_by': 'date',
+            },
+        ),
+    ]
@@ -1,3 +1,15 @@
 from django.db import models
 
-# Create your models here.
+
+class PlatformSnapshot(models.Model):
+    """Platform-wide metrics for one day, written by ``take_platform_snapshot``."""
+    date = models.DateField(unique=True)
+    taken_at = models.DateTimeField()
+    metrics = models.JSONField(default=dict, help_text='See main.metrics.collect_metrics for the layout')
+    
+    class Meta:
+        ordering = ['-date']
+        get_latest_by = 'date'
+    
+    def __str__(self):
+        return f"Platform snapshot for {self.date}"
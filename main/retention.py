@@ -0,0 +1,111 @@
+"""
+Chunked, throttled retention for old rows.
+
+Each ``RetentionPolicy`` names a model, the timestamp column that ages its
+rows, a default age in days and an optional filter for rows that must be
+kept. ``purge`` deletes the expired rows in primary-key ranges of
+``RETENTION_BATCH_SIZE`` rows: every range is its own short transaction (its
+cascades included) and the loop sleeps ``RETENTION_BATCH_SLEEP`` seconds
+between ranges so replication and other writers keep up. The upper bound is
+fixed when the run starts, so rows that expire while it runs wait for the
+next one. Counts by status come from one GROUP BY.
+
+Ages can be overridden per policy with the ``RETENTION_DAYS`` setting.
+"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .metrics import _counts_by
+
+
+class RetentionPolicy:
+    def __init__(self, name, model, date_field, days, keep=None, status_field=None):
+        self.name = name
+        self.model_label = model
+        self.date_field = date_field
+        self.default_days = days
+        self.keep = keep
+        self.status_field = status_field
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def days(self):
+        return getattr(settings, 'RETENTION_DAYS', {}).get(self.name, self.default_days)
+
+    def expired(self, cutoff):
+        queryset = self.model.objects.filter(**{f'{self.date_field}__lt': cutoff})
+        if self.keep is not None:
+            queryset = queryset.exclude(self.keep)
+        return queryset.order_by()
+
+    def status_counts(self, queryset=None):
+        """Rows by status in one GROUP BY (an empty dict when the model has no status)."""
+        if not self.status_field:
+            return {}
+        return _counts_by(self.model.objects.all() if queryset is None else queryset, self.status_field)
+
+
+POLICIES = {
+    policy.name: policy for policy in [
+        # Pending invitations are expired by the cleanup command, never deleted
+        RetentionPolicy('call_invitations', 'chats.CallInvitation', 'created_at', 7,
+                        keep=Q(status='pending'), status_field='status'),
+        RetentionPolicy('room_messages', 'chats.RoomMessage', 'timestamp', 90),
+        RetentionPolicy('typing_statuses', 'chats.TypingStatus', 'last_typed', 1),
+        RetentionPolicy('potential_matches', 'matches.PotentialMatch', 'created_at', 30),
+        # Ended sessions are already folded into RoomCallStats/UserCallStats, which keep
+        # their totals; rebuild_call_stats refuses to recompute them without these rows
+        RetentionPolicy('call_sessions', 'chats.CallSession', 'ended_at', 365,
+                        keep=~Q(status__in=['ended', 'failed']), status_field='status'),
+    ]
+}
+
+
+def purge(policy, days=None, batch_size=None, sleep=None, progress=None, now=None):
+    """Delete a policy's expired rows in primary-key ranges.
+
+    ``progress`` is called after every range with the running totals. Returns
+    ``{'deleted': rows of the model, 'cascaded': {label: rows}, 'batches': n}``.
+    """
+    batch_size = batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 1000)
+    sleep = getattr(settings, 'RETENTION_BATCH_SLEEP', 0.1) if sleep is None else sleep
+    cutoff = (now or timezone.now()) - timezone.timedelta(days=policy.days if days is None else days)
+
+    expired = policy.expired(cutoff)
+    upper = expired.aggregate(upper=Max('pk'))['upper']
+    result = {'deleted': 0, 'cascaded': {}, 'batches': 0}
+    if upper is None:
+        return result
+
+    lower = None
+    while True:
+        window = expired.filter(pk__lte=upper)
+        if lower is not None:
+            window = window.filter(pk__gt=lower)
+        # The pk of the batch_size-th expired row closes this range
+        boundary = next(iter(window.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size]), None)
+        chunk = window if boundary is None else window.filter(pk__lte=boundary)
+
+        total, per_model = chunk.delete()
+        if total:
+            result['batches'] += 1
+        for label, count in per_model.items():
+            if label == policy.model._meta.label:
+                result['deleted'] += count
+            else:
+                result['cascaded'][label] = result['cascaded'].get(label, 0) + count
+        if progress:
+            progress(policy, result)
+
+        if boundary is None or boundary == upper:
+            return result
+        lower = boundary
+        if sleep:
+            time.sleep(sleep)
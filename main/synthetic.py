@@ -0,0 +1,369 @@
+"""
+Deterministic, high-volume synthetic data for benchmarking.
+
+``SyntheticDataGenerator`` builds users, their languages, matches, chat rooms
+and messages, video rooms and call sessions entirely with ``bulk_create`` in
+batches of ``batch_size`` rows. Every random choice comes from one seeded
+``random.Random`` (room UUIDs included), so the same seed and ``now`` give the
+same dataset. The password is hashed once and the hash reused for every user.
+
+Language popularity follows a Zipf-like skew: the i-th language (in the order
+of ``DEFAULT_LANGUAGES``, then any others by id) has weight ``1 / (i + 1) **
+skew``. How many languages a user teaches and learns is drawn from the
+``teach_counts`` / ``learn_counts`` distributions ({count: weight}). Matches
+pair users whose languages complement each other, as the matching engine
+would.
+
+``bulk_create`` skips signals, so the language supply/demand matrix and the
+call stats rollups of the generated rooms and users are rebuilt once at the
+end.
+"""
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+DEFAULT_LANGUAGES = [
+    ('English', 'en', '🇺🇸'),
+    ('Spanish', 'es', '🇪🇸'),
+    ('French', 'fr', '🇫🇷'),
+    ('German', 'de', '🇩🇪'),
+    ('Japanese', 'ja', '🇯🇵'),
+    ('Korean', 'ko', '🇰🇷'),
+    ('Chinese', 'zh', '🇨🇳'),
+    ('Italian', 'it', '🇮🇹'),
+    ('Portuguese', 'pt', '🇵🇹'),
+    ('Russian', 'ru', '🇷🇺'),
+    ('Arabic', 'ar', '🇸🇦'),
+    ('Hindi', 'hi', '🇮🇳'),
+    ('Dutch', 'nl', '🇳🇱'),
+    ('Swedish', 'sv', '🇸🇪'),
+    ('Polish', 'pl', '🇵🇱'),
+]
+
+DEFAULT_TEACH_COUNTS = {1: 0.75, 2: 0.25}
+DEFAULT_LEARN_COUNTS = {1: 0.5, 2: 0.35, 3: 0.15}
+
+FIRST_NAMES = ['Alex', 'Maria', 'John', 'Anna', 'Mike', 'Sara', 'David', 'Emma', 'James', 'Lisa',
+               'Carlos', 'Sophie', 'Ahmed', 'Nina', 'Yuki', 'Pierre', 'Elena', 'Marco', 'Kai', 'Luna']
+LAST_NAMES = ['Smith', 'Garcia', 'Johnson', 'Brown', 'Williams', 'Jones', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Anderson', 'Taylor', 'Thomas', 'Hernandez', 'Moore']
+INTERESTS = ['travel photography cooking', 'music movies reading', 'sports fitness hiking',
+             'art painting museums', 'technology gaming programming', 'food restaurants culture',
+             'books writing literature', 'nature outdoors camping', 'history politics news']
+BIOS = [
+    "I'm passionate about languages and love meeting people from different cultures!",
+    "Traveling the world and learning new languages is my biggest passion.",
+    "Looking forward to helping others learn my language while improving my own skills!",
+    "Professional looking to improve language skills for career advancement.",
+    '',
+]
+MESSAGES = ['Hi! How are you?', 'Shall we practice tomorrow?', 'Thanks for the call today!',
+            'How do you say this in your language?', 'That makes sense now.', 'See you next week!']
+END_REASONS = {'normal': 0.5, 'user_hangup': 0.25, 'partner_hangup': 0.1,
+               'connection_lost': 0.08, 'technical_issue': 0.05, 'network_failure': 0.02}
+
+User = get_user_model()
+
+
+def parse_distribution(value):
+    """Parse ``"1:0.75,2:0.25"`` into ``{1: 0.75, 2: 0.25}``."""
+    distribution = {}
+    for part in value.split(','):
+        count, _, weight = part.partition(':')
+        distribution[int(count)] = float(weight or 1)
+    return distribution
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Let ``bulk_create`` write the given ``auto_now``/``auto_now_add`` fields as set."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class SyntheticDataGenerator:
+    def __init__(self, users=1000, seed=0, prefix='synth', skew=1.0, teach_counts=None, learn_counts=None,
+                 matches_per_user=0.3, messages_per_match=20, calls_per_match=3, days=90,
+                 batch_size=5000, password='testpass123', now=None, log=None):
+        self.user_count = users
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.skew = skew
+        self.teach_counts = teach_counts or DEFAULT_TEACH_COUNTS
+        self.learn_counts = learn_counts or DEFAULT_LEARN_COUNTS
+        self.matches_per_user = matches_per_user
+        self.messages_per_match = messages_per_match
+        self.calls_per_match = calls_per_match
+        self.days = days
+        self.batch_size = batch_size
+        self.password = password
+        self.now = now or timezone.now()
+        self.log = log or (lambda message: None)
+        self.counts = {}
+
+    def run(self):
+        """Generate the whole dataset; returns the number of rows written per model."""
+        from chats.call_sessions import rebuild_rollups
+        from chats.models import VideoRoom
+        from users.language_matrix import rebuild_matrix
+
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise RuntimeError('The synthetic data generator needs a database that returns ids from bulk inserts')
+
+        language_ids = self.ensure_languages()
+        with self.phase('users'):
+            user_ids = self.create_users()
+        with self.phase('user languages'):
+            profiles = self.create_user_languages(user_ids, language_ids)
+        with self.phase('matches'):
+            matches = self.create_matches(profiles)
+        with self.phase('chat rooms and messages'):
+            self.create_chats(matches)
+        with self.phase('video rooms and call sessions'):
+            self.create_calls(matches)
+        with self.phase('language matrix and call stats rollups'):
+            rebuild_matrix()
+            # Only this run's rooms and users, none of which has purged history,
+            # so the retention check has nothing to protect
+            users = User.objects.filter(username__startswith=f'{self.prefix}_')
+            rebuild_rollups(force=True, rooms=VideoRoom.objects.filter(match__user1__in=users), users=users)
+        return self.counts
+
+    @contextmanager
+    def phase(self, name):
+        before = sum(self.counts.values())
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        rows = sum(self.counts.values()) - before
+        self.log(f'{name}: {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)')
+
+    def insert(self, model, objects, timestamps=()):
+        """Bulk insert one batch in its own transaction; the objects get their ids."""
+        if not objects:
+            return objects
+        with transaction.atomic(), explicit_timestamps(model, *timestamps):
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+        label = model._meta.label
+        self.counts[label] = self.counts.get(label, 0) + len(objects)
+        return objects
+
+    def random_time(self, start, end=None):
+        end = end or self.now
+        return start + (end - start) * self.rng.random()
+
+    def draw(self, distribution):
+        return self.rng.choices(list(distribution), weights=list(distribution.values()))[0]
+
+    def sample(self, population, cum_weights, k, exclude=()):
+        """``k`` distinct items drawn by weight, skipping ``exclude``."""
+        chosen = []
+        k = min(k, len(population) - len(exclude))
+        while len(chosen) < k:
+            item = self.rng.choices(population, cum_weights=cum_weights)[0]
+            if item not in chosen and item not in exclude:
+                chosen.append(item)
+        return chosen
+
+    def ensure_languages(self):
+        """Language ids in popularity order, creating the default languages if missing."""
+        from users.models import Language
+
+        Language.objects.bulk_create(
+            [Language(name=name, code=code, flag_emoji=flag) for name, code, flag in DEFAULT_LANGUAGES],
+            ignore_conflicts=True,
+        )
+        by_code = dict(Language.objects.values_list('code', 'id'))
+        ordered = [by_code[code] for _, code, _ in DEFAULT_LANGUAGES if code in by_code]
+        return ordered + sorted(set(by_code.values()) - set(ordered))
+
+    def create_users(self):
+        # A seeded salt keeps the shared hash, like everything else, reproducible
+        password = make_password(self.password, salt=f'{self.rng.getrandbits(128):032x}')
+        start = self.now - timedelta(days=self.days)
+        user_ids = []
+        for offset in range(0, self.user_count, self.batch_size):
+            batch = []
+            for i in range(offset, min(offset + self.batch_size, self.user_count)):
+                username = f'{self.prefix}_{i:07d}'
+                batch.append(User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    password=password,
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    bio=self.rng.choice(BIOS),
+                    interests=self.rng.choice(INTERESTS),
+                    date_joined=self.random_time(start),
+                ))
+            user_ids.extend(user.pk for user in self.insert(User, batch))
+        return user_ids
+
+    def create_user_languages(self, user_ids, language_ids):
+        """Give every user teaching and learning languages; returns (id, teaches, learns) per user."""
+        from users.models import UserLanguage
+
+        cum_weights = []
+        total = 0.0
+        for rank in range(len(language_ids)):
+            total += 1 / (rank + 1) ** self.skew
+            cum_weights.append(total)
+
+        profiles = []
+        batch = []
+        for user_id in user_ids:
+            teaches = self.sample(language_ids, cum_weights, self.draw(self.teach_counts))
+            learns = self.sample(language_ids, cum_weights, self.draw(self.learn_counts), exclude=teaches)
+            profiles.append((user_id, teaches, learns))
+            for language_id in teaches:
+                fluent = self.rng.random() < 0.2
+                batch.append(UserLanguage(
+                    user_id=user_id, language_id=language_id,
+                    language_type='fluent' if fluent else 'native',
+                    proficiency='advanced' if fluent else 'native',
+                ))
+            for language_id in learns:
+                batch.append(UserLanguage(
+                    user_id=user_id, language_id=language_id, language_type='learning',
+                    proficiency=self.rng.choice(['beginner', 'intermediate', 'advanced']),
+                ))
+            if len(batch) >= self.batch_size:
+                self.insert(UserLanguage, batch)
+                batch = []
+        self.insert(UserLanguage, batch)
+        return profiles
+
+    def create_matches(self, profiles):
+        """Pair users who teach each other's learning languages; returns the Match objects."""
+        from matches.models import Match
+
+        # (teaches, learns) -> users; a match joins cell (x, y) with cell (y, x)
+        cells = {}
+        for user_id, teaches, learns in profiles:
+            for x in teaches:
+                for y in learns:
+                    cells.setdefault((x, y), []).append(user_id)
+        pairs = [(x, y) for (x, y) in cells if x < y and (y, x) in cells]
+        if not pairs:
+            return []
+        weights = [min(len(cells[(x, y)]), len(cells[(y, x)])) for x, y in pairs]
+
+        target = int(self.user_count * self.matches_per_user / 2)
+        start = self.now - timedelta(days=self.days)
+        seen = set()
+        matches = []
+        batch = []
+        attempts = 0
+        while len(matches) + len(batch) < target and attempts < target * 20:
+            attempts += 1
+            x, y = self.rng.choices(pairs, weights=weights)[0]
+            user1, user2 = self.rng.choice(cells[(x, y)]), self.rng.choice(cells[(y, x)])
+            key = (min(user1, user2), max(user1, user2))
+            if user1 == user2 or key in seen:
+                continue
+            seen.add(key)
+            created_at = self.random_time(start)
+            ended = self.rng.random() < 0.15
+            batch.append(Match(
+                user1_id=user1, user2_id=user2, user1_teaches_id=x, user1_learns_id=y,
+                status='ended' if ended else 'active',
+                created_at=created_at, updated_at=created_at,
+                last_activity=self.random_time(created_at),
+                ended_at=self.random_time(created_at) if ended else None,
+            ))
+            if len(batch) >= self.batch_size:
+                matches.extend(self.insert(Match, batch, ('created_at', 'updated_at')))
+                batch = []
+        matches.extend(self.insert(Match, batch, ('created_at', 'updated_at')))
+        return matches
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def create_chats(self, matches):
+        from chats.models import ChatMessage, ChatRoom
+
+        messages = []
+        for offset in range(0, len(matches), self.batch_size):
+            rooms = [
+                ChatRoom(match_id=match.pk, room_id=self.uuid(), created_at=match.created_at,
+                         last_activity=match.last_activity)
+                for match in matches[offset:offset + self.batch_size]
+            ]
+            self.insert(ChatRoom, rooms, ('created_at', 'last_activity'))
+            for room, match in zip(rooms, matches[offset:offset + self.batch_size]):
+                count = int(self.rng.expovariate(1 / self.messages_per_match)) if self.messages_per_match else 0
+                times = sorted(self.random_time(match.created_at) for _ in range(count))
+                for i, timestamp in enumerate(times):
+                    messages.append(ChatMessage(
+                        room_id=room.pk,
+                        sender_id=self.rng.choice((match.user1_id, match.user2_id)),
+                        content=self.rng.choice(MESSAGES),
+                        timestamp=timestamp,
+                        updated_at=timestamp,
+                        is_read=i < count - 2,
+                    ))
+                if len(messages) >= self.batch_size:
+                    self.insert(ChatMessage, messages, ('timestamp', 'updated_at'))
+                    messages = []
+        self.insert(ChatMessage, messages, ('timestamp', 'updated_at'))
+
+    def create_calls(self, matches):
+        from chats.models import CallSession, VideoRoom
+
+        Participant = CallSession.participants.through
+        sessions = []
+
+        def flush():
+            self.insert(CallSession, [session for session, _ in sessions], ('started_at',))
+            self.insert(Participant, [
+                Participant(callsession_id=session.pk, user_id=user_id)
+                for session, user_ids in sessions for user_id in user_ids
+            ])
+            sessions.clear()
+
+        for offset in range(0, len(matches), self.batch_size):
+            chunk = matches[offset:offset + self.batch_size]
+            rooms = [
+                VideoRoom(match_id=match.pk, room_id=self.uuid(), created_at=match.created_at,
+                          last_activity=match.last_activity)
+                for match in chunk
+            ]
+            self.insert(VideoRoom, rooms, ('created_at', 'last_activity'))
+            for room, match in zip(rooms, chunk):
+                count = int(self.rng.expovariate(1 / self.calls_per_match)) if self.calls_per_match else 0
+                for _ in range(count):
+                    started_at = self.random_time(match.created_at)
+                    duration = timedelta(seconds=int(self.rng.lognormvariate(6.5, 0.8)))
+                    failed = self.rng.random() < 0.05
+                    sessions.append((CallSession(
+                        room_id=room.pk,
+                        status='failed' if failed else 'ended',
+                        started_at=started_at,
+                        ended_at=started_at + duration,
+                        finalized_at=started_at + duration,
+                        last_heartbeat=started_at + duration,
+                        duration=duration,
+                        end_reason='technical_issue' if failed else self.draw(END_REASONS),
+                        ended_by_id=self.rng.choice((match.user1_id, match.user2_id)),
+                        max_participants=2,
+                        average_video_quality=self.rng.choice(['HD', 'HD', 'SD', 'Poor']),
+                        network_issues_count=int(self.rng.expovariate(1)),
+                    ), (match.user1_id, match.user2_id)))
+                if len(sessions) >= self.batch_size:
+                    flush()
+        flush()
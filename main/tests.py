@@ -1,3 +1,407 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from chats.call_sessions import end_stale_sessions
+from chats.models import (
+    CallInvitation, CallSession, ChatMessage, ChatRoom, RoomCallStats, RoomMessage, UserCallStats, VideoRoom,
+)
+from matches.models import Match, MatchRequest
+from matches.services import MatchingService
+from users.models import Language, LanguagePairDemand, User, UserLanguage
+from .exports import stream_export
+from .metrics import collect_metrics, take_snapshot
+from .retention import POLICIES, purge
+from .synthetic import SyntheticDataGenerator
+from .models import PlatformSnapshot
+
+
+class PlatformSnapshotTest(TestCase):
+    """Test the daily platform metrics snapshot."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass123')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass123')
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        Language.objects.create(name='Esperanto', code='eo')
+        UserLanguage.objects.create(user=self.user1, language=self.english, proficiency='native', language_type='native')
+        UserLanguage.objects.create(user=self.user1, language=self.korean, proficiency='beginner', language_type='learning')
+        UserLanguage.objects.create(user=self.user2, language=self.korean, proficiency='native', language_type='native')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.room = VideoRoom.objects.create(match=self.match)
+        self.now = timezone.now()
+
+    def end_session(self, minutes, ended_at):
+        return CallSession.objects.create(
+            room=self.room, status='ended', ended_at=ended_at, finalized_at=ended_at, duration=timedelta(minutes=minutes)
+        )
+
+    def test_collect_metrics_uses_grouped_passes(self):
+        """Every breakdown comes from a fixed number of aggregate queries."""
+        self.end_session(12, self.now - timedelta(hours=1))
+
+        with self.assertNumQueries(9):
+            metrics = collect_metrics()
+
+        self.assertEqual(metrics['users'], {'total': 2, 'regular': 2, 'admin': 0, 'new': 2})
+        self.assertEqual(metrics['user_languages']['by_type'], {'native': 2, 'learning': 1})
+        self.assertEqual(metrics['languages']['unused'], 1)
+        self.assertEqual(metrics['languages']['by_region']['Asian'], 1)
+        self.assertEqual(metrics['matches']['by_status'], {'active': 1})
+        self.assertEqual(metrics['calls']['sessions'], 1)
+        self.assertEqual(metrics['calls']['minutes'], 12)
+
+    def test_snapshots_carry_call_totals_forward(self):
+        """A later snapshot only scans calls that ended since the previous one."""
+        self.end_session(10, self.now - timedelta(days=1, hours=1))
+        first = take_snapshot(now=self.now - timedelta(days=1))
+        self.end_session(5, self.now - timedelta(hours=1))
+
+        second = take_snapshot(now=self.now)
+
+        self.assertEqual(first.metrics['calls']['sessions'], 1)
+        self.assertEqual(second.metrics['calls'], {
+            'sessions': 2, 'minutes': 15.0, 'new_sessions': 1, 'new_minutes': 5.0,
+        })
+        self.assertEqual(PlatformSnapshot.objects.count(), 2)
+
+    def test_snapshot_counts_sessions_reaped_after_the_previous_one(self):
+        """A session reaped after a snapshot is counted next time even though its end is backdated."""
+        stale = CallSession.objects.create(room=self.room, status='active')
+        CallSession.objects.filter(pk=stale.pk).update(last_heartbeat=self.now - timedelta(days=2))
+        first = take_snapshot(now=timezone.now())
+
+        end_stale_sessions(timezone.now() - timedelta(minutes=2), batch_size=10)
+        second = take_snapshot(now=timezone.now() + timedelta(days=1))
+
+        self.assertEqual(first.metrics['calls']['sessions'], 0)
+        self.assertEqual(second.metrics['calls']['new_sessions'], 1)
+
+    def test_stats_commands_read_the_latest_snapshot(self):
+        """show_stats and language_stats report the snapshot unless --live is given."""
+        take_snapshot(now=self.now)
+        User.objects.create_user(username='testuser3', password='testpass123')
+
+        out = StringIO()
+        call_command('show_stats', '--json', stdout=out)
+        from_snapshot = json.loads(out.getvalue())
+        out = StringIO()
+        call_command('show_stats', '--json', '--live', stdout=out)
+        live = json.loads(out.getvalue())
+        out = StringIO()
+        call_command('language_stats', '--json', stdout=out)
+        languages = json.loads(out.getvalue())
+
+        self.assertEqual(from_snapshot['users']['total'], 2)
+        self.assertEqual(live['users']['total'], 3)
+        self.assertEqual(live['source'], 'live')
+        self.assertEqual(languages['user_languages']['total'], 3)
+
+
+class AnalyticsExportTest(TestCase):
+    """Test the streaming analytics exports."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass123', is_staff=True)
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass123')
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.room = VideoRoom.objects.create(match=self.match)
+        self.chat_room = ChatRoom.objects.create(match=self.match)
+        self.now = timezone.now()
+        self.old = CallSession.objects.create(
+            room=self.room, status='ended', ended_at=self.now - timedelta(days=1),
+            finalized_at=self.now - timedelta(days=1), duration=timedelta(minutes=3)
+        )
+        self.new = CallSession.objects.create(
+            room=self.room, status='ended', ended_at=self.now - timedelta(hours=1),
+            finalized_at=self.now - timedelta(hours=1), duration=timedelta(minutes=7)
+        )
+        CallSession.objects.create(room=self.room, status='active')
+
+    def test_csv_export_streams_finished_sessions_since_watermark(self):
+        """Only sessions that ended inside the window are exported, in chunks."""
+        chunks = list(stream_export(
+            'call_sessions', since=self.now - timedelta(hours=2), until=self.now, chunk_size=1
+        ))
+
+        rows = list(csv.DictReader(b''.join(chunks).decode().splitlines()))
+        self.assertEqual([int(row['id']) for row in rows], [self.new.id])
+        self.assertEqual(float(rows[0]['duration']), 420.0)
+
+    def test_deltas_pick_up_reaped_sessions_and_answered_requests(self):
+        """Rows finalized or changed after a watermark are in the next delta even when backdated or created earlier."""
+        stale = CallSession.objects.create(room=self.room, status='active')
+        CallSession.objects.filter(pk=stale.pk).update(last_heartbeat=self.now - timedelta(days=2))
+        match_request = MatchRequest.objects.create(
+            sender=self.user2, receiver=self.user1, sender_teaches=self.korean, sender_learns=self.english
+        )
+        edited = ChatMessage.objects.create(room=self.chat_room, sender=self.user1, content='Helo')
+        read = ChatMessage.objects.create(room=self.chat_room, sender=self.user2, content='Hi')
+        ChatMessage.objects.create(room=self.chat_room, sender=self.user1, content='Untouched')
+        watermark = timezone.now()
+
+        end_stale_sessions(watermark - timedelta(minutes=2), batch_size=10)
+        MatchingService.respond_to_match_request(match_request, accept=False)
+        edited.edit_content('Hello')
+        self.client.login(username='testuser1', password='testpass123')
+        self.client.post(reverse('chats:mark_messages_read', args=[self.chat_room.room_id]))
+        sessions = list(csv.DictReader(b''.join(stream_export('call_sessions', since=watermark)).decode().splitlines()))
+        requests = list(csv.DictReader(b''.join(stream_export('match_requests', since=watermark)).decode().splitlines()))
+        messages = list(csv.DictReader(b''.join(stream_export('chat_messages', since=watermark)).decode().splitlines()))
+
+        self.assertEqual([int(row['id']) for row in sessions], [stale.id])
+        self.assertEqual([(int(row['id']), row['status']) for row in requests], [(match_request.id, 'declined')])
+        self.assertEqual(
+            [(int(row['id']), bool(row['edited_at']), row['is_read']) for row in messages],
+            [(edited.id, True, 'False'), (read.id, False, 'True')]
+        )
+
+    def test_gzipped_jsonl_round_trips(self):
+        """JSON Lines output decompresses to one object per row."""
+        ChatMessage.objects.create(room=self.chat_room, sender=self.user1, content='Hello there')
+
+        blob = b''.join(stream_export('chat_messages', fmt='jsonl', compress=True, flush_bytes=1))
+
+        rows = [json.loads(line) for line in gzip.decompress(blob).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['content_length'], 11)
+        self.assertNotIn('content', rows[0])
+
+    def test_command_advances_watermark_file(self):
+        """A second run with the same watermark file only exports new rows."""
+        watermark = self.tmp_path('watermark')
+        output = self.tmp_path('sessions.csv')
+
+        call_command('export_analytics', 'call_sessions', '--watermark-file', watermark, '--output', output, stderr=StringIO())
+        with open(output) as handle:
+            self.assertEqual(len(list(csv.DictReader(handle))), 2)
+
+        call_command('export_analytics', 'call_sessions', '--watermark-file', watermark, '--output', output, stderr=StringIO())
+        with open(output) as handle:
+            self.assertEqual(list(csv.DictReader(handle)), [])
+
+    def test_endpoint_is_staff_only_and_streams(self):
+        """Staff get a streaming attachment; everyone else is refused."""
+        url = reverse('main:analytics_export', args=['match_requests'])
+        self.client.login(username='testuser2', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='testuser1', password='testpass123')
+        response = self.client.get(url, {'format': 'jsonl', 'gzip': '1'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('X-Export-Watermark', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'')
+
+    async def test_endpoint_streams_asynchronously_under_asgi(self):
+        """ASGI requests get an async iterator, so the export is sent as it is read."""
+        user = await User.objects.aget(username='testuser1')
+        await self.async_client.aforce_login(user)
+
+        response = await self.async_client.get(reverse('main:analytics_export', args=['match_requests']))
+
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(b''.join(chunks).decode().splitlines()[0].split(',')[0], 'id')
+
+    def tmp_path(self, name):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, name)
+
+
+class RetentionTest(TestCase):
+    """Test the chunked retention engine."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass123')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass123')
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.match = Match.objects.create(
+            user1=self.user1,
+            user2=self.user2,
+            user1_teaches=self.english,
+            user1_learns=self.korean,
+            status='active'
+        )
+        self.room = VideoRoom.objects.create(match=self.match)
+        self.old = timezone.now() - timedelta(days=100)
+
+    def create_invitations(self, count, status, created_at):
+        invitations = [
+            CallInvitation.objects.create(room=self.room, caller=self.user1, receiver=self.user2, status=status)
+            for _ in range(count)
+        ]
+        CallInvitation.objects.filter(pk__in=[i.pk for i in invitations]).update(
+            created_at=created_at, expires_at=created_at + timedelta(minutes=2)
+        )
+
+    def test_purge_deletes_in_bounded_batches(self):
+        """Expired rows go in pk ranges of batch_size; recent and kept rows stay."""
+        for _ in range(5):
+            RoomMessage.objects.create(room=self.room, sender=self.user1, content='old')
+        RoomMessage.objects.update(timestamp=self.old)
+        RoomMessage.objects.create(room=self.room, sender=self.user1, content='new')
+        progress = []
+
+        result = purge(
+            POLICIES['room_messages'], batch_size=2, sleep=0,
+            progress=lambda policy, totals: progress.append(totals['deleted']),
+        )
+
+        self.assertEqual(result, {'deleted': 5, 'cascaded': {}, 'batches': 3})
+        self.assertEqual(progress, [2, 4, 5])
+        self.assertEqual(list(RoomMessage.objects.values_list('content', flat=True)), ['new'])
+
+    def test_ended_sessions_cascade_and_open_sessions_are_kept(self):
+        """Old ended sessions are deleted with their participants; open ones survive."""
+        ended = CallSession.objects.create(room=self.room, status='ended', ended_at=self.old)
+        ended.participants.add(self.user1, self.user2)
+        CallSession.objects.create(room=self.room, status='active', ended_at=self.old)
+
+        result = purge(POLICIES['call_sessions'], days=30, sleep=0)
+
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(result['cascaded'], {'chats.CallSession_participants': 2})
+        self.assertEqual(list(CallSession.objects.values_list('status', flat=True)), ['active'])
+
+    def test_cleanup_expired_invitations_uses_grouped_statistics(self):
+        """Old pending invitations are expired, then every old answered invitation is deleted."""
+        self.create_invitations(3, 'declined', self.old)
+        self.create_invitations(1, 'pending', self.old)
+        self.create_invitations(1, 'accepted', timezone.now())
+        out = StringIO()
+
+        with self.assertNumQueries(7):
+            call_command('cleanup_expired_invitations', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Marked 1 pending invitations as expired', out.getvalue())
+        self.assertIn('Deleted 4 old invitations (older than 7 days) in 2 batches', out.getvalue())
+        self.assertIn("Status breakdown: {'accepted': 1}", out.getvalue())
+
+    def test_cleanup_dry_run_counts_pending_invitations_it_would_delete(self):
+        """Old pending invitations are expired and then purged, so the dry run counts them as deleted."""
+        self.create_invitations(3, 'declined', self.old)
+        self.create_invitations(1, 'pending', self.old)
+        out = StringIO()
+
+        call_command('cleanup_expired_invitations', '--dry-run', stdout=out)
+
+        self.assertIn("Would delete 4 old invitations {'declined': 3, 'expired': 1}", out.getvalue())
+        self.assertEqual(CallInvitation.objects.count(), 4)
+
+    def test_apply_retention_dry_run_deletes_nothing(self):
+        """A dry run reports per-status counts without deleting."""
+        self.create_invitations(2, 'accepted', self.old)
+        out = StringIO()
+
+        call_command('apply_retention', 'call_invitations', '--dry-run', stdout=out)
+
+        self.assertIn("would delete 2 rows older than 7 days {'accepted': 2}", out.getvalue())
+        self.assertEqual(CallInvitation.objects.count(), 2)
+
+
+class SyntheticDataGeneratorTest(TestCase):
+    """Test the bulk synthetic data generator."""
+
+    def generate(self, seed):
+        return SyntheticDataGenerator(
+            users=60, seed=seed, messages_per_match=5, calls_per_match=2, batch_size=25,
+            now=timezone.now().replace(microsecond=0),
+        )
+
+    def test_dataset_is_complete_and_consistent(self):
+        """Every related table is populated and the derived tables are rebuilt."""
+        counts = self.generate(seed=1).run()
+
+        self.assertEqual(counts['users.User'], 60)
+        self.assertEqual(UserLanguage.objects.filter(language_type='learning').values('user').distinct().count(), 60)
+        self.assertGreater(counts['matches.Match'], 0)
+        self.assertEqual(ChatRoom.objects.count(), counts['matches.Match'])
+        self.assertEqual(VideoRoom.objects.count(), counts['matches.Match'])
+        self.assertEqual(counts['chats.CallSession_participants'], 2 * counts['chats.CallSession'])
+        self.assertEqual(CallSession.objects.filter(ended_at__isnull=True).count(), 0)
+        self.assertTrue(LanguagePairDemand.objects.exists())
+        for match in Match.objects.all()[:10]:
+            self.assertTrue(UserLanguage.objects.filter(
+                user=match.user1, language=match.user1_teaches, language_type__in=['native', 'fluent']
+            ).exists())
+            self.assertTrue(UserLanguage.objects.filter(
+                user=match.user2, language=match.user1_teaches, language_type='learning'
+            ).exists())
+
+    def test_same_seed_gives_same_dataset(self):
+        """Two runs with one seed produce identical rows."""
+        def snapshot():
+            return (
+                list(UserLanguage.objects.order_by('user__username', 'language__code').values_list(
+                    'user__username', 'language__code', 'language_type', 'proficiency'
+                )),
+                list(Match.objects.order_by('user1__username', 'user2__username').values_list(
+                    'user1__username', 'user2__username', 'status'
+                )),
+            )
+
+        self.generate(seed=7).run()
+        first = snapshot()
+        User.objects.filter(username__startswith='synth_').delete()
+        self.generate(seed=7).run()
+
+        self.assertEqual(snapshot(), first)
+
+    def test_rollups_of_other_rooms_are_left_alone(self):
+        """A database whose rolled-up sessions were purged does not stop the run."""
+        other = User.objects.create_user(username='other', password='testpass123')
+        UserCallStats.objects.create(user=other, session_count=3, end_reasons={'normal': 3}, updated_at=timezone.now())
+
+        counts = self.generate(seed=2).run()
+
+        self.assertEqual(UserCallStats.objects.get(user=other).session_count, 3)
+        self.assertEqual(
+            UserCallStats.objects.filter(user__username__startswith='synth_').count(),
+            CallSession.participants.through.objects.values('user').distinct().count(),
+        )
+        self.assertEqual(RoomCallStats.objects.count(), VideoRoom.objects.filter(sessions__isnull=False).distinct().count())
+        self.assertGreater(counts['chats.CallSession'], 0)
+
+    def test_command_reproduces_a_dataset_from_seed_and_now(self):
+        """--now pins every timestamp, so one seed and now give one dataset."""
+        def snapshot():
+            return list(User.objects.order_by('username').values_list('username', 'date_joined', 'password'))
+
+        options = {'users': 20, 'seed': 3, 'now': '2026-01-01T00:00:00', 'stdout': StringIO()}
+        call_command('generate_synthetic_data', **options)
+        first = snapshot()
+        call_command('generate_synthetic_data', clear=True, **options)
 
-# Create your tests here.
+        self.assertEqual(snapshot(), first)
+        self.assertLessEqual(max(date_joined for _, date_joined, _ in first), timezone.make_aware(datetime(2026, 1, 1)))
@@ -5,4 +5,5 @@ app_name = 'main'
 
 urlpatterns = [
     path('', views.home, name='home'),
-] 
\ No newline at end of file
+    path('api/exports/<str:name>/', views.analytics_export, name='analytics_export'),
+] 
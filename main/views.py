@@ -1,7 +1,67 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-# Create your views here.
+from .exports import EXPORTS, FORMATS, export_filename, stream_export
+
+def _pull_async(chunks):
+    """Async iterator over a sync chunk generator, advancing it one chunk per thread hop.
+
+    Handing a sync iterator to an ASGI server makes Django consume it whole
+    before sending anything; this keeps the export streaming there too.
+    """
+    async def stream():
+        iterator = iter(chunks)
+        pull = sync_to_async(next, thread_sensitive=True)
+        try:
+            while (chunk := await pull(iterator, None)) is not None:
+                yield chunk
+        finally:
+            # Close on the same thread so an open cursor is released where it was opened
+            await sync_to_async(iterator.close, thread_sensitive=True)()
+    return stream()
 
 def home(request):
     """Main landing page for Speakle."""
     return render(request, 'main/home.html')
+
+@login_required
+def analytics_export(request, name):
+    """Staff-only endpoint streaming one analytics export as CSV or JSON Lines.
+
+    Query parameters: ``format`` (csv/jsonl), ``gzip=1``, and ``since`` /
+    ``until`` ISO datetimes for incremental deltas.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    if name not in EXPORTS:
+        return JsonResponse({'error': 'Unknown export'}, status=404)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f'Format must be one of {", ".join(FORMATS)}'}, status=400)
+    compress = request.GET.get('gzip') in ('1', 'true')
+
+    bounds = {}
+    for key in ('since', 'until'):
+        value = request.GET.get(key)
+        if value:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                return JsonResponse({'error': f'Invalid {key} datetime'}, status=400)
+            bounds[key] = timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    bounds.setdefault('until', timezone.now())
+
+    chunks = stream_export(name, fmt, compress=compress, **bounds)
+    response = StreamingHttpResponse(
+        _pull_async(chunks) if isinstance(request, ASGIRequest) else chunks,
+        content_type='application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson'),
+    )
+    filename = export_filename(name, fmt, compress, bounds['until'])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Export-Watermark'] = bounds['until'].isoformat()
+    return response
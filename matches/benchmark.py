@@ -0,0 +1,194 @@
+"""
+Benchmark harness for the matching engine.
+
+``benchmark_dataset`` seeds ``size`` users with ``SyntheticDataGenerator``
+(Zipf-skewed languages, no chat or call history) and measures, for a seeded
+sample of those users:
+
+- ``find_potential_matches`` (with ``refresh=True``)
+- ``calculate_compatibility_score`` on the pairs it found
+- the ``find_matches`` and ``get_potential_matches`` views, through the test
+  client, reading the potential matches generated above
+- ``send_match_request`` to each user's first potential partner
+
+Every call records wall time, the queries it ran and, unless disabled, its
+peak traced memory. Wall times include the ``tracemalloc`` overhead, so only
+compare runs made with the same setting. ``compare`` checks a result against
+a stored baseline: query counts are deterministic for a given seed, so any
+increase is a regression; time and memory are flagged when they grow by more
+than ``threshold`` percent.
+"""
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from main.synthetic import SyntheticDataGenerator
+
+from .models import PotentialMatch
+from .services import MatchingService
+
+User = get_user_model()
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_SAMPLES = 10
+DEFAULT_THRESHOLD = 20.0  # Percent
+
+# Metric of each operation summary -> whether any increase counts (True) or only one above the threshold
+COMPARED_METRICS = {
+    ('queries', 'mean'): True,
+    ('wall_ms', 'p50'): False,
+    ('wall_ms', 'p95'): False,
+    ('peak_kib', 'max'): False,
+}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples):
+    wall = [sample['wall_ms'] for sample in samples]
+    queries = [sample['queries'] for sample in samples]
+    summary = {
+        'calls': len(samples),
+        'wall_ms': {
+            'mean': round(sum(wall) / len(wall), 3),
+            'p50': round(percentile(wall, 50), 3),
+            'p95': round(percentile(wall, 95), 3),
+            'max': round(max(wall), 3),
+        },
+        'queries': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+    }
+    peaks = [sample['peak_kib'] for sample in samples if sample['peak_kib'] is not None]
+    if peaks:
+        summary['peak_kib'] = {'mean': round(sum(peaks) / len(peaks), 1), 'max': round(max(peaks), 1)}
+    return summary
+
+
+class Recorder:
+    """Times calls and collects one sample per call, grouped by operation name."""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.samples = {}
+
+    def call(self, name, func, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        # A counting wrapper rather than the query log, which is capped and keeps every statement in memory
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            wall = time.perf_counter() - started
+        peak = (tracemalloc.get_traced_memory()[1] - baseline) / 1024 if self.trace_memory else None
+        self.samples.setdefault(name, []).append({
+            'wall_ms': wall * 1000, 'queries': queries, 'peak_kib': peak,
+        })
+        return result
+
+    def summary(self):
+        return {name: summarize(samples) for name, samples in self.samples.items()}
+
+
+def benchmark_dataset(size, seed=0, samples=DEFAULT_SAMPLES, skew=1.0, trace_memory=True,
+                      prefix='bench', log=None):
+    """Seed ``size`` users and measure the matching operations for ``samples`` of them.
+
+    Expects a database without other users of ``prefix``; the caller owns setup
+    and cleanup. Returns ``{'users', 'rows', 'seed_seconds', 'operations'}``.
+    """
+    log = log or (lambda message: None)
+    started = time.perf_counter()
+    counts = SyntheticDataGenerator(
+        users=size, seed=seed, prefix=prefix, skew=skew,
+        messages_per_match=0, calls_per_match=0, log=log,
+    ).run()
+    seed_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed)
+    user_ids = list(User.objects.filter(username__startswith=f'{prefix}_').order_by('pk').values_list('pk', flat=True))
+    users = list(User.objects.filter(pk__in=rng.sample(user_ids, min(samples, len(user_ids)))).order_by('pk'))
+
+    recorder = Recorder(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        for user in users:
+            recorder.call('find_potential_matches', MatchingService.find_potential_matches, user, refresh=True)
+        log(f'find_potential_matches: {len(users)} users')
+
+        pairs = list(
+            PotentialMatch.objects.filter(user__in=users).select_related('user', 'potential_partner')
+            .order_by('pk')[:samples]
+        )
+        for pair in pairs:
+            recorder.call(
+                'calculate_compatibility_score', MatchingService.calculate_compatibility_score,
+                pair.user, pair.potential_partner, pair.user_teaches_id, pair.user_learns_id,
+            )
+
+        client = Client()
+        for user in users:
+            client.force_login(user)
+            recorder.call('find_matches_view', client.get, reverse('matches:find_matches'))
+            recorder.call('get_potential_matches_view', client.get, reverse('matches:get_potential_matches'))
+        log('views: find_matches, get_potential_matches')
+
+        for user in users:
+            pair = PotentialMatch.objects.filter(user=user).select_related('potential_partner').order_by('pk').first()
+            if pair:
+                recorder.call(
+                    'send_match_request', MatchingService.send_match_request,
+                    user, pair.potential_partner, pair.user_teaches, pair.user_learns,
+                )
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+    return {
+        'users': size,
+        'rows': counts,
+        'seed_seconds': round(seed_seconds, 2),
+        'operations': recorder.summary(),
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Regressions of ``current`` against ``baseline`` (both ``benchmark_matching`` results).
+
+    Returns a list of ``{'dataset', 'operation', 'metric', 'baseline', 'current', 'change'}``
+    with ``change`` in percent; datasets or operations missing from either side are skipped.
+    """
+    regressions = []
+    for dataset, results in current['datasets'].items():
+        baseline_operations = baseline.get('datasets', {}).get(dataset, {}).get('operations', {})
+        for operation, summary in results['operations'].items():
+            reference = baseline_operations.get(operation)
+            if reference is None:
+                continue
+            for (metric, statistic), any_increase in COMPARED_METRICS.items():
+                if metric not in summary or metric not in reference:
+                    continue
+                before, after = reference[metric][statistic], summary[metric][statistic]
+                change = (after - before) / before * 100 if before else (0.0 if after == before else float('inf'))
+                if after > before and (any_increase or change > threshold):
+                    regressions.append({
+                        'dataset': dataset, 'operation': operation, 'metric': f'{metric}.{statistic}',
+                        'baseline': before, 'current': after, 'change': round(change, 1),
+                    })
+    return regressions
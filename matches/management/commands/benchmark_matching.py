@@ -0,0 +1,106 @@
+import json
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from matches.benchmark import (
+    DEFAULT_SAMPLES, DEFAULT_SIZES, DEFAULT_THRESHOLD, benchmark_dataset, compare,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the matching engine on seeded datasets and compare the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+            help=f"Comma-separated dataset sizes in users (default: {','.join(str(size) for size in DEFAULT_SIZES)})"
+        )
+        parser.add_argument(
+            '--samples', type=int, default=DEFAULT_SAMPLES,
+            help=f'Users (and pairs) measured per dataset (default: {DEFAULT_SAMPLES})'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of language popularity (default: 1.0)')
+        parser.add_argument('--no-memory', action='store_true', help='Do not trace peak memory (faster, lower overhead)')
+        parser.add_argument('--output', default='benchmark_matching.json', help='Results file (default: benchmark_matching.json)')
+        parser.add_argument('--compare', metavar='BASELINE', help='Flag regressions against this results file')
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help=f'Percent increase in time or memory that counts as a regression (default: {DEFAULT_THRESHOLD:g})'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError(f"Invalid --sizes: {options['sizes']}")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'samples': options['samples'],
+            'skew': options['skew'],
+            'trace_memory': not options['no_memory'],
+            'datasets': {},
+        }
+
+        # A throwaway test database keeps real data out of the numbers and the numbers out of real data
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            for size in sizes:
+                self.stdout.write(self.style.HTTP_INFO(f'⏱️  {size} users'))
+                started = time.perf_counter()
+                results['datasets'][str(size)] = benchmark_dataset(
+                    size, seed=options['seed'], samples=options['samples'], skew=options['skew'],
+                    trace_memory=not options['no_memory'],
+                    log=lambda message: self.stdout.write(f'  {message}'),
+                )
+                self.write_dataset(results['datasets'][str(size)], time.perf_counter() - started)
+                call_command('flush', interactive=False, verbosity=0)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as handle:
+            json.dump(results, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if baseline is None:
+            return
+        if baseline.get('trace_memory') != results['trace_memory']:
+            self.stdout.write(self.style.WARNING('Baseline and run differ in memory tracing; wall times are not comparable'))
+        regressions = compare(baseline, results, options['threshold'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+            return
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"  {regression['dataset']} users, {regression['operation']} {regression['metric']}: "
+                f"{regression['baseline']} → {regression['current']} (+{regression['change']}%)"
+            ))
+        raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+
+    def write_dataset(self, dataset, elapsed):
+        self.stdout.write(f"  seeded in {dataset['seed_seconds']}s, measured in {elapsed - dataset['seed_seconds']:.1f}s")
+        for name, summary in dataset['operations'].items():
+            peak = f", peak {summary['peak_kib']['max']} KiB" if 'peak_kib' in summary else ''
+            self.stdout.write(
+                f"  {name:<30} {summary['calls']:>3} calls  p50 {summary['wall_ms']['p50']:>9.2f} ms  "
+                f"p95 {summary['wall_ms']['p95']:>9.2f} ms  {summary['queries']['mean']:>8.1f} queries{peak}"
+            )
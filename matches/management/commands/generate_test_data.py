@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from users.models import Language, UserLanguage
 from matches.models import PotentialMatch, Match, MatchRequest
 from matches.services import MatchingService
+from main.synthetic import DEFAULT_LANGUAGES
 import random
 
 User = get_user_model()
@@ -76,26 +77,8 @@ class Command(BaseCommand):
 
     def create_languages(self):
         """Create language data"""
-        languages_data = [
-            ('English', 'en', '🇺🇸'),
-            ('Spanish', 'es', '🇪🇸'),
-            ('French', 'fr', '🇫🇷'),
-            ('German', 'de', '🇩🇪'),
-            ('Japanese', 'ja', '🇯🇵'),
-            ('Korean', 'ko', '🇰🇷'),
-            ('Chinese', 'zh', '🇨🇳'),
-            ('Italian', 'it', '🇮🇹'),
-            ('Portuguese', 'pt', '🇵🇹'),
-            ('Russian', 'ru', '🇷🇺'),
-            ('Arabic', 'ar', '🇸🇦'),
-            ('Hindi', 'hi', '🇮🇳'),
-            ('Dutch', 'nl', '🇳🇱'),
-            ('Swedish', 'sv', '🇸🇪'),
-            ('Polish', 'pl', '🇵🇱'),
-        ]
-        
         languages = []
-        for name, code, flag in languages_data:
+        for name, code, flag in DEFAULT_LANGUAGES:
             language, created = Language.objects.get_or_create(
                 code=code,
                 defaults={'name': name, 'flag_emoji': flag}
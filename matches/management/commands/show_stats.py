@@ -1,70 +1,92 @@
+import json
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from users.models import Language, UserLanguage
-from matches.models import PotentialMatch, Match, MatchRequest
+from django.db.models import Prefetch
+from users.models import UserLanguage
+from main.metrics import collect_metrics, latest_snapshot
 
 User = get_user_model()
 
 class Command(BaseCommand):
     help = 'Show statistics about users and matches in the system'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--live',
+            action='store_true',
+            help='Aggregate fresh numbers instead of reading the latest daily snapshot'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the statistics as JSON'
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.HTTP_INFO('📊 Speakle Platform Statistics'))
+        snapshot = None if options['live'] else latest_snapshot()
+        metrics = snapshot.metrics if snapshot else collect_metrics()
+        source = f'snapshot of {snapshot.date}' if snapshot else 'live'
+
+        if options['json']:
+            keys = ['users', 'languages', 'user_languages', 'matches', 'match_requests', 'invitations', 'calls']
+            data = {key: metrics[key] for key in keys}
+            data['user_languages'] = {k: v for k, v in data['user_languages'].items() if k != 'by_language'}
+            self.stdout.write(json.dumps({'source': source, **data}, indent=2))
+            return
+
+        self.stdout.write(self.style.HTTP_INFO(f'📊 Speakle Platform Statistics ({source})'))
         self.stdout.write('=' * 50)
-        
+
         # User statistics
-        total_users = User.objects.count()
-        regular_users = User.objects.filter(is_superuser=False, is_staff=False).count()
-        admin_users = User.objects.filter(is_superuser=True).count()
-        
-        self.stdout.write(self.style.SUCCESS(f'👥 Users: {total_users} total ({regular_users} regular, {admin_users} admin)'))
-        
+        users = metrics['users']
+        self.stdout.write(self.style.SUCCESS(f"👥 Users: {users['total']} total ({users['regular']} regular, {users['admin']} admin)"))
+
         # Language statistics
-        total_languages = Language.objects.count()
-        self.stdout.write(self.style.SUCCESS(f'🌍 Languages: {total_languages} available'))
-        
+        self.stdout.write(self.style.SUCCESS(f"🌍 Languages: {metrics['languages']['total']} available"))
+
         # User language statistics
-        user_languages = UserLanguage.objects.count()
-        native_speakers = UserLanguage.objects.filter(language_type='native').count()
-        fluent_speakers = UserLanguage.objects.filter(language_type='fluent').count()
-        learners = UserLanguage.objects.filter(language_type='learning').count()
-        
-        self.stdout.write(self.style.SUCCESS(f'🗣️  User Languages: {user_languages} total'))
-        self.stdout.write(f'   • Native speakers: {native_speakers}')
-        self.stdout.write(f'   • Fluent speakers: {fluent_speakers}')
-        self.stdout.write(f'   • Language learners: {learners}')
-        
+        user_languages = metrics['user_languages']
+        by_type = user_languages['by_type']
+        self.stdout.write(self.style.SUCCESS(f"🗣️  User Languages: {user_languages['total']} total"))
+        self.stdout.write(f"   • Native speakers: {by_type.get('native', 0)}")
+        self.stdout.write(f"   • Fluent speakers: {by_type.get('fluent', 0)}")
+        self.stdout.write(f"   • Language learners: {by_type.get('learning', 0)}")
+
         # Match statistics
-        potential_matches = PotentialMatch.objects.count()
-        confirmed_matches = Match.objects.filter(status='active').count()
-        total_requests = MatchRequest.objects.count()
-        pending_requests = MatchRequest.objects.filter(status='pending').count()
-        accepted_requests = MatchRequest.objects.filter(status='accepted').count()
-        declined_requests = MatchRequest.objects.filter(status='declined').count()
-        
+        matches = metrics['matches']
+        requests = metrics['match_requests']['by_status']
         self.stdout.write(self.style.SUCCESS(f'🤝 Matches:'))
-        self.stdout.write(f'   • Potential matches: {potential_matches}')
-        self.stdout.write(f'   • Confirmed matches: {confirmed_matches}')
-        self.stdout.write(f'   • Total requests: {total_requests}')
-        self.stdout.write(f'   • Pending requests: {pending_requests}')
-        self.stdout.write(f'   • Accepted requests: {accepted_requests}')
-        self.stdout.write(f'   • Declined requests: {declined_requests}')
-        
+        self.stdout.write(f"   • Potential matches: {matches['potential']}")
+        self.stdout.write(f"   • Confirmed matches: {matches['by_status'].get('active', 0)}")
+        self.stdout.write(f'   • Total requests: {sum(requests.values())}')
+        self.stdout.write(f"   • Pending requests: {requests.get('pending', 0)}")
+        self.stdout.write(f"   • Accepted requests: {requests.get('accepted', 0)}")
+        self.stdout.write(f"   • Declined requests: {requests.get('declined', 0)}")
+
+        # Call statistics
+        calls = metrics['calls']
+        invitations = metrics['invitations']['by_status']
+        self.stdout.write(self.style.SUCCESS(f'📞 Calls:'))
+        self.stdout.write(f"   • Completed calls: {calls['sessions']} ({calls['minutes']:.0f} minutes)")
+        self.stdout.write(f'   • Invitations: {sum(invitations.values())}')
+        for status, count in sorted(invitations.items()):
+            self.stdout.write(f'     - {status.title()}: {count}')
+
         # Top languages
         self.stdout.write(self.style.HTTP_INFO('\n🔥 Most Popular Languages:'))
-        popular_native = UserLanguage.objects.filter(language_type__in=['native', 'fluent']).values('language__name').distinct()
-        popular_learning = UserLanguage.objects.filter(language_type='learning').values('language__name').distinct()
-        
-        self.stdout.write(f'   • Teaching: {len(popular_native)} different languages')
-        self.stdout.write(f'   • Learning: {len(popular_learning)} different languages')
-        
+        self.stdout.write(f"   • Teaching: {metrics['languages']['teaching']} different languages")
+        self.stdout.write(f"   • Learning: {metrics['languages']['learning']} different languages")
+
         # Sample users
         self.stdout.write(self.style.HTTP_INFO('\n👤 Sample Users:'))
-        sample_users = User.objects.filter(is_superuser=False)[:5]
+        sample_users = User.objects.filter(is_superuser=False).prefetch_related(
+            Prefetch('userlanguage_set', queryset=UserLanguage.objects.select_related('language'))
+        )[:5]
         for user in sample_users:
             user_langs = user.userlanguage_set.all()
             teaches = [ul.language.name for ul in user_langs if ul.language_type in ['native', 'fluent']]
             learns = [ul.language.name for ul in user_langs if ul.language_type == 'learning']
             self.stdout.write(f'   • {user.username} - Teaches: {", ".join(teaches)} | Learns: {", ".join(learns)}')
-        
-        self.stdout.write(self.style.SUCCESS('\n✅ Statistics complete!')) 
\ No newline at end of file
+
+        self.stdout.write(self.style.SUCCESS('\n✅ Statistics complete!'))
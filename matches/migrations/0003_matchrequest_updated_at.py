@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:14
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def stamp_last_change(apps, schema_editor):
+    """Existing requests last changed when they were answered, or else when they were sent."""
+    MatchRequest = apps.get_model('matches', 'MatchRequest')
+    MatchRequest.objects.update(updated_at=Coalesce('responded_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0002_match_end_reason_match_ended_at_match_ended_by_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(stamp_last_change, migrations.RunPython.noop),
+    ]
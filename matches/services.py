@@ -1,6 +1,7 @@
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 from users.models import UserLanguage, Language
+from users.language_matrix import estimate_partners
 from .models import PotentialMatch, Match, MatchRequest
 
 User = get_user_model()
@@ -57,10 +58,6 @@ class MatchingService:
     @staticmethod
     def find_potential_matches(user, refresh=False):
         """Find potential matches for a user based on language preferences."""
-        if refresh:
-            # Clear existing potential matches for this user
-            PotentialMatch.objects.filter(user=user).delete()
-        
         # Get user's teaching languages (native + fluent)
         user_can_teach = UserLanguage.objects.filter(
             user=user,
@@ -73,9 +70,18 @@ class MatchingService:
             language_type='learning'
         ).values_list('language', flat=True)
         
+        if refresh:
+            # Clear existing potential matches for this user
+            PotentialMatch.objects.filter(user=user).delete()
+        
         if not user_can_teach or not user_wants_to_learn:
             return []
         
+        # The materialized language matrix says up front whether anyone at all
+        # teaches what this user learns while learning what they teach
+        if not estimate_partners(user_can_teach, user_wants_to_learn):
+            return []
+        
         potential_matches = []
         
         # Find users who want to learn what this user can teach
@@ -1,8 +1,11 @@
+from unittest.mock import patch
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from chats.executors import PoolBusy
 from users.models import Language, UserLanguage
+from .benchmark import benchmark_dataset, compare
 from .models import PotentialMatch, Match, MatchRequest
 import json
 
@@ -279,6 +282,20 @@ class MatchesAPITestCase(TestCase):
         self.assertEqual(stats['status'], 'active')
         self.assertEqual(stats['partner']['username'], 'user2')
         
+    def test_match_statistics_report_zero_calls_without_a_rollup(self):
+        """A match whose room has no ended calls still gets the call keys, as zeros."""
+        from chats.models import VideoRoom
+        match = Match.objects.create(
+            user1=self.user1, user2=self.user2, user1_teaches=self.english, user1_learns=self.korean, status='active'
+        )
+        VideoRoom.objects.create(match=match)
+        
+        self.client.login(username='user1', password='testpass123')
+        response = self.client.get(f'/matches/api/match-statistics/{match.id}/')
+        
+        stats = json.loads(response.content)['statistics']
+        self.assertEqual((stats['total_calls'], stats['total_call_duration']), (0, 0))
+    
     def test_refresh_potential_matches_api(self):
         """Test refreshing potential matches via API"""
         self.client.login(username='user1', password='testpass123')
@@ -289,6 +306,15 @@ class MatchesAPITestCase(TestCase):
         self.assertTrue(data['success'])
         self.assertIn('message', data)
         
+    def test_refresh_answers_503_when_the_batch_pool_is_busy(self):
+        """A refresh the batch pool cannot start is refused instead of run on the request thread."""
+        self.client.login(username='user1', password='testpass123')
+        with patch('matches.views.run_in_executor', side_effect=PoolBusy):
+            response = self.client.post('/matches/api/refresh-matches/')
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+    
     def test_unauthorized_access(self):
         """Test that API endpoints require authentication"""
         endpoints = [
@@ -327,3 +353,40 @@ class MatchesAPITestCase(TestCase):
         })
         
         self.assertEqual(response.status_code, 404)  # Should not find the request
+
+
+class MatchingBenchmarkTest(TestCase):
+    """Test the matching engine benchmark harness."""
+
+    def test_benchmark_dataset_measures_every_operation(self):
+        """Each operation gets wall time, query and memory summaries."""
+        result = benchmark_dataset(200, seed=1, samples=3)
+
+        self.assertEqual(result['users'], 200)
+        self.assertEqual(
+            set(result['operations']),
+            {'find_potential_matches', 'calculate_compatibility_score', 'find_matches_view',
+             'get_potential_matches_view', 'send_match_request'},
+        )
+        for summary in result['operations'].values():
+            self.assertGreater(summary['calls'], 0)
+            self.assertGreater(summary['queries']['mean'], 0)
+            self.assertIn('p95', summary['wall_ms'])
+            self.assertIn('max', summary['peak_kib'])
+        self.assertEqual(MatchRequest.objects.count(), result['operations']['send_match_request']['calls'])
+
+    def test_compare_flags_regressions(self):
+        """Any query increase is a regression; time only beyond the threshold."""
+        def results(queries, p50):
+            operation = {'queries': {'mean': queries}, 'wall_ms': {'p50': p50, 'p95': p50}}
+            return {'datasets': {'1000': {'operations': {'find_potential_matches': operation}}}}
+
+        self.assertEqual(compare(results(10, 100), results(10, 115), threshold=20), [])
+        self.assertEqual(compare(results(10, 100), results(8, 50)), [])
+
+        regressions = compare(results(10, 100), results(11, 130), threshold=20)
+
+        self.assertEqual(
+            [(r['metric'], r['change']) for r in regressions],
+            [('queries.mean', 10.0), ('wall_ms.p50', 30.0), ('wall_ms.p95', 30.0)],
+        )
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -7,6 +8,7 @@ from django.views.decorators.http import require_POST
 from django.utils import timezone
 from .models import PotentialMatch, Match, MatchRequest
 from .services import MatchingService
+from chats.executors import PoolBusy, run_in_executor
 from users.models import Language
 
 @login_required
@@ -24,8 +26,14 @@ def find_matches(request):
     # Get or generate potential matches
     refresh = request.GET.get('refresh', False)
     if refresh:
-        MatchingService.find_potential_matches(request.user, refresh=True)
-        messages.success(request, 'Matches refreshed!')
+        try:
+            run_in_executor(
+                'batch', MatchingService.find_potential_matches, request.user, refresh=True,
+                start_timeout=getattr(settings, 'BATCH_START_TIMEOUT', 2.0),
+            )
+            messages.success(request, 'Matches refreshed!')
+        except PoolBusy:
+            messages.warning(request, 'Too many refreshes right now; showing your current matches. Please try again shortly.')
     else:
         # Only generate if no existing matches
         existing_matches = PotentialMatch.objects.filter(user=request.user)
@@ -472,8 +480,19 @@ def refresh_potential_matches(request):
             'error': 'Please set up your languages in your profile to find matches'
         }, status=400)
     
-    # Refresh matches
-    MatchingService.find_potential_matches(request.user, refresh=True)
+    # Refresh matches on the batch pool so bursts can't starve other work; when
+    # the pool is too busy to start it, the client is told to retry later
+    try:
+        run_in_executor(
+            'batch', MatchingService.find_potential_matches, request.user, refresh=True,
+            start_timeout=getattr(settings, 'BATCH_START_TIMEOUT', 2.0),
+        )
+    except PoolBusy:
+        response = JsonResponse({
+            'error': 'Too many refreshes right now, please try again shortly'
+        }, status=503)
+        response['Retry-After'] = str(max(1, round(getattr(settings, 'BATCH_START_TIMEOUT', 2.0))))
+        return response
     
     return JsonResponse({
         'success': True,
@@ -508,17 +527,13 @@ def get_match_statistics(request, match_id):
     
     # Add call statistics if chats app is available
     try:
-        from chats.models import VideoRoom, CallSession
-        video_room = VideoRoom.objects.filter(match=match).first()
-        if video_room:
-            call_sessions = CallSession.objects.filter(room=video_room)
-            statistics.update({
-                'total_calls': call_sessions.count(),
-                'total_call_duration': sum(
-                    (session.ended_at - session.started_at).total_seconds() 
-                    for session in call_sessions if session.ended_at
-                ) / 60,  # in minutes
-            })
+        from chats.models import RoomCallStats
+        # Rooms without an ended call have no rollup row yet; report zeros for them
+        call_stats = RoomCallStats.objects.filter(room__match=match).first()
+        statistics.update({
+            'total_calls': call_stats.session_count if call_stats else 0,
+            'total_call_duration': call_stats.total_duration.total_seconds() / 60 if call_stats else 0,  # in minutes
+        })
     except ImportError:
         pass
     
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Language, UserLanguage
+from .models import User, Language, LanguagePairDemand, UserLanguage
 
 class UserLanguageInline(admin.TabularInline):
     model = UserLanguage
@@ -34,6 +34,14 @@ class UserLanguageAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'language__name')
     ordering = ('user__username', 'language__name')
 
+@admin.register(LanguagePairDemand)
+class LanguagePairDemandAdmin(admin.ModelAdmin):
+    list_display = ('teaches', 'learns', 'user_count', 'updated_at')
+    list_select_related = ('teaches', 'learns')
+    search_fields = ('teaches__name', 'learns__name')
+    ordering = ('-user_count',)
+    readonly_fields = ('teaches', 'learns', 'user_count', 'updated_at')
+
 # Unregister the default User admin and register our custom one
 # admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
\ No newline at end of file
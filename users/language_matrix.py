@@ -0,0 +1,175 @@
+"""
+Materialized language supply/demand matrix.
+
+``LanguagePairDemand`` holds, for every (teaches, learns) pair of languages,
+how many users can teach the first (native or fluent) and are learning the
+second. Saving or deleting a ``UserLanguage`` only changes the cells of that
+user's own (teaches, learns) pairs, so the signal handlers in
+``users.signals`` add or subtract one on just those cells with
+``update_user_cells``. Cells are never deleted there, only decremented, so
+concurrent edits cannot lose a count; emptied cells stay at zero until the
+next rebuild. Bulk writes that bypass signals should be followed by
+``refresh_languages()`` for the languages they touched, or
+``rebuild_matrix()`` (the ``rebuild_language_matrix`` command).
+
+``LanguageMatrix`` loads the table into a dense, flat ``array('I')`` of
+N x N counts for callers that want the whole matrix.
+"""
+from array import array
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+TEACHING_TYPES = ('native', 'fluent')
+REBUILD_BATCH_SIZE = 1000
+
+
+def _pair_counts(language_ids=None):
+    """(teaches, learns, users) rows, limited to cells touching ``language_ids``."""
+    from .models import UserLanguage
+
+    # All conditions on the learner side go into one filter() call so they
+    # share a single join back onto UserLanguage
+    conditions = [Q(language_type__in=TEACHING_TYPES), Q(user__userlanguage__language_type='learning')]
+    if language_ids is not None:
+        conditions.append(Q(language_id__in=language_ids) | Q(user__userlanguage__language_id__in=language_ids))
+    return (
+        UserLanguage.objects.filter(*conditions)
+        .order_by()
+        .values_list('language_id', 'user__userlanguage__language_id')
+        .annotate(users=Count('user_id'))
+    )
+
+
+def user_cells(languages):
+    """(teaches, learns) cells of one user with ``languages`` as (language_id, language_type) pairs."""
+    teaches = {language_id for language_id, language_type in languages if language_type in TEACHING_TYPES}
+    learns = {language_id for language_id, language_type in languages if language_type == 'learning'}
+    return {(teacher, learner) for teacher in teaches for learner in learns}
+
+
+def _adjust_cells(cells, delta):
+    from .models import LanguagePairDemand
+
+    if not cells:
+        return
+    matching = LanguagePairDemand.objects.filter(
+        reduce(or_, (Q(teaches_id=teaches, learns_id=learns) for teaches, learns in cells))
+    )
+    if delta > 0:
+        # Missing cells start at zero; a concurrent insert of the same cell is ignored, not an IntegrityError
+        LanguagePairDemand.objects.bulk_create(
+            [LanguagePairDemand(teaches_id=teaches, learns_id=learns, user_count=0) for teaches, learns in cells],
+            ignore_conflicts=True,
+        )
+        matching.update(user_count=F('user_count') + delta)
+    else:
+        matching.filter(user_count__gte=-delta).update(user_count=F('user_count') + delta)
+
+
+def update_user_cells(before, after):
+    """Move one user's contribution from the cells of ``before`` to those of ``after``.
+
+    Both are sets of (teaches, learns) cells as built by ``user_cells``; cells
+    in both are left alone.
+    """
+    with transaction.atomic():
+        _adjust_cells(before - after, -1)
+        _adjust_cells(after - before, 1)
+
+
+def refresh_languages(language_ids):
+    """Recompute every cell in the rows and columns of ``language_ids``, after bulk writes."""
+    from .models import LanguagePairDemand
+
+    language_ids = [language_id for language_id in set(language_ids) if language_id]
+    if not language_ids:
+        return
+    with transaction.atomic():
+        LanguagePairDemand.objects.filter(
+            Q(teaches_id__in=language_ids) | Q(learns_id__in=language_ids)
+        ).delete()
+        LanguagePairDemand.objects.bulk_create(
+            LanguagePairDemand(teaches_id=teaches, learns_id=learns, user_count=users)
+            for teaches, learns, users in _pair_counts(language_ids)
+        )
+
+
+def rebuild_matrix():
+    """Recompute the whole matrix from ``UserLanguage``."""
+    from .models import LanguagePairDemand
+
+    with transaction.atomic():
+        LanguagePairDemand.objects.all().delete()
+        LanguagePairDemand.objects.bulk_create(
+            (
+                LanguagePairDemand(teaches_id=teaches, learns_id=learns, user_count=users)
+                for teaches, learns, users in _pair_counts()
+            ),
+            batch_size=REBUILD_BATCH_SIZE,
+        )
+
+
+def estimate_partners(teaches, learns):
+    """Upper bound on the partners for someone teaching ``teaches`` and learning ``learns``.
+
+    Sums the users who teach one of ``learns`` and learn one of ``teaches``;
+    a partner matching several pairs is counted once per pair.
+    """
+    from .models import LanguagePairDemand
+
+    if not teaches or not learns:
+        return 0
+    return LanguagePairDemand.objects.filter(
+        teaches_id__in=learns, learns_id__in=teaches
+    ).aggregate(total=Sum('user_count'))['total'] or 0
+
+
+class LanguageMatrix:
+    """Dense N x N view of ``LanguagePairDemand``, indexed by language id."""
+
+    def __init__(self, language_ids, cells):
+        self.language_ids = list(language_ids)
+        self.index = {language_id: i for i, language_id in enumerate(self.language_ids)}
+        size = len(self.language_ids)
+        self.counts = array('I', bytes(4 * size * size))
+        for teaches, learns, users in cells:
+            self.counts[self.index[teaches] * size + self.index[learns]] = users
+
+    @classmethod
+    def load(cls):
+        from .models import Language, LanguagePairDemand
+
+        return cls(
+            Language.objects.order_by('id').values_list('id', flat=True),
+            LanguagePairDemand.objects.values_list('teaches_id', 'learns_id', 'user_count'),
+        )
+
+    def __len__(self):
+        return len(self.language_ids)
+
+    def count(self, teaches, learns):
+        """Users who can teach ``teaches`` and are learning ``learns``."""
+        i, j = self.index.get(teaches), self.index.get(learns)
+        if i is None or j is None:
+            return 0
+        return self.counts[i * len(self) + j]
+
+    def row(self, teaches):
+        """Counts per learned language for the users who teach ``teaches``."""
+        start = self.index[teaches] * len(self)
+        return self.counts[start:start + len(self)].tolist()
+
+    def column(self, learns):
+        """Counts per taught language for the users learning ``learns``."""
+        return self.counts[self.index[learns]::len(self)].tolist()
+
+    def estimate_partners(self, teaches, learns):
+        """Same estimate as the module-level ``estimate_partners``, from memory."""
+        return sum(self.count(y, x) for x in teaches for y in learns)
+
+    def as_lists(self):
+        size = len(self)
+        return [self.counts[i * size:(i + 1) * size].tolist() for i in range(size)]
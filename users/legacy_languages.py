@@ -0,0 +1,121 @@
+"""
+Set-based migration of the legacy ``native_language`` / ``target_language``
+text fields to ``UserLanguage`` rows.
+
+Language names are resolved case-insensitively against a map preloaded with
+one query. Users are read in primary-key pages of ``batch_size``; for each
+page the existing (user, language) pairs are fetched once, the missing rows
+are built in memory and written with one ``bulk_create``. Because that
+bypasses the ``UserLanguage`` signals, the supply/demand matrix is refreshed
+afterwards for the languages that gained rows.
+"""
+from collections import Counter
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .language_matrix import refresh_languages
+from .models import Language, User, UserLanguage
+
+LEGACY_BATCH_SIZE = 2000
+
+
+def language_map():
+    """Casefolded language name -> (id, name)."""
+    return {name.casefold(): (language_id, name) for language_id, name in Language.objects.values_list('id', 'name')}
+
+
+def has_user_languages():
+    return Exists(UserLanguage.objects.filter(user_id=OuterRef('pk')))
+
+
+def legacy_users(include_migrated=False):
+    """Users with legacy language text; by default only those with no ``UserLanguage`` yet."""
+    users = User.objects.exclude(native_language='', target_language='')
+    if not include_migrated:
+        users = users.filter(~has_user_languages())
+    return users
+
+
+def migrate_users(users, dry_run=False, batch_size=LEGACY_BATCH_SIZE, on_row=None):
+    """Create the missing ``UserLanguage`` rows for ``users`` from their legacy fields.
+
+    ``on_row(username, language_name, language_type, proficiency)`` is called
+    for every row that is (or, with ``dry_run``, would be) created. Returns
+    ``{'users': users given rows, 'created': rows, 'unknown': Counter of
+    (field, legacy name)}``.
+    """
+    languages = language_map()
+    result = {'users': 0, 'created': 0, 'unknown': Counter()}
+    touched_languages = set()
+    pages = users.order_by('pk').values_list('pk', 'username', 'native_language', 'target_language', 'proficiency')
+
+    last_pk = 0
+    while True:
+        page = list(pages.filter(pk__gt=last_pk)[:batch_size])
+        if not page:
+            break
+        last_pk = page[-1][0]
+        existing = set(
+            UserLanguage.objects.filter(user_id__in=[row[0] for row in page])
+            .order_by().values_list('user_id', 'language_id')
+        )
+
+        rows = []
+        for user_id, username, native_language, target_language, proficiency in page:
+            added = False
+            for field, legacy_name, language_type, level in (
+                ('native_language', native_language, 'native', 'native'),
+                ('target_language', target_language, 'learning', proficiency or 'beginner'),
+            ):
+                if not legacy_name:
+                    continue
+                language = languages.get(legacy_name.strip().casefold())
+                if language is None:
+                    result['unknown'][(field, legacy_name)] += 1
+                    continue
+                language_id, language_name = language
+                # One row per (user, language); the native entry wins if both name the same language
+                if (user_id, language_id) in existing:
+                    continue
+                existing.add((user_id, language_id))
+                rows.append(UserLanguage(
+                    user_id=user_id, language_id=language_id, language_type=language_type, proficiency=level
+                ))
+                touched_languages.add(language_id)
+                added = True
+                if on_row:
+                    on_row(username, language_name, language_type, level)
+            result['users'] += added
+
+        if rows and not dry_run:
+            UserLanguage.objects.bulk_create(rows, ignore_conflicts=True)
+        result['created'] += len(rows)
+
+    if touched_languages and not dry_run:
+        refresh_languages(touched_languages)
+    return result
+
+
+def consistency_report():
+    """Legacy/new language data consistency, as aggregate queries."""
+    native_matches = Exists(UserLanguage.objects.filter(
+        user_id=OuterRef('pk'), language_type='native', language__name__iexact=OuterRef('native_language')
+    ))
+    target_matches = Exists(UserLanguage.objects.filter(
+        user_id=OuterRef('pk'), language_type='learning', language__name__iexact=OuterRef('target_language')
+    ))
+    no_legacy = Q(native_language='', target_language='')
+
+    report = User.objects.annotate(
+        has_languages=has_user_languages(), native_matches=native_matches, target_matches=target_matches,
+    ).aggregate(
+        no_language_data=Count('pk', filter=Q(has_languages=False) & no_legacy),
+        legacy_only=Count('pk', filter=Q(has_languages=False) & ~no_legacy),
+        new_only=Count('pk', filter=Q(has_languages=True) & no_legacy),
+        native_mismatch=Count('pk', filter=Q(has_languages=True, native_matches=False) & ~Q(native_language='')),
+        target_mismatch=Count('pk', filter=Q(has_languages=True, target_matches=False) & ~Q(target_language='')),
+    )
+    report['duplicates'] = (
+        UserLanguage.objects.order_by().values('user', 'language').annotate(count=Count('id')).filter(count__gt=1).count()
+    )
+    return report
@@ -1,66 +1,35 @@
 from django.core.management.base import BaseCommand
-from users.models import User, Language, UserLanguage
+from users.legacy_languages import LEGACY_BATCH_SIZE, legacy_users, migrate_users
 
 class Command(BaseCommand):
     help = 'Migrate legacy language text fields to new Language model system'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=LEGACY_BATCH_SIZE,
+            help=f'Users read and rows written per query (default: {LEGACY_BATCH_SIZE})',
+        )
+
     def handle(self, *args, **options):
-        migrated_count = 0
+        # Per-row output only at -v 2; at 500k users it would dominate the run time
+        on_row = None
+        if options['verbosity'] > 1:
+            def on_row(username, language_name, language_type, proficiency):
+                kind = 'native' if language_type == 'native' else 'target'
+                self.stdout.write(f'Added {kind} language {language_name} for {username}')
         
-        # Get users with legacy language data who don't have UserLanguage entries
-        users_to_migrate = User.objects.exclude(
-            native_language='',
-            target_language=''
-        ).filter(
-            userlanguage__isnull=True
-        ).distinct()
+        # Users with legacy language data who don't have UserLanguage entries
+        result = migrate_users(legacy_users(), batch_size=options['batch_size'], on_row=on_row)
         
-        for user in users_to_migrate:
-            try:
-                # Try to find native language
-                if user.native_language:
-                    try:
-                        native_lang = Language.objects.get(name__iexact=user.native_language)
-                        UserLanguage.objects.get_or_create(
-                            user=user,
-                            language=native_lang,
-                            defaults={
-                                'proficiency': 'native',
-                                'language_type': 'native'
-                            }
-                        )
-                        self.stdout.write(f'Added native language {native_lang.name} for {user.username}')
-                    except Language.DoesNotExist:
-                        self.stdout.write(
-                            self.style.WARNING(f'Language "{user.native_language}" not found for user {user.username}')
-                        )
-                
-                # Try to find target language
-                if user.target_language:
-                    try:
-                        target_lang = Language.objects.get(name__iexact=user.target_language)
-                        proficiency = user.proficiency if user.proficiency else 'beginner'
-                        UserLanguage.objects.get_or_create(
-                            user=user,
-                            language=target_lang,
-                            defaults={
-                                'proficiency': proficiency,
-                                'language_type': 'learning'
-                            }
-                        )
-                        self.stdout.write(f'Added target language {target_lang.name} for {user.username}')
-                    except Language.DoesNotExist:
-                        self.stdout.write(
-                            self.style.WARNING(f'Language "{user.target_language}" not found for user {user.username}')
-                        )
-                
-                migrated_count += 1
-                
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error migrating user {user.username}: {str(e)}')
-                )
+        for (field, name), count in result['unknown'].most_common():
+            self.stdout.write(
+                self.style.WARNING(f'Language "{name}" ({field}) not found for {count} users')
+            )
         
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully migrated {migrated_count} users')
-        ) 
\ No newline at end of file
+            self.style.SUCCESS(
+                f"Successfully migrated {result['users']} users ({result['created']} languages added)"
+            )
+        )
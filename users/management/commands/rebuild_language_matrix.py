@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.language_matrix import rebuild_matrix
+from users.models import LanguagePairDemand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the language supply/demand matrix from user languages'
+
+    def handle(self, *args, **options):
+        rebuild_matrix()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt language matrix with {LanguagePairDemand.objects.count()} non-empty pairs"
+        ))
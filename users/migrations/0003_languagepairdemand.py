@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_matrix(apps, schema_editor):
+    """Fill the matrix from existing user languages; matching skips users whose cells are empty."""
+    UserLanguage = apps.get_model('users', 'UserLanguage')
+    LanguagePairDemand = apps.get_model('users', 'LanguagePairDemand')
+    cells = (
+        UserLanguage.objects.filter(
+            Q(language_type__in=('native', 'fluent')), Q(user__userlanguage__language_type='learning')
+        )
+        .order_by()
+        .values_list('language_id', 'user__userlanguage__language_id')
+        .annotate(users=Count('user_id'))
+    )
+    LanguagePairDemand.objects.bulk_create(
+        (LanguagePairDemand(teaches_id=teaches, learns_id=learns, user_count=users) for teaches, learns, users in cells),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_language_userlanguage_user_languages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LanguagePairDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('learns', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demand_as_learned', to='users.language')),
+                ('teaches', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demand_as_taught', to='users.language')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['learns', 'teaches'], name='pair_demand_learns_idx')],
+                'unique_together': {('teaches', 'learns')},
+            },
+        ),
+        migrations.RunPython(build_matrix, migrations.RunPython.noop),
+    ]
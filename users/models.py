@@ -41,6 +41,41 @@ class UserLanguage(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.language.name} ({self.get_proficiency_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_loaded_values()
+
+    def remember_loaded_values(self):
+        """Keep the stored (user, language, type) so the matrix signals can undo what this row counted."""
+        stored = tuple(self.__dict__.get(attname) for attname in ('user_id', 'language_id', 'language_type'))
+        self._loaded_values = None if None in stored else stored
+
+class LanguagePairDemand(models.Model):
+    """Materialized count of users who can teach one language and are learning another.
+
+    One row per non-empty (teaches, learns) cell of the Language x Language
+    matrix, maintained from ``UserLanguage`` changes by ``users.language_matrix``.
+    """
+    teaches = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='demand_as_taught')
+    learns = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='demand_as_learned')
+    user_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['teaches', 'learns']
+        indexes = [
+            models.Index(fields=['learns', 'teaches'], name='pair_demand_learns_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.teaches.name} → {self.learns.name}: {self.user_count}"
+
 class User(AbstractUser):
     """
     Custom user model that extends the AbstractUser model.
@@ -0,0 +1,58 @@
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .language_matrix import update_user_cells, user_cells
+from .models import UserLanguage
+
+
+def _user_languages(user_id, exclude=()):
+    """{pk: (language_id, language_type)} of one user's stored languages."""
+    return {
+        pk: (language_id, language_type)
+        for pk, language_id, language_type in UserLanguage.objects.filter(user_id=user_id)
+        .exclude(pk__in=exclude).values_list('pk', 'language_id', 'language_type')
+    }
+
+
+@receiver(pre_save, sender=UserLanguage)
+def remember_stored_language(sender, instance, raw=False, **kwargs):
+    """Look up the stored row only for instances saved without being loaded first."""
+    if instance.pk and not raw and not hasattr(instance, '_loaded_values'):
+        instance._loaded_values = (
+            UserLanguage.objects.filter(pk=instance.pk)
+            .values_list('user_id', 'language_id', 'language_type').first()
+        )
+
+
+@receiver(post_save, sender=UserLanguage)
+def user_language_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.user_id, instance.language_id, instance.language_type)
+    loaded = None if created else instance._loaded_values
+    if loaded == current:
+        return
+    if loaded and loaded[0] != instance.user_id:
+        # Moved to another user: take it out of the old user's cells first
+        remaining = set(_user_languages(loaded[0]).values())
+        update_user_cells(user_cells(remaining | {loaded[1:]}), user_cells(remaining))
+        loaded = None
+    others = set(_user_languages(instance.user_id, exclude=[instance.pk]).values())
+    update_user_cells(
+        user_cells(others | ({loaded[1:]} if loaded else set())),
+        user_cells(others | {current[1:]}),
+    )
+    instance._loaded_values = current
+
+
+@receiver(pre_delete, sender=UserLanguage)
+def user_language_deleting(sender, instance, origin=None, **kwargs):
+    # Every row of one delete (a user's cascade, a queryset) is still stored when
+    # pre_delete fires, so each subtracts only what it adds to the rows not yet removed
+    removed = vars(origin if origin is not None else instance).setdefault('_matrix_removed', set())
+    stored = _user_languages(instance.user_id, exclude=removed)
+    own = stored.pop(instance.pk, None)
+    if own is not None:
+        others = set(stored.values())
+        update_user_cells(user_cells(others | {own}), user_cells(others))
+    removed.add(instance.pk)
@@ -1,3 +1,166 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from .legacy_languages import consistency_report, legacy_users, migrate_users
+from .language_matrix import LanguageMatrix, estimate_partners, rebuild_matrix
+from .models import Language, LanguagePairDemand, User, UserLanguage
+
+
+class LanguageMatrixTest(TestCase):
+    """Test the materialized language supply/demand matrix."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass123')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass123')
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        self.spanish = Language.objects.create(name='Spanish', code='es')
+        UserLanguage.objects.create(user=self.user1, language=self.english, proficiency='native', language_type='native')
+        UserLanguage.objects.create(user=self.user1, language=self.korean, proficiency='beginner', language_type='learning')
+        UserLanguage.objects.create(user=self.user2, language=self.korean, proficiency='native', language_type='native')
+        self.user2_learns = UserLanguage.objects.create(
+            user=self.user2, language=self.english, proficiency='beginner', language_type='learning'
+        )
+
+    def cells(self):
+        return {
+            (teaches, learns): count
+            for teaches, learns, count in LanguagePairDemand.objects.filter(user_count__gt=0).values_list(
+                'teaches', 'learns', 'user_count'
+            )
+        }
+
+    def test_matrix_follows_user_language_changes(self):
+        """Saving, editing and deleting user languages keeps the cells current."""
+        en, ko, es = self.english.id, self.korean.id, self.spanish.id
+        self.assertEqual(self.cells(), {(en, ko): 1, (ko, en): 1})
+
+        self.user2_learns.language = self.spanish
+        self.user2_learns.save()
+        self.assertEqual(self.cells(), {(en, ko): 1, (ko, es): 1})
+
+        UserLanguage.objects.create(user=self.user2, language=self.english, proficiency='advanced', language_type='fluent')
+        self.assertEqual(self.cells(), {(en, ko): 1, (ko, es): 1, (en, es): 1})
+
+        self.user1.delete()
+        self.assertEqual(self.cells(), {(ko, es): 1, (en, es): 1})
+
+    def test_edits_adjust_only_the_users_own_cells(self):
+        """Each save or delete moves one user's counts; other users' contributions stay."""
+        en, ko = self.english.id, self.korean.id
+        user3 = User.objects.create_user(username='testuser3', password='testpass123')
+        UserLanguage.objects.create(user=user3, language=self.english, proficiency='native', language_type='native')
+        learning = UserLanguage.objects.create(user=user3, language=self.korean, proficiency='beginner', language_type='learning')
+        self.assertEqual(self.cells(), {(en, ko): 2, (ko, en): 1})
+
+        learning = UserLanguage.objects.get(pk=learning.pk)
+        learning.proficiency = 'intermediate'
+        with self.assertNumQueries(1):
+            learning.save()
+
+        learning.language_type = 'fluent'
+        learning.save()
+        self.assertEqual(self.cells(), {(en, ko): 1, (ko, en): 1})
+
+        UserLanguage.objects.filter(user=user3).delete()
+        self.assertEqual(self.cells(), {(en, ko): 1, (ko, en): 1})
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        """A full rebuild produces the same cells as the signal-driven refreshes."""
+        incremental = self.cells()
+        LanguagePairDemand.objects.all().delete()
+
+        rebuild_matrix()
+
+        self.assertEqual(self.cells(), incremental)
+
+    def test_refresh_clears_matches_when_no_partner_is_left(self):
+        """A refresh drops stored matches even when the matrix short-circuits the search."""
+        from matches.models import PotentialMatch
+        from matches.services import MatchingService
+
+        self.assertEqual(len(MatchingService.find_potential_matches(self.user1, refresh=True)), 1)
+        self.user2_learns.delete()
+
+        self.assertEqual(MatchingService.find_potential_matches(self.user1, refresh=True), [])
+        self.assertFalse(PotentialMatch.objects.filter(user=self.user1).exists())
+
+    def test_dense_matrix_and_estimates(self):
+        """The dense view and the partner estimate agree with the table."""
+        matrix = LanguageMatrix.load()
+        en, ko = self.english.id, self.korean.id
+
+        self.assertEqual(matrix.count(en, ko), 1)
+        self.assertEqual(matrix.count(ko, ko), 0)
+        self.assertEqual(sum(matrix.row(en)), 1)
+        self.assertEqual(sum(matrix.column(en)), 1)
+        self.assertEqual(matrix.estimate_partners([en], [ko]), 1)
+        self.assertEqual(estimate_partners([en], [ko]), 1)
+        self.assertEqual(estimate_partners([en], [self.spanish.id]), 0)
+
+    def test_language_demand_api(self):
+        """The endpoint returns the matrix and estimates for the requesting user."""
+        self.client.login(username='testuser1', password='testpass123')
+
+        response = self.client.get(reverse('users:language_demand_api'), {'language': 'es'})
+
+        data = response.json()
+        codes = [language['code'] for language in data['languages']]
+        self.assertEqual(data['matrix'][codes.index('en')][codes.index('ko')], 1)
+        self.assertEqual(data['expected_partners'], 1)
+        self.assertEqual(data['if_added'], {'learning': 0, 'teaching': 0})
+        self.assertEqual(
+            self.client.get(reverse('users:language_demand_api'), {'language': 'xx'}).status_code, 404
+        )
+
+
+class LegacyLanguageMigrationTest(TestCase):
+    """Test the set-based legacy language migration."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.english = Language.objects.create(name='English', code='en')
+        self.korean = Language.objects.create(name='Korean', code='ko')
+        for i in range(5):
+            User.objects.create_user(
+                username=f'legacy{i}', password='testpass123',
+                native_language='english', target_language='KOREAN', proficiency='intermediate'
+            )
+        User.objects.create_user(username='unknown', password='testpass123', native_language='Klingon')
+
+    def test_migration_is_batched_and_constant_in_queries(self):
+        """Users are paged, rows bulk-created and the language matrix refreshed."""
+        with self.assertNumQueries(16):
+            result = migrate_users(legacy_users(), batch_size=2)
+
+        self.assertEqual(result['users'], 5)
+        self.assertEqual(result['created'], 10)
+        self.assertEqual(dict(result['unknown']), {('native_language', 'Klingon'): 1})
+        self.assertEqual(
+            UserLanguage.objects.filter(language_type='learning', proficiency='intermediate').count(), 5
+        )
+        self.assertEqual(LanguagePairDemand.objects.get(teaches=self.english, learns=self.korean).user_count, 5)
+        self.assertFalse(legacy_users().filter(username__startswith='legacy').exists())
+
+    def test_fix_user_languages_dry_run_and_report(self):
+        """A dry run writes nothing; the consistency report is aggregate counts."""
+        out = StringIO()
+
+        call_command('fix_user_languages', '--dry-run', stdout=out)
+
+        self.assertIn('Users that would be fixed: 5 (10 languages)', out.getvalue())
+        self.assertIn('"Klingon" not found for 1 users', out.getvalue())
+        self.assertEqual(UserLanguage.objects.count(), 0)
+        self.assertEqual(consistency_report()['legacy_only'], 6)
+
+        call_command('migrate_legacy_languages', stdout=StringIO())
+        UserLanguage.objects.filter(user__username='legacy0', language_type='native').delete()
 
-# Create your tests here.
+        report = consistency_report()
+        self.assertEqual(report['legacy_only'], 1)
+        self.assertEqual(report['native_mismatch'], 1)
+        self.assertEqual(report['target_mismatch'], 0)
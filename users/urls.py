@@ -11,4 +11,5 @@ urlpatterns = [
     path('profile/add-language/', views.add_language_view, name='add_language'),
     path('profile/edit-language/<int:language_id>/', views.edit_language_view, name='edit_language'),
     path('profile/delete-language/<int:language_id>/', views.delete_language_view, name='delete_language'),
+    path('api/language-demand/', views.language_demand_api, name='language_demand_api'),
 ]
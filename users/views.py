@@ -5,7 +5,8 @@ from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from django.http import JsonResponse
 from .forms import UserRegistrationForm, UserProfileForm, UserLanguageForm
-from .models import UserLanguage
+from .language_matrix import TEACHING_TYPES, LanguageMatrix
+from .models import Language, UserLanguage
 
 def register_view(request):
     """User registration view."""
@@ -118,3 +119,41 @@ def delete_language_view(request, language_id):
         return redirect('users:profile')
     
     return render(request, 'users/delete_language.html', {'user_language': user_language})
+
+@login_required
+def language_demand_api(request):
+    """API endpoint exposing the language supply/demand matrix.
+
+    ``matrix[i][j]`` is the number of users who can teach ``languages[i]`` and
+    are learning ``languages[j]``. ``expected_partners`` estimates the partners
+    available to the requesting user; with ``?language=<code>`` the response
+    also estimates how many more partners adding that language would bring.
+    """
+    matrix = LanguageMatrix.load()
+    languages = Language.objects.in_bulk(matrix.language_ids)
+
+    teaches, learns = [], []
+    for language_id, language_type in request.user.userlanguage_set.values_list('language_id', 'language_type'):
+        (teaches if language_type in TEACHING_TYPES else learns).append(language_id)
+
+    data = {
+        'success': True,
+        'languages': [
+            {'id': language_id, 'code': languages[language_id].code, 'name': languages[language_id].name}
+            for language_id in matrix.language_ids
+        ],
+        'matrix': matrix.as_lists(),
+        'expected_partners': matrix.estimate_partners(teaches, learns),
+    }
+
+    code = request.GET.get('language')
+    if code:
+        language = next((language for language in languages.values() if language.code == code), None)
+        if language is None:
+            return JsonResponse({'error': 'Unknown language'}, status=404)
+        data['if_added'] = {
+            'learning': matrix.estimate_partners(teaches, [language.id]),
+            'teaching': matrix.estimate_partners([language.id], learns),
+        }
+
+    return JsonResponse(data)